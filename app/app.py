@@ -5,111 +5,248 @@
 Aplicación Flask para publicar contenido en redes sociales.
 """
 
-import os
-import json
-from flask import Flask, request, jsonify
-from social_networks.mastodon import Mastodon
-from social_networks.twitter import Twitter
-from social_networks.telegram import Telegram
-from social_networks.bluesky import Bluesky
-from functions import process_hashtags, process_images, cleanup_images
+import time
+from flask import Flask, Response, request, jsonify, g
+from werkzeug.exceptions import RequestEntityTooLarge
+from publisher import validate_post, validate_batch, publish_post, publish_batch
+from jobs import ASYNC_PUBLISH, JobQueue
+from image_cache import image_cache
+from image_decode import decode_budget
+from client_pool import client_pool
+from rate_limits import rate_limits
+from idempotency import post_key
+from uploads import MAX_CONTENT_LENGTH, UploadRequest, is_multipart, form_post, save_uploads, client_post
+import metrics
+from profiling import RequestProfile
+from social_networks import loaded_networks
 
 app = Flask(__name__)
 
+# Las imágenes subidas en multipart se escriben en búferes limitados
+app.request_class = UploadRequest
+app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+
+# Cola de trabajos, solo existe con el modo asíncrono activado
+job_queue = None
+
+# Los procesos que optimizan imágenes importan este módulo como __mp_main__,
+# en ellos no arranco los workers
+if ASYNC_PUBLISH and __name__ != '__mp_main__':
+    job_queue = JobQueue()
+    job_queue.start_workers(publish_post)
+
+def service_status():
+    """
+    Obtengo el estado del servicio y los contadores de sus cachés.
+
+    Returns:
+        dict: Estado del servicio
+    """
+    return {
+        'status': 'healthy',
+        'message': 'Social Post Publisher running',
+        'image_cache': image_cache.stats(),
+        'image_decode': decode_budget.stats(),
+        'client_pool': client_pool.stats(),
+        'rate_limits': rate_limits.stats(),
+        'networks': loaded_networks()
+    }
+
+def enqueue_batch(posts):
+    """
+    Encolo cada post de un lote ya validado (ver validate_batch) y obtengo
+    la respuesta con el id de trabajo de cada uno o su error de validación.
+
+    Args:
+        posts (list): Posts del lote
+
+    Returns:
+        dict: Respuesta de /publish/batch
+    """
+    results = []
+    for index, post in enumerate(posts):
+        error = validate_post(post) if isinstance(post, dict) else 'No se recibieron datos'
+        if error:
+            results.append({'index': index, 'success': False, 'error': error})
+        else:
+            results.append({'index': index, 'success': True, 'job_id': job_queue.enqueue(post), 'status': 'pending'})
+
+    return {
+        'success': all(result['success'] for result in results),
+        'results': results
+    }
+
+def request_endpoint():
+    """
+    Obtengo la ruta de la petición para las métricas, con sus parámetros
+    sin sustituir (ej: /jobs/<job_id>) para no crear una serie por valor.
+
+    Returns:
+        str: Ruta de la petición u other si no existe
+    """
+    return request.url_rule.rule if request.url_rule else 'other'
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    metrics.HTTP_REQUESTS_IN_FLIGHT.inc(endpoint=request_endpoint())
+
+@app.after_request
+def save_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+@app.teardown_request
+def record_request_metrics(error=None):
+    # after_request no se ejecuta con las excepciones sin capturar, así que
+    # registro aquí todas las peticiones y esas cuentan como 500
+    endpoint = request_endpoint()
+    status = 500 if error is not None else g.get('response_status', 500)
+
+    metrics.HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=status)
+    metrics.HTTP_REQUEST_DURATION.observe(time.perf_counter() - g.request_started, endpoint=endpoint)
+    if request.content_length:
+        metrics.HTTP_REQUEST_BYTES.inc(request.content_length, endpoint=endpoint)
+
+    metrics.HTTP_REQUESTS_IN_FLIGHT.dec(endpoint=endpoint)
+
 @app.route('/', methods=['GET'])
 def health():
-    return {'status': 'healthy', 'message': 'Social Post Publisher running'}, 200
+    return service_status(), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """
+    Endpoint con las métricas del servicio en formato de Prometheus.
+    """
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 @app.route('/publish', methods=['POST'])
 def publish():
     """
     Endpoint para publicar contenido en redes sociales.
-    Recibe un JSON con los siguientes parámetros:
+    Recibe un JSON, o un formulario multipart/form-data con las imágenes como
+    archivos en el campo images, con los siguientes parámetros:
     - content: (requerido) Contenido a publicar
     - project: (requerido) Nombre del proyecto para cargar el archivo .env correspondiente
     - title: (opcional) Título del contenido
     - hashtags: (opcional) Lista de hashtags sin el símbolo #, estos se añaden
                 luego automáticamente por mi aplicación
     - images: (opcional) Lista de imágenes en base64 o URLs. Ideal no más de 4.
+    - async: (opcional) Con el modo asíncrono activado, false para publicar
+             en la misma petición en lugar de encolar el post
+    - idempotency_key: (opcional) Clave para que los reintentos no vuelvan a
+                       publicar en las redes donde ya se publicó. También se
+                       acepta en la cabecera Idempotency-Key. Con auto se
+                       calcula con el contenido del post, así que un post
+                       idéntico enviado durante IDEMPOTENCY_TTL_HOURS no se
+                       publica de nuevo (devuelve el resultado anterior).
+                       Sin clave cada petición es una publicación nueva
+    - timings: (opcional) true para añadir a la respuesta el tiempo de cada
+               fase de la publicación (perfil, imágenes y redes sociales)
+
+    Con la cabecera X-Profile: <PROFILE_TOKEN> (o por muestreo según
+    PROFILE_SAMPLE_RATE) la publicación se perfila y la respuesta indica en
+    profile el nombre del perfil guardado en PROFILE_DIR.
     """
     try:
-        data = request.json
-
-        # Verifico parámetros requeridos
-        if not data.get('content'):
-            return jsonify({'success': False, 'error': 'El contenido es requerido'})
-
-        if not data.get('project'):
-            return jsonify({'success': False, 'error': 'El proyecto es requerido'})
-
-        # Proceso datos
-        content = data.get('content')
-        title = data.get('title', '')
-        hashtags = process_hashtags(data.get('hashtags', []))
-        project = data.get('project')
-        images = process_images(data.get('images', []))
-
-        # Cargo configuración del proyecto
-        env_file = os.path.join('data', 'profiles', f'{project}.env')
-        if not os.path.exists(env_file):
-            return jsonify({'success': False, 'error': f'No se encontró el archivo de configuración para el proyecto {project}'})
-
-        # Cargo variables de entorno desde el archivo .env del proyecto
-        from dotenv import load_dotenv
-        load_dotenv(env_file)
-
-        # Inicializo redes sociales
-        networks = []
-
-        # Mastodon
-        if os.getenv('MASTODON_ENABLED', 'false').lower() == 'true':
-            networks.append(Mastodon())
-
-        # Twitter
-        if os.getenv('TWITTER_ENABLED', 'false').lower() == 'true':
-            networks.append(Twitter())
-
-        # Telegram
-        if os.getenv('TELEGRAM_ENABLED', 'false').lower() == 'true':
-            networks.append(Telegram())
-
-        # Bluesky
-        if os.getenv('BLUESKY_ENABLED', 'false').lower() == 'true':
-            networks.append(Bluesky())
-
-        # Publico en cada red social habilitada
-        results = []
-        for network in networks:
-            try:
-                result = network.publish(content=content, title=title, hashtags=hashtags, project=project, images=images)
-                results.append({
-                    'network': network.__class__.__name__,
-                    'success': True,
-                    'result': result
-                })
-            except Exception as e:
-                results.append({
-                    'network': network.__class__.__name__,
-                    'success': False,
-                    'error': str(e)
-                })
-
-        # Limpio imágenes temporales
-        cleanup_images(images)
-
-        # Verifico si al menos una publicación se hizo bien para responder estado
-        success = any(result['success'] for result in results)
+        data = form_post(request) if is_multipart(request) else client_post(request.json)
+
+        if isinstance(data, dict) and request.headers.get('Idempotency-Key'):
+            data.setdefault('idempotency_key', request.headers['Idempotency-Key'])
+
+        # Con el modo asíncrono encolo el post y respondo con el id del trabajo
+        if job_queue and data and data.get('async', True):
+            error = validate_post(data)
+            if error:
+                return jsonify({'success': False, 'error': error})
+
+            # Los archivos subidos esperan en data/uploads a que los publique
+            # un worker, calculo antes la clave con su contenido si la piden
+            if is_multipart(request):
+                data['idempotency_key'] = post_key(data)
+                save_uploads(data)
+
+            job_id = job_queue.enqueue(data)
+
+            return jsonify({
+                'success': True,
+                'job_id': job_id,
+                'status': 'pending'
+            }), 202
+
+        with RequestProfile(request.headers.get('X-Profile')) as profile:
+            response = publish_post(data)
+
+        if profile.name:
+            response['profile'] = profile.name
+
+        return jsonify(response)
+
+    except RequestEntityTooLarge as e:
+        # Los límites de cada imagen traen su propio mensaje
+        error = e.description
+        if error == RequestEntityTooLarge.description:
+            error = f'La petición supera el tamaño máximo de {MAX_CONTENT_LENGTH} bytes'
 
         return jsonify({
-            'success': success,
-            'results': results
+            'success': False,
+            'error': error
+        }), 413
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
         })
 
+@app.route('/publish/batch', methods=['POST'])
+def publish_batch_endpoint():
+    """
+    Endpoint para publicar varios posts, de uno o varios proyectos, en una
+    sola petición.
+    Recibe un JSON con los siguientes parámetros:
+    - posts: (requerido) Lista de posts con los mismos parámetros que /publish
+    - async: (opcional) Con el modo asíncrono activado, false para publicar
+             en la misma petición en lugar de encolar cada post
+    """
+    try:
+        data = request.json or {}
+        posts = data.get('posts')
+
+        for post in posts if isinstance(posts, list) else []:
+            client_post(post)
+
+        # Con el modo asíncrono encolo cada post y respondo con sus ids de trabajo
+        if job_queue and data.get('async', True):
+            error = validate_batch(posts)
+            if error:
+                return jsonify({'success': False, 'error': error})
+
+            return jsonify(enqueue_batch(posts)), 202
+
+        return jsonify(publish_batch(posts))
+
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         })
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """
+    Endpoint para consultar el estado de un trabajo del modo asíncrono, con
+    el avance y resultado de cada red social.
+    """
+    if not job_queue:
+        return jsonify({'success': False, 'error': 'El modo asíncrono no está activado'}), 404
+
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': f'No existe el trabajo {job_id}'}), 404
+
+    return jsonify(job)
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=8080, debug=False)
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Punto de entrada ASGI para publicar contenido en redes sociales.
+
+Sirve los mismos endpoints que la aplicación Flask (/, /publish,
+/publish/batch, /jobs/<job_id> y /metrics) con un bucle de eventos, así cada
+publicación en curso es una corrutina en lugar de un hilo del sistema. Lo que bloquea (SQLite, los
+perfiles y las imágenes en disco) se ejecuta en hilos para no parar el bucle.
+Se arranca con un servidor ASGI, por ejemplo:
+
+    uvicorn asgi:app --app-dir app --host 0.0.0.0 --port 8080
+"""
+
+import os
+import json
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from app import service_status, job_queue, enqueue_batch
+from werkzeug.exceptions import RequestEntityTooLarge
+from uploads import MAX_CONTENT_LENGTH, client_post, upload_request, is_multipart, form_post, save_uploads
+from idempotency import post_key
+from profiling import RequestProfile
+import metrics
+from publisher import validate_post, validate_batch, publish_post_async, publish_batch
+
+# Hilos del bucle para lo que bloquea (SQLite, perfiles, imágenes y las redes
+# sin cliente asíncrono). El de asyncio por defecto (núcleos + 4) se queda
+# corto en cuanto varias peticiones esperan a sus imágenes
+ASGI_MAX_THREADS = int(os.getenv('ASGI_MAX_THREADS', '32'))
+
+async def app(scope, receive, send):
+    """
+    Aplicación ASGI.
+
+    Args:
+        scope (dict): Datos de la conexión
+        receive (callable): Recibe los mensajes del servidor
+        send (callable): Envía los mensajes al servidor
+    """
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    if scope['type'] != 'http':
+        return
+
+    # Registro las métricas de cada petición
+    endpoint = request_endpoint(scope['path'])
+    headers = dict(scope.get('headers', []))
+    started = time.perf_counter()
+    status = {}
+
+    async def send_tracked(message):
+        if message['type'] == 'http.response.start':
+            status['code'] = message['status']
+        await send(message)
+
+    with metrics.HTTP_REQUESTS_IN_FLIGHT.track(endpoint=endpoint):
+        try:
+            await route(scope, headers, receive, send_tracked)
+        finally:
+            metrics.HTTP_REQUESTS.inc(endpoint=endpoint, method=scope['method'], status=status.get('code', 500))
+            metrics.HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, endpoint=endpoint)
+            if headers.get(b'content-length', b'').isdigit():
+                metrics.HTTP_REQUEST_BYTES.inc(int(headers[b'content-length']), endpoint=endpoint)
+
+def request_endpoint(path):
+    """
+    Obtengo la ruta de la petición para las métricas, con el mismo nombre
+    que en la aplicación Flask.
+
+    Args:
+        path (str): Ruta de la petición
+
+    Returns:
+        str: Ruta de la petición u other si no existe
+    """
+    if path in ('/', '/publish', '/publish/batch', '/metrics'):
+        return path
+
+    if path.startswith('/jobs/'):
+        return '/jobs/<job_id>'
+
+    return 'other'
+
+async def route(scope, headers, receive, send):
+    """
+    Atiendo una petición HTTP según su ruta.
+
+    Args:
+        scope (dict): Datos de la conexión
+        headers (dict): Cabeceras de la petición
+        receive (callable): Recibe los mensajes del servidor
+        send (callable): Envía los mensajes al servidor
+    """
+    path = scope['path']
+    method = scope['method']
+
+    if path == '/metrics' and method == 'GET':
+        body = metrics.render().encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', metrics.CONTENT_TYPE.encode('ascii')),
+                (b'content-length', str(len(body)).encode('ascii'))
+            ]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+        return
+
+    if path == '/':
+        if method != 'GET':
+            await send_json(send, {'success': False, 'error': 'Método no permitido'}, 405)
+            return
+
+        await send_json(send, service_status())
+        return
+
+    if path == '/publish':
+        if method != 'POST':
+            await send_json(send, {'success': False, 'error': 'Método no permitido'}, 405)
+            return
+
+        body = await read_body(receive, headers.get(b'content-length'))
+        if body is None:
+            await send_json(send, {'success': False, 'error': f'La petición supera el tamaño máximo de {MAX_CONTENT_LENGTH} bytes'}, 413)
+            return
+
+        response, status = await publish(body, headers)
+        await send_json(send, response, status)
+        return
+
+    if path == '/publish/batch':
+        if method != 'POST':
+            await send_json(send, {'success': False, 'error': 'Método no permitido'}, 405)
+            return
+
+        body = await read_body(receive, headers.get(b'content-length'))
+        if body is None:
+            await send_json(send, {'success': False, 'error': f'La petición supera el tamaño máximo de {MAX_CONTENT_LENGTH} bytes'}, 413)
+            return
+
+        response, status = await publish_batch_request(body)
+        await send_json(send, response, status)
+        return
+
+    if path.startswith('/jobs/') and method == 'GET':
+        job_id = path[len('/jobs/'):]
+
+        if not job_queue:
+            await send_json(send, {'success': False, 'error': 'El modo asíncrono no está activado'}, 404)
+            return
+
+        job = await asyncio.to_thread(job_queue.get, job_id)
+        if not job:
+            await send_json(send, {'success': False, 'error': f'No existe el trabajo {job_id}'}, 404)
+            return
+
+        await send_json(send, job)
+        return
+
+    await send_json(send, {'success': False, 'error': 'No encontrado'}, 404)
+
+async def publish(body, headers):
+    """
+    Publico un post recibido en /publish (ver el endpoint de Flask), en JSON
+    o como formulario multipart con los mismos límites por archivo.
+
+    Args:
+        body (bytes): Cuerpo de la petición
+        headers (dict): Cabeceras de la petición
+
+    Returns:
+        tuple: Respuesta y código de estado HTTP
+    """
+    request = upload_request(body, headers.get(b'content-type', b'').decode('latin-1'))
+
+    try:
+        # Leo el formulario en un hilo: los archivos se copian a sus búferes
+        if is_multipart(request):
+            data = await asyncio.to_thread(form_post, request)
+        else:
+            data = client_post(json.loads(body or b'null'))
+
+        if isinstance(data, dict) and headers.get(b'idempotency-key'):
+            data.setdefault('idempotency_key', headers[b'idempotency-key'].decode('latin-1'))
+
+        # Con el modo asíncrono encolo el post y respondo con el id del trabajo
+        if job_queue and data and data.get('async', True):
+            error = await asyncio.to_thread(validate_post, data)
+            if error:
+                return {'success': False, 'error': error}, 200
+
+            # Los archivos subidos esperan en data/uploads a que los publique
+            # un worker, calculo antes la clave con su contenido si la piden
+            if is_multipart(request):
+                data['idempotency_key'] = await asyncio.to_thread(post_key, data)
+                await asyncio.to_thread(save_uploads, data)
+
+            job_id = await asyncio.to_thread(job_queue.enqueue, data)
+
+            return {
+                'success': True,
+                'job_id': job_id,
+                'status': 'pending'
+            }, 202
+
+        with RequestProfile(headers.get(b'x-profile', b'').decode('latin-1')) as profile:
+            response = await publish_post_async(data)
+
+        if profile.name:
+            response['profile'] = profile.name
+
+        return response, 200
+
+    except RequestEntityTooLarge as e:
+        # Los límites de cada imagen traen su propio mensaje
+        return {
+            'success': False,
+            'error': e.description
+        }, 413
+
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e)
+        }, 200
+
+    finally:
+        # Cierro los búferes de los archivos subidos
+        request.close()
+
+async def publish_batch_request(body):
+    """
+    Publico un lote de posts recibido en /publish/batch (ver el endpoint de
+    Flask). publish_batch publica los posts con su propio pool de hilos, así
+    que lo ejecuto en un hilo para no bloquear el bucle.
+
+    Args:
+        body (bytes): Cuerpo de la petición
+
+    Returns:
+        tuple: Respuesta y código de estado HTTP
+    """
+    try:
+        data = json.loads(body or b'null') or {}
+        posts = data.get('posts')
+
+        for post in posts if isinstance(posts, list) else []:
+            client_post(post)
+
+        # Con el modo asíncrono encolo cada post y respondo con sus ids de trabajo
+        if job_queue and data.get('async', True):
+            error = validate_batch(posts)
+            if error:
+                return {'success': False, 'error': error}, 200
+
+            return await asyncio.to_thread(enqueue_batch, posts), 202
+
+        return await asyncio.to_thread(publish_batch, posts), 200
+
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e)
+        }, 200
+
+async def read_body(receive, content_length=None):
+    """
+    Leo el cuerpo completo de una petición, dejando de leer en cuanto supera
+    MAX_CONTENT_LENGTH.
+
+    Args:
+        receive (callable): Recibe los mensajes del servidor
+        content_length (bytes, optional): Cabecera Content-Length
+
+    Returns:
+        bytes: Cuerpo de la petición o None si supera el tamaño máximo
+    """
+    if content_length and content_length.isdigit() and int(content_length) > MAX_CONTENT_LENGTH:
+        return None
+
+    chunks = []
+    size = 0
+
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+
+        chunks.append(message.get('body', b''))
+        size += len(chunks[-1])
+        if size > MAX_CONTENT_LENGTH:
+            return None
+
+        if not message.get('more_body'):
+            break
+
+    return b''.join(chunks)
+
+async def send_json(send, data, status=200):
+    """
+    Envío una respuesta JSON.
+
+    Args:
+        send (callable): Envía los mensajes al servidor
+        data (dict): Datos de la respuesta
+        status (int): Código de estado HTTP
+    """
+    body = json.dumps(data).encode('utf-8')
+
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('ascii'))
+        ]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+async def lifespan(receive, send):
+    """
+    Respondo a los eventos de arranque y parada del servidor.
+
+    Args:
+        receive (callable): Recibe los mensajes del servidor
+        send (callable): Envía los mensajes al servidor
+    """
+    while True:
+        message = await receive()
+
+        if message['type'] == 'lifespan.startup':
+            asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=ASGI_MAX_THREADS, thread_name_prefix='asgi'))
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
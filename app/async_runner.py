@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Bucle de eventos persistente para las librerías asíncronas.
+
+En lugar de crear y cerrar un bucle con asyncio.run en cada publicación, las
+corrutinas se ejecutan en un único bucle que vive en un hilo propio durante
+toda la vida del servicio. Así los clientes asíncronos (como telegram.Bot)
+mantienen sus conexiones abiertas entre publicaciones, y varios hilos pueden
+enviar corrutinas a la vez.
+
+Las corrutinas se ejecutan con las variables de contexto de quien las envía
+(por ejemplo el colector de tiempos de la publicación).
+"""
+
+import asyncio
+import threading
+import contextvars
+
+_loop = None
+_thread = None
+_lock = threading.Lock()
+
+def get_loop():
+    """
+    Obtengo el bucle de eventos compartido, arrancándolo la primera vez que
+    se usa.
+
+    Returns:
+        asyncio.AbstractEventLoop: Bucle de eventos en ejecución
+    """
+    global _loop, _thread
+
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _thread = threading.Thread(target=_loop.run_forever, name='async-runner', daemon=True)
+            _thread.start()
+
+        return _loop
+
+def run(coroutine, timeout=None):
+    """
+    Ejecuto una corrutina en el bucle compartido y espero su resultado desde
+    código síncrono.
+
+    Args:
+        coroutine (coroutine): Corrutina a ejecutar
+        timeout (float, optional): Segundos máximos de espera
+
+    Returns:
+        object: Resultado de la corrutina
+    """
+    loop = get_loop()
+
+    # Esperar desde el propio hilo del bucle lo bloquearía para siempre
+    if threading.current_thread() is _thread:
+        coroutine.close()
+        raise RuntimeError('No se puede esperar una corrutina desde el bucle compartido')
+
+    future = asyncio.run_coroutine_threadsafe(_in_context(coroutine, contextvars.copy_context()), loop)
+    try:
+        return future.result(timeout)
+    except TimeoutError:
+        future.cancel()
+        raise
+
+async def run_async(coroutine):
+    """
+    Ejecuto una corrutina en el bucle compartido y espero su resultado desde
+    otro bucle de eventos (por ejemplo el del servidor ASGI) sin bloquearlo.
+
+    Args:
+        coroutine (coroutine): Corrutina a ejecutar
+
+    Returns:
+        object: Resultado de la corrutina
+    """
+    loop = get_loop()
+
+    if asyncio.get_running_loop() is loop:
+        return await coroutine
+
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(_in_context(coroutine, contextvars.copy_context()), loop))
+
+async def _in_context(coroutine, context):
+    """
+    Ejecuto una corrutina con las variables de contexto de otro hilo. La
+    tarea del bucle tiene su propia copia del contexto, así que los valores
+    no se mezclan entre corrutinas.
+
+    Args:
+        coroutine (coroutine): Corrutina a ejecutar
+        context (contextvars.Context): Contexto de quien envió la corrutina
+
+    Returns:
+        object: Resultado de la corrutina
+    """
+    for var, value in context.items():
+        var.set(value)
+
+    return await coroutine
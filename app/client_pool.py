@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Pool de clientes de las redes sociales por proyecto.
+
+Los clientes de cada librería (tweepy, Mastodon.py, telegram.Bot) se crean una
+sola vez por proyecto y se reutilizan entre publicaciones junto con sus
+sesiones HTTP, en lugar de configurarlos y abrir conexiones nuevas en cada
+post. Cada cliente se guarda con la huella de las credenciales con las que se
+creó: si el perfil del proyecto cambia sus credenciales, el cliente se
+descarta y se crea uno nuevo.
+"""
+
+import threading
+from media_cache import account_key
+
+class ClientPool:
+    """
+    Clientes reutilizables por red social y proyecto.
+    """
+
+    def __init__(self):
+        """
+        Inicializo el pool.
+        """
+        self._clients = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, network, project, credentials, factory):
+        """
+        Obtengo el cliente de una red social para un proyecto, creándolo si
+        no existe o si sus credenciales han cambiado.
+
+        Args:
+            network (str): Nombre del cliente (ej: la red social)
+            project (str): Nombre del proyecto
+            credentials (tuple): Datos con los que se crea el cliente
+            factory (callable): Crea el cliente si no está en el pool
+
+        Returns:
+            object: Cliente de la red social
+        """
+        key = (network, project)
+        fingerprint = account_key(*(str(value) for value in credentials))
+
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry and entry[0] == fingerprint:
+                self.hits += 1
+                return entry[1]
+
+        # Creo el cliente fuera del bloqueo, puede tardar
+        client = factory()
+
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry and entry[0] == fingerprint:
+                return entry[1]  # Otro hilo lo creó a la vez, uso el suyo
+
+            self._clients[key] = (fingerprint, client)
+            self.misses += 1
+
+        return client
+
+    def invalidate(self, network, project):
+        """
+        Descarto el cliente de una red social para un proyecto.
+
+        Args:
+            network (str): Nombre del cliente
+            project (str): Nombre del proyecto
+        """
+        with self._lock:
+            self._clients.pop((network, project), None)
+
+    def stats(self):
+        """
+        Obtengo los contadores del pool.
+
+        Returns:
+            dict: Aciertos, fallos y número de clientes guardados
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'items': len(self._clients)
+            }
+
+# Pool compartido por todas las publicaciones
+client_pool = ClientPool()
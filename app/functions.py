@@ -6,16 +6,116 @@ Funciones auxiliares para el procesamiento de datos.
 """
 
 import os
+import time
 import base64
 import uuid
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from PIL import Image
 from io import BytesIO
-import requests
-import shutil
+from http_client import get_session, HTTP_CONNECT_TIMEOUT
+from imghdr import what, header_info
+from image_cache import image_cache
+from image_profiles import DEFAULT_PROFILE, get_encoding_profile
+from image_decode import ImageTooLargeError, open_image, estimate_decode_bytes, decode_budget
+from metrics import IMAGE_DOWNLOAD_DURATION, IMAGE_DOWNLOAD_BYTES, IMAGE_STAGE_DURATION, IMAGE_RESULTS
+from timings import record, labels, run_in_context
 
 # Directorio temporal para almacenar imágenes (data/temp)
 TEMP_DIR = os.path.join('data', 'temp')
 
+# Directorio de las imágenes subidas que esperan en la cola del modo asíncrono
+UPLOADS_DIR = os.path.join('data', 'uploads')
+
+# Campo privado del post con las referencias upload:<id> que guardó el
+# propio servicio (ver save_uploads), las únicas que se aceptan
+UPLOADS_FIELD = '_uploads'
+
+# Bloque de lectura de las imágenes subidas
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Mantengo las imágenes procesadas en memoria en lugar de guardarlas en data/temp
+IMAGE_IN_MEMORY = os.getenv('IMAGE_IN_MEMORY', 'false').lower() == 'true'
+
+# Tamaño máximo en bytes de cada imagen recibida o descargada
+IMAGE_MAX_BYTES = int(os.getenv('IMAGE_MAX_BYTES', str(15 * 1024 * 1024)))
+
+# Segundos máximos para descargar cada imagen
+IMAGE_DOWNLOAD_TIMEOUT = float(os.getenv('IMAGE_DOWNLOAD_TIMEOUT', '20'))
+
+# Número máximo de imágenes que proceso a la vez
+IMAGE_MAX_WORKERS = int(os.getenv('IMAGE_MAX_WORKERS', '4'))
+
+# Núcleos disponibles para el proceso (respetando los límites del contenedor)
+AVAILABLE_CPUS = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+
+# Procesos que optimizan imágenes en paralelo (0 = en el propio hilo de la petición)
+IMAGE_PROCESS_WORKERS = int(os.getenv('IMAGE_PROCESS_WORKERS', str(AVAILABLE_CPUS)))
+
+# Las imágenes de hasta este tamaño se optimizan en el propio hilo, enviarlas
+# a otro proceso cuesta más que optimizarlas
+IMAGE_INLINE_MAX_BYTES = int(os.getenv('IMAGE_INLINE_MAX_BYTES', str(256 * 1024)))
+
+# Tamaño de cada bloque al descargar una imagen
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Formatos en los que puedo bajar la calidad para ajustarme al peso máximo
+LOSSY_FORMATS = ('jpeg', 'webp')
+
+# Veces que reduzco el tamaño de una imagen que no cabe en el peso máximo ni
+# con la calidad mínima, y factor de cada reducción
+BUDGET_MAX_DOWNSCALES = 4
+BUDGET_DOWNSCALE_FACTOR = 0.75
+
+# Formatos que envío tal cual a las redes sociales, el resto los paso a JPEG
+MIME_TYPES = {
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'gif': 'image/gif',
+    'webp': 'image/webp'
+}
+
+class MemoryImage:
+    """
+    Imagen procesada que se mantiene en memoria (modo IMAGE_IN_MEMORY).
+    Las redes sociales la suben directamente desde sus bytes.
+    """
+
+    def __init__(self, data, img_format):
+        """
+        Inicializo la imagen.
+
+        Args:
+            data (bytes): Contenido de la imagen ya codificada
+            img_format (str): Formato de la imagen (jpeg, png, gif o webp)
+        """
+        self.data = data
+        self.format = img_format
+        self.name = f"{uuid.uuid4()}.{img_format}"
+        self._hash = None
+
+    @property
+    def hash(self):
+        if self._hash is None:
+            self._hash = hashlib.sha256(self.data).hexdigest()
+        return self._hash
+
+    @property
+    def mime_type(self):
+        return MIME_TYPES.get(self.format, 'image/jpeg')
+
+    def open(self):
+        """
+        Abro la imagen como un archivo en memoria.
+
+        Returns:
+            BytesIO: Contenido de la imagen
+        """
+        return BytesIO(self.data)
+
 def process_hashtags(hashtags):
     """
     Proceso una lista de hashtags añadiendo el símbolo # al principio si no
@@ -43,156 +143,692 @@ def process_hashtags(hashtags):
     
     return processed_hashtags
 
-def process_images(images):
+def process_images(images, network_names=None):
     """
     Proceso una lista de imágenes, limitando a 4 como máximo.
-    Puede recibir URLs o imágenes en base64.
+    Puede recibir URLs o imágenes en base64. Las imágenes se descargan y
+    optimizan a la vez, manteniendo el orden en el que se recibieron.
+
+    Si recibo las redes sociales en las que se va a publicar, preparo cada
+    imagen según el perfil de codificación de cada red (ver image_profiles),
+    generando solo las variantes distintas y compartiéndolas entre las redes
+    con el mismo perfil.
     
     Args:
-        images (list): Lista de imágenes (URLs o base64)
+        images (list): Lista de imágenes (URLs, base64 o archivos subidos)
+        network_names (list, optional): Nombres de las redes sociales
         
     Returns:
-        list: Lista de rutas a las imágenes procesadas
+        list|dict: Lista de imágenes procesadas (rutas en data/temp o
+                   MemoryImage si está activado IMAGE_IN_MEMORY) con el perfil
+                   por defecto, o un diccionario con la lista de cada red
+                   social si se indicaron sus nombres
     """
-    if not images:
-        return []
-    
-    # Creo el directorio temporal si no existe en "data/temp"
-    os.makedirs(TEMP_DIR, exist_ok=True)
-    
-    # Limito a 4 imágenes (estándar para redes, descarto las demás)
-    images = images[:4]
-    
+    profiles = {name: get_encoding_profile(name) for name in network_names or []}
+    variants = list(dict.fromkeys(profiles.values())) or [DEFAULT_PROFILE]
+
     processed_images = []
-    for img in images:
-        try:
-            img_path = None
-            
-            # Compruebo si es una URL
-            if img.startswith(('http://', 'https://')):
-                img_path = download_image(img)
-            # Compruebo si es base64
-            elif img.startswith(('data:image', 'base64:')):
-                img_path = save_base64_image(img)
-            
-            if img_path:
-                # Optimizo imagen para redes sociales
-                optimized_path = optimize_image(img_path)
-                processed_images.append(optimized_path)
-                
-                # Elimino imagen original si es diferente de la optimizada
-                if optimized_path != img_path:
-                    os.remove(img_path)
-        except Exception as e:
-            print(f"Error procesando imagen: {str(e)}")
-    
-    return processed_images
 
-def download_image(url):
+    if images:
+        # Creo el directorio temporal si no existe en "data/temp"
+        if not IMAGE_IN_MEMORY:
+            os.makedirs(TEMP_DIR, exist_ok=True)
+        
+        # Limito a 4 imágenes (estándar para redes, descarto las demás)
+        images = images[:4]
+
+        def process(index, img):
+            with labels(image=index):
+                return process_image(img, variants)
+
+        if IMAGE_MAX_WORKERS <= 1 or len(images) == 1:
+            processed_images = [process(index, img) for index, img in enumerate(images)]
+        else:
+            with ThreadPoolExecutor(max_workers=min(IMAGE_MAX_WORKERS, len(images))) as executor:
+                processed_images = list(executor.map(run_in_context(process), range(len(images)), images))
+
+        processed_images = [outputs for outputs in processed_images if outputs]
+
+    # Guardo cada resultado distinto una sola vez aunque lo usen varias redes
+    stored = {}
+    def store(img_data, img_format):
+        key = hashlib.sha256(img_data).hexdigest()
+        if key not in stored:
+            stored[key] = store_image(img_data, img_format)
+        return stored[key]
+
+    if network_names is None:
+        return [store(*outputs[DEFAULT_PROFILE]) for outputs in processed_images]
+
+    return {
+        name: [store(*outputs[profile]) for outputs in processed_images]
+        for name, profile in profiles.items()
+    }
+
+def process_image(img, variants=(DEFAULT_PROFILE,)):
+    """
+    Proceso una imagen: la descargo o decodifico y la optimizo para cada
+    perfil de codificación. La imagen viaja en memoria durante todo el
+    proceso y solo se decodifica una vez.
+    Si ya optimicé antes la misma imagen la tomo de la caché, y si es una URL
+    que no ha cambiado en el servidor ni siquiera la descargo.
+
+    Args:
+        img (str|file): Imagen (URL, base64, referencia upload:<id> o
+                        archivo subido en una petición multipart)
+        variants (list): Perfiles de codificación para los que preparar la imagen
+
+    Returns:
+        dict: Contenido y formato de la imagen por cada perfil o None si no
+              se pudo procesar
     """
-    Descarga una imagen desde una URL.
+    try:
+        img_data = None
+        validators = {}
+        is_url = isinstance(img, str) and img.startswith(('http://', 'https://'))
+
+        # Compruebo si es un archivo subido
+        if not isinstance(img, str) or img.startswith('upload:'):
+            img_data = read_upload(img)
+        # Compruebo si es una URL
+        elif is_url:
+            url_entry = image_cache.get_url(img)
+            img_data, validators = download_image(img, url_entry)
+
+            # El servidor confirma que no ha cambiado, uso las versiones en caché
+            if img_data is None:
+                image_cache.revalidated()
+                outputs = {}
+                for profile in variants:
+                    cached = image_cache.get(image_cache.key(url_entry['hash'], profile.signature))
+                    if not cached:
+                        break
+                    outputs[profile] = cached
+                else:
+                    IMAGE_RESULTS.inc(len(outputs), source='cache')
+                    return outputs
+
+                img_data, validators = download_image(img)
+        # Compruebo si es base64
+        elif img.startswith(('data:image', 'base64:')):
+            img_data = decode_base64_image(img)
+        
+        if img_data:
+            source_hash = hashlib.sha256(img_data).hexdigest()
+
+            if is_url:
+                image_cache.set_url(img, source_hash, **validators)
+
+            outputs = {}
+            for profile in variants:
+                cached = image_cache.get(image_cache.key(source_hash, profile.signature))
+                if cached:
+                    outputs[profile] = cached
+                    IMAGE_RESULTS.inc(source='cache')
+
+            # Envío tal cual la imagen a las redes cuyos límites ya cumple
+            info = header_info(img_data)
+            for profile in variants:
+                if profile not in outputs and fits_profile(info, len(img_data), profile):
+                    outputs[profile] = (img_data, info['format'])
+                    image_cache.put(image_cache.key(source_hash, profile.signature), *outputs[profile])
+                    IMAGE_RESULTS.inc(source='passthrough')
+
+            # Optimizo imagen para redes sociales, solo los perfiles que faltan
+            missing = [profile for profile in variants if profile not in outputs]
+            if missing:
+                for profile, output in zip(missing, run_optimize_image(img_data, missing)):
+                    image_cache.put(image_cache.key(source_hash, profile.signature), *output)
+                    outputs[profile] = output
+                IMAGE_RESULTS.inc(len(missing), source='optimized')
+
+            return outputs
+    except Exception as e:
+        print(f"Error procesando imagen: {str(e)}")
+
+    return None
+
+def fits_profile(info, size, profile):
+    """
+    Compruebo si una imagen ya cumple los límites de un perfil de
+    codificación y se puede enviar sin volver a codificarla, lo que ahorra
+    CPU y evita perder calidad en cada recodificación.
+
+    Las imágenes con transparencia o en CMYK se procesan siempre (se
+    convierten a RGB), y también las que llevan metadatos (EXIF, XMP, IPTC o
+    textos de PNG), para no publicar datos como la ubicación de la foto.
+
+    Args:
+        info (dict): Datos de la cabecera de la imagen (ver header_info)
+        size (int): Tamaño en bytes de la imagen
+        profile (EncodingProfile): Perfil de codificación
+
+    Returns:
+        bool: True si se puede enviar la imagen original
+    """
+    if not info or info['metadata'] or info['mode'] not in ('L', 'RGB', 'P'):
+        return False
+
+    if info['format'] not in profile.formats:
+        return False
+
+    if max(info['width'], info['height']) > profile.max_size:
+        return False
+
+    return not profile.max_bytes or size <= profile.max_bytes
+
+def download_image(url, validators=None):
+    """
+    Descarga una imagen desde una URL. Aborto la descarga en cuanto supera
+    IMAGE_MAX_BYTES (según Content-Length o los bytes recibidos) o tarda más
+    de IMAGE_DOWNLOAD_TIMEOUT segundos.
     
     Args:
         url (str): URL de la imagen
+        validators (dict, optional): etag y last_modified de una descarga
+                                     anterior para pedir la imagen solo si
+                                     ha cambiado
         
     Returns:
-        str: Ruta local de la imagen descargada
+        tuple: Contenido de la imagen descargada (None si el servidor
+               responde que no ha cambiado) y sus nuevos etag y last_modified
     """
-    response = requests.get(url, stream=True)
-    if response.status_code == 200:
-        # Genero nombre único para la imagen
-        file_ext = os.path.splitext(url.split('/')[-1])[-1]
-        if not file_ext:
-            file_ext = '.jpg'  # Extensión por defecto... a ver si esto no falla XD
-        
-        filename = f"{uuid.uuid4()}{file_ext}"
-        filepath = os.path.join(TEMP_DIR, filename)
-        
-        # Guardo imagen
-        with open(filepath, 'wb') as f:
-            response.raw.decode_content = True
-            shutil.copyfileobj(response.raw, f)
-            
-        return filepath
-    else:
-        raise Exception(f"No se pudo descargar la imagen: {response.status_code}")
+    started = time.perf_counter()
+    deadline = time.monotonic() + IMAGE_DOWNLOAD_TIMEOUT
+
+    headers = {}
+    if validators:
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+
+    # Uso la sesión compartida para reutilizar conexiones con el mismo host
+    response = get_session('images').get(url, stream=True, headers=headers, timeout=(HTTP_CONNECT_TIMEOUT, IMAGE_DOWNLOAD_TIMEOUT))
+    with response:
+        new_validators = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified')
+        }
+
+        if response.status_code == 304 and headers:
+            record('image.download', time.perf_counter() - started, IMAGE_DOWNLOAD_DURATION)
+            return None, new_validators
 
-def save_base64_image(base64_str):
+        if response.status_code != 200:
+            raise Exception(f"No se pudo descargar la imagen: {response.status_code}")
+
+        content_length = response.headers.get('Content-Length')
+        if content_length and content_length.isdigit() and int(content_length) > IMAGE_MAX_BYTES:
+            raise Exception(f"La imagen supera el tamaño máximo de {IMAGE_MAX_BYTES} bytes")
+
+        # Descargo la imagen por bloques, controlando tamaño y tiempo
+        img_data = bytearray()
+        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+            img_data += chunk
+            if len(img_data) > IMAGE_MAX_BYTES:
+                raise Exception(f"La imagen supera el tamaño máximo de {IMAGE_MAX_BYTES} bytes")
+
+            if time.monotonic() > deadline:
+                raise Exception(f"La descarga de la imagen superó {IMAGE_DOWNLOAD_TIMEOUT} segundos")
+
+        record('image.download', time.perf_counter() - started, IMAGE_DOWNLOAD_DURATION)
+        IMAGE_DOWNLOAD_BYTES.inc(len(img_data))
+
+        return bytes(img_data), new_validators
+
+def decode_base64_image(base64_str):
     """
-    Guarda una imagen en base64.
+    Decodifico una imagen en base64.
     
     Args:
         base64_str (str): Imagen en formato base64
         
     Returns:
-        str: Ruta local de la imagen guardada
+        bytes: Contenido de la imagen
     """
     # Extraigo datos de base64
     if 'base64,' in base64_str:
         base64_str = base64_str.split('base64,')[1]
+    elif base64_str.startswith('base64:'):
+        base64_str = base64_str[len('base64:'):]
     
+    # Compruebo el tamaño antes de decodificar (base64 ocupa 4 bytes por cada 3)
+    if len(base64_str) * 3 // 4 > IMAGE_MAX_BYTES:
+        raise Exception(f"La imagen supera el tamaño máximo de {IMAGE_MAX_BYTES} bytes")
+
     # Decodifico base64
-    img_data = base64.b64decode(base64_str)
-    
-    # Determino formato de imagen
-    img = Image.open(BytesIO(img_data))
-    img_format = img.format.lower() if img.format else 'jpeg'
-    
-    # Genero nombre único para la imagen
-    filename = f"{uuid.uuid4()}.{img_format}"
-    filepath = os.path.join(TEMP_DIR, filename)
-    
-    # Guardo imagen
-    img.save(filepath)
-    
-    return filepath
+    return base64.b64decode(base64_str)
+
+def read_upload(upload):
+    """
+    Leo una imagen subida en una petición multipart, desde su búfer o desde
+    data/uploads si la guardó el modo asíncrono (ver save_uploads).
+
+    Args:
+        upload (str|file): Referencia upload:<id> o archivo subido
+
+    Returns:
+        bytes: Contenido de la imagen
+    """
+    if isinstance(upload, str):
+        with open(upload_path(upload), 'rb') as f:
+            img_data = f.read(IMAGE_MAX_BYTES + 1)
+    else:
+        upload.seek(0)
+        img_data = upload.read(IMAGE_MAX_BYTES + 1)
+
+    if len(img_data) > IMAGE_MAX_BYTES:
+        raise Exception(f"La imagen supera el tamaño máximo de {IMAGE_MAX_BYTES} bytes")
+
+    return img_data
+
+def upload_path(reference):
+    """
+    Obtengo la ruta en data/uploads de una imagen subida.
+
+    Args:
+        reference (str): Referencia upload:<id>
+
+    Returns:
+        str: Ruta del archivo
+    """
+    upload_id = reference[len('upload:'):]
+    if not upload_id.isascii() or not upload_id.isalnum():
+        raise Exception(f"Referencia de imagen subida no válida: {reference}")
+
+    return os.path.join(UPLOADS_DIR, upload_id)
+
+def upload_hash(upload):
+    """
+    Calculo el hash del contenido de una imagen subida sin cargarla entera
+    en memoria.
+
+    Args:
+        upload (file): Archivo subido
+
+    Returns:
+        str: Hash SHA-256 del contenido
+    """
+    digest = hashlib.sha256()
+
+    upload.seek(0)
+    for chunk in iter(lambda: upload.read(UPLOAD_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    upload.seek(0)
+
+    return digest.hexdigest()
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+def get_process_pool():
+    """
+    Obtengo el pool de procesos que optimiza las imágenes, creándolo la
+    primera vez que se usa. Los procesos se arrancan con spawn: el servicio
+    tiene hilos en marcha y hacer fork con hilos puede dejar bloqueos
+    retenidos en el proceso hijo.
+
+    Returns:
+        ProcessPoolExecutor: Pool de procesos compartido
+    """
+    global _process_pool
+
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=IMAGE_PROCESS_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
 
-def optimize_image(img_path):
+        return _process_pool
+
+def reset_process_pool(pool):
+    """
+    Descarto un pool de procesos roto (por ejemplo si el sistema mató un
+    proceso por falta de memoria) para crear uno nuevo en el siguiente uso.
+
+    Args:
+        pool (ProcessPoolExecutor): Pool roto
+    """
+    global _process_pool
+
+    with _process_pool_lock:
+        if _process_pool is pool:
+            _process_pool = None
+
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def run_optimize_image(img_data, profiles):
+    """
+    Optimizo una imagen en el pool de procesos, así varias peticiones con
+    imágenes grandes usan todos los núcleos en lugar de competir por el GIL.
+    Las imágenes pequeñas se optimizan en el propio hilo.
+
+    Args:
+        img_data (bytes): Contenido de la imagen a optimizar
+        profiles (list): Perfiles de codificación
+
+    Returns:
+        list: Contenido y formato de la imagen optimizada para cada perfil
+    """
+    # Reservo la memoria que ocupará decodificada antes de decodificarla
+    try:
+        decode_bytes = estimate_decode_bytes(img_data, max(profile.max_size for profile in profiles))
+    except ImageTooLargeError:
+        raise
+    except Exception:
+        decode_bytes = 0  # No es una imagen que Pillow reconozca, optimize_image devuelve la original
+
+    with decode_budget.reserve(decode_bytes):
+        if IMAGE_PROCESS_WORKERS <= 0 or len(img_data) <= IMAGE_INLINE_MAX_BYTES:
+            outputs, timings = optimize_image_timed(img_data, profiles)
+        else:
+            outputs, timings = optimize_image_in_pool(img_data, profiles)
+
+    # Los tiempos se midieron donde se optimizó, los registro en este proceso
+    for stage, seconds in timings.items():
+        record(f'image.{stage}', seconds, IMAGE_STAGE_DURATION, stage=stage)
+
+    return outputs
+
+def optimize_image_in_pool(img_data, profiles):
+    """
+    Optimizo una imagen en el pool de procesos. Si el pool se ha roto la
+    optimizo en el propio hilo.
+
+    Args:
+        img_data (bytes): Contenido de la imagen a optimizar
+        profiles (list): Perfiles de codificación
+
+    Returns:
+        tuple: Resultado de optimize_image y segundos de cada fase
     """
-    Optimizo una imagen para redes sociales.
+    pool = get_process_pool()
+    try:
+        return pool.submit(optimize_image_timed, img_data, list(profiles)).result()
+    except BrokenProcessPool:
+        print("El pool de procesos de imágenes se ha roto, optimizo en el hilo de la petición")
+        reset_process_pool(pool)
+
+    return optimize_image_timed(img_data, profiles)
+
+def optimize_image_timed(img_data, profiles):
+    """
+    Optimizo una imagen midiendo cuánto tarda cada fase, para poder
+    registrar los tiempos aunque se optimice en otro proceso.
+
+    Args:
+        img_data (bytes): Contenido de la imagen a optimizar
+        profiles (list): Perfiles de codificación
+
+    Returns:
+        tuple: Resultado de optimize_image y segundos de decode y de
+               encode (redimensionado y codificación de todos los perfiles)
+    """
+    timings = {}
+    return optimize_image(img_data, profiles, timings), timings
+
+def optimize_image(img_data, profiles=(DEFAULT_PROFILE,), timings=None):
+    """
+    Optimizo una imagen para redes sociales, una vez por cada perfil de
+    codificación a partir de una única decodificación. Los perfiles que
+    acaban con el mismo tamaño, formato y calidad comparten la codificación
+    (y también los intentos de ajustar el peso), así solo codifico las
+    variantes distintas.
     
     Args:
-        img_path (str): Ruta de la imagen a optimizar
+        img_data (bytes): Contenido de la imagen a optimizar
+        profiles (list): Perfiles de codificación
+        timings (dict, optional): Recibe los segundos de decode y encode
         
     Returns:
-        str: Ruta de la imagen optimizada
+        list: Contenido y formato de la imagen optimizada para cada perfil.
+              Si no se puede optimizar devuelvo la imagen original
     """
+    timings = {} if timings is None else timings
+
     try:
-        img = Image.open(img_path)
-        
-        # Redimensiono si es demasiado grande
-        max_size = 1280  # Tamaño máximo para la mayoría de redes sociales, debería bastar en calidad (espero...)
-        if img.width > max_size or img.height > max_size:
-            img.thumbnail((max_size, max_size), Image.LANCZOS)
-        
+        # Solo decodifico a la escala que necesita el perfil más grande
+        started = time.perf_counter()
+        source = open_image(img_data, max(profile.max_size for profile in profiles))
+        source.load()
+        timings['decode'] = time.perf_counter() - started
+        source_format = source.format.lower() if source.format else 'jpeg'
+
         # Convierto a RGB si es necesario (para PNG con transparencia)
-        if img.mode in ('RGBA', 'LA'):
-            background = Image.new('RGB', img.size, (255, 255, 255))
-            background.paste(img, mask=img.split()[3])  # 3 es el canal alfa
-            img = background
-        
-        # Genero nombre para la imagen optimizada
-        filename = os.path.basename(img_path)
-        optimized_path = os.path.join(TEMP_DIR, f"opt_{filename}")
-        
-        # Guardo imagen optimizada
-        img.save(optimized_path, quality=85, optimize=True)
-        
-        return optimized_path
+        if source.mode in ('RGBA', 'LA'):
+            background = Image.new('RGB', source.size, (255, 255, 255))
+            background.paste(source, mask=source.getchannel('A'))
+            source = background
+
+        started = time.perf_counter()
+        outputs = []
+        resized = {}
+        encodes = {}
+        for profile in profiles:
+            img = source
+
+            # Mantengo el formato original si la red lo acepta, si no uso su formato preferido
+            img_format = source_format if source_format in profile.formats else profile.formats[0]
+
+            # Redimensiono si es demasiado grande (una vez por tamaño máximo)
+            if img.width > profile.max_size or img.height > profile.max_size:
+                if profile.max_size not in resized:
+                    resized[profile.max_size] = img.copy()
+                    resized[profile.max_size].thumbnail((profile.max_size, profile.max_size), Image.LANCZOS)
+                img = resized[profile.max_size]
+
+            outputs.append(encode_image(img, img_format, profile, encodes))
+
+        timings['encode'] = time.perf_counter() - started
+
+        return outputs
+    except ImageTooLargeError:
+        raise  # Nunca devuelvo la original de una imagen que no se debe decodificar
     except Exception as e:
         print(f"Error optimizando imagen: {str(e)}")
-        return img_path  # Devuelvo la ruta original si hay error
+        img_format = what(None, h=img_data[:32]) or 'jpeg'
+        return [(img_data, img_format) for _ in profiles]  # Devuelvo la imagen original si hay error
+
+def encode_image(img, img_format, profile, encodes=None):
+    """
+    Codifico una imagen ajustándome al peso máximo del perfil. Si no cabe,
+    busco la mayor calidad que cabe entre quality y min_quality y, si ni
+    con la mínima cabe, reduzco el tamaño y vuelvo a buscar.
+
+    Args:
+        img (PIL.Image.Image): Imagen decodificada
+        img_format (str): Formato de salida
+        profile (EncodingProfile): Perfil de codificación
+        encodes (dict, optional): Codificaciones ya hechas de la misma imagen
+                                  por tamaño, formato y calidad, compartidas
+                                  entre los perfiles de una optimización
+
+    Returns:
+        tuple: Contenido y formato de la imagen codificada
+    """
+    encodes = {} if encodes is None else encodes
+
+    def save(img, quality):
+        # Los formatos sin pérdida no usan la calidad
+        key = (img.size, img_format, quality if img_format in LOSSY_FORMATS else None)
+        if key not in encodes:
+            encodes[key] = save_image(img, img_format, quality)
+        return encodes[key]
+
+    img_data = save(img, profile.quality)
+    if not profile.max_bytes or len(img_data) <= profile.max_bytes:
+        return img_data, img_format
+
+    # Los formatos sin pérdida no tienen calidad que bajar, paso a uno con pérdida
+    if img_format not in LOSSY_FORMATS:
+        lossy_formats = [fmt for fmt in profile.formats if fmt in LOSSY_FORMATS]
+        if not lossy_formats:
+            return img_data, img_format
+        img_format = lossy_formats[0]
+
+    for _ in range(BUDGET_MAX_DOWNSCALES + 1):
+        # Búsqueda binaria de la mayor calidad que cabe en el peso máximo
+        low, high = profile.min_quality, profile.quality
+        best = None
+        while low <= high:
+            quality = (low + high) // 2
+            candidate = save(img, quality)
+            if len(candidate) <= profile.max_bytes:
+                best = candidate
+                low = quality + 1
+            else:
+                img_data = candidate
+                high = quality - 1
+
+        if best:
+            return best, img_format
+
+        img = img.resize((max(1, int(img.width * BUDGET_DOWNSCALE_FACTOR)),
+                          max(1, int(img.height * BUDGET_DOWNSCALE_FACTOR))), Image.LANCZOS)
+
+    return img_data, img_format  # Devuelvo el intento más pequeño aunque no quepa
+
+def save_image(img, img_format, quality):
+    """
+    Codifico una imagen en un formato.
+
+    Args:
+        img (PIL.Image.Image): Imagen decodificada
+        img_format (str): Formato de salida
+        quality (int): Calidad para JPEG y WebP
+
+    Returns:
+        bytes: Contenido de la imagen codificada
+    """
+    if img_format == 'jpeg' and img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    elif img_format == 'webp' and img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGB')
+
+    output = BytesIO()
+    img.save(output, format=img_format, quality=quality, optimize=True)
+
+    return output.getvalue()
+
+def store_image(img_data, img_format):
+    """
+    Guardo una imagen procesada para entregarla a las redes sociales: en
+    memoria si está activado IMAGE_IN_MEMORY o en data/temp si no.
+
+    Args:
+        img_data (bytes): Contenido de la imagen
+        img_format (str): Formato de la imagen
+
+    Returns:
+        str|MemoryImage: Ruta de la imagen guardada o imagen en memoria
+    """
+    if IMAGE_IN_MEMORY:
+        return MemoryImage(img_data, img_format)
+
+    filepath = os.path.join(TEMP_DIR, f"{uuid.uuid4()}.{img_format}")
+
+    with open(filepath, 'wb') as f:
+        f.write(img_data)
+
+    return filepath
+
+def read_image(image):
+    """
+    Obtengo el contenido de una imagen procesada.
+
+    Args:
+        image (str|MemoryImage): Ruta de la imagen o imagen en memoria
+
+    Returns:
+        bytes: Contenido de la imagen
+    """
+    if isinstance(image, MemoryImage):
+        return image.data
+
+    with open(image, 'rb') as f:
+        return f.read()
+
+def image_mime_type(image):
+    """
+    Obtengo el tipo MIME de una imagen procesada a partir de su contenido.
+
+    Args:
+        image (str|MemoryImage): Ruta de la imagen o imagen en memoria
+
+    Returns:
+        str: Tipo MIME de la imagen
+    """
+    if isinstance(image, MemoryImage):
+        return image.mime_type
+
+    return MIME_TYPES.get(what(image), 'image/jpeg')
+
+def image_size(image):
+    """
+    Obtengo el tamaño en bytes de una imagen procesada.
+
+    Args:
+        image (str|MemoryImage): Ruta de la imagen o imagen en memoria
+
+    Returns:
+        int: Bytes de la imagen
+    """
+    if isinstance(image, MemoryImage):
+        return len(image.data)
+
+    return os.path.getsize(image)
+
+def image_hash(image):
+    """
+    Calculo el hash del contenido de una imagen procesada.
+
+    Args:
+        image (str|MemoryImage): Ruta de la imagen o imagen en memoria
+
+    Returns:
+        str: Hash SHA-256 del contenido
+    """
+    if isinstance(image, MemoryImage):
+        return image.hash
+
+    return hashlib.sha256(read_image(image)).hexdigest()
 
 def cleanup_images(image_paths):
     """
     Elimina las imágenes temporales.
     
     Args:
-        image_paths (list): Lista de rutas de imágenes a eliminar
+        image_paths (list): Lista de imágenes a eliminar (las imágenes en
+                            memoria se ignoran)
     """
     for path in image_paths:
+        if isinstance(path, MemoryImage):
+            continue
+
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except Exception as e:
+            print(f"Error eliminando imagen {path}: {str(e)}")
+
+def cleanup_uploads(images):
+    """
+    Elimina las imágenes subidas que guardó el modo asíncrono en
+    data/uploads.
+
+    Args:
+        images (list): Referencias upload:<id> que guardó el servicio para
+                       el post (su campo UPLOADS_FIELD)
+    """
+    for image in images or []:
+        if not isinstance(image, str) or not image.startswith('upload:'):
+            continue
+
         try:
+            path = upload_path(image)
             if os.path.exists(path):
                 os.remove(path)
         except Exception as e:
-            print(f"Error eliminando imagen {path}: {str(e)}")
\ No newline at end of file
+            print(f"Error eliminando imagen subida {image}: {str(e)}")
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Sesiones HTTP compartidas con conexiones persistentes (keep-alive).
+
+Cada sesión mantiene un pool de conexiones por host que se reutiliza entre
+peticiones y publicaciones, en lugar de abrir una conexión TCP y TLS nueva en
+cada llamada. Todas las peticiones llevan timeout por defecto y se reintentan
+solo si falla la conexión (la petición no llegó a enviarse, así que es seguro
+reintentar también los POST).
+
+Las redes con cliente asíncrono usan un cliente de httpx con la misma
+configuración (ver get_async_client).
+"""
+
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Segundos máximos para establecer la conexión
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+
+# Segundos máximos esperando datos del servidor
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '30'))
+
+# Conexiones abiertas que mantengo por cada host
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '10'))
+
+# Reintentos cuando no se puede establecer la conexión
+HTTP_CONNECT_RETRIES = int(os.getenv('HTTP_CONNECT_RETRIES', '2'))
+
+# Número de hosts distintos de los que mantengo pool en cada sesión
+HTTP_POOL_HOSTS = 20
+
+class TimeoutSession(requests.Session):
+    """
+    Sesión de requests que aplica los timeouts por defecto a cada petición.
+    """
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+        return super().request(method, url, **kwargs)
+
+_sessions = {}
+_lock = threading.Lock()
+
+def get_session(name='default'):
+    """
+    Obtengo una sesión HTTP compartida. Uso una sesión por uso (ej: bluesky,
+    images) para que los pools de un servicio no desplacen a los de otro.
+
+    Args:
+        name (str): Nombre de la sesión
+
+    Returns:
+        TimeoutSession: Sesión con pool de conexiones persistentes
+    """
+    session = _sessions.get(name)
+    if session:
+        return session
+
+    with _lock:
+        session = _sessions.get(name)
+        if session:
+            return session
+
+        retries = Retry(
+            total=None,
+            connect=HTTP_CONNECT_RETRIES,
+            read=0,
+            status=0,
+            other=0,
+            backoff_factor=0.3,
+            allowed_methods=None,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(
+            pool_connections=HTTP_POOL_HOSTS,
+            pool_maxsize=HTTP_POOL_MAXSIZE,
+            max_retries=retries
+        )
+
+        session = TimeoutSession()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        _sessions[name] = session
+
+    return session
+
+_async_clients = {}
+
+def get_async_client(name='default'):
+    """
+    Obtengo un cliente HTTP asíncrono compartido (httpx) con los mismos
+    timeouts, pool y reintentos de conexión que las sesiones de requests. Un
+    cliente asíncrono queda ligado al bucle de eventos en el que se usa, así
+    que solo lo uso desde el bucle compartido (ver async_runner).
+
+    Args:
+        name (str): Nombre del cliente
+
+    Returns:
+        httpx.AsyncClient: Cliente con pool de conexiones persistentes
+    """
+    import httpx
+
+    with _lock:
+        client = _async_clients.get(name)
+        if client is None:
+            transport = httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(max_connections=None, max_keepalive_connections=HTTP_POOL_MAXSIZE),
+                retries=HTTP_CONNECT_RETRIES
+            )
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+                transport=transport
+            )
+            _async_clients[name] = client
+
+        return client
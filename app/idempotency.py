@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Registro de publicaciones recientes para que los reintentos sean seguros.
+
+Cada publicación correcta se guarda en SQLite por proyecto, red social y
+clave de idempotencia. Si llega otra vez el mismo post (un reintento del
+cliente tras un error o un timeout) se devuelve el resultado guardado de las
+redes en las que ya se publicó, y solo se publica en las que fallaron.
+
+La clave la envía el cliente (campo idempotency_key o cabecera
+Idempotency-Key). Con el valor auto se calcula con el hash del contenido del
+post, así que un post idéntico se considera el mismo durante
+IDEMPOTENCY_TTL_HOURS. Sin clave no se evita ningún duplicado: cada petición
+es una publicación nueva.
+
+Mientras un proceso publica un post en una red lo reclama en SQLite, así dos
+peticiones con la misma clave (en cualquier proceso del servicio) no publican
+las dos: la segunda espera a que termine la primera y devuelve su resultado.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+from contextlib import contextmanager
+from functions import upload_hash
+
+# Horas que recuerdo cada publicación (0 = desactivado)
+IDEMPOTENCY_TTL_HOURS = float(os.getenv('IDEMPOTENCY_TTL_HOURS', '24'))
+
+# Base de datos donde guardo las publicaciones recientes
+IDEMPOTENCY_DB = os.getenv('IDEMPOTENCY_DB', os.path.join('data', 'idempotency.sqlite3'))
+
+# Segundos que dura la reclamación de una publicación en curso; si el proceso
+# que la reclamó muere, otra petición puede publicar pasado este tiempo
+IDEMPOTENCY_CLAIM_SECONDS = float(os.getenv('IDEMPOTENCY_CLAIM_SECONDS', '300'))
+
+# Segundos entre comprobaciones mientras espero a otra petición con la misma clave
+IDEMPOTENCY_CLAIM_POLL = 0.5
+
+# Clave con la que el cliente pide calcularla con el contenido del post
+AUTO_KEY = 'auto'
+
+def post_key(data):
+    """
+    Obtengo la clave de idempotencia de un post: la que envía el cliente o,
+    si envía auto, el hash de su contenido. Las imágenes subidas como archivo
+    cuentan por el hash de su contenido.
+
+    Args:
+        data (dict): Datos del post (ver endpoint /publish)
+
+    Returns:
+        str: Clave de idempotencia o None si el cliente no la envía
+    """
+    key = data.get('idempotency_key')
+    if not key:
+        return None
+
+    if key != AUTO_KEY:
+        return str(key)
+
+    content = {field: data.get(field) for field in ('content', 'title', 'hashtags')}
+    content['images'] = [image if isinstance(image, str) else upload_hash(image) for image in data.get('images') or []] or None
+
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode('utf-8')).hexdigest()
+
+class IdempotencyStore:
+    """
+    Resultados de las publicaciones recientes guardados en SQLite.
+    """
+
+    def __init__(self, db_path=IDEMPOTENCY_DB, ttl_hours=IDEMPOTENCY_TTL_HOURS, claim_seconds=IDEMPOTENCY_CLAIM_SECONDS):
+        """
+        Inicializo el registro. Las tablas se crean en el primer uso.
+
+        Args:
+            db_path (str): Ruta de la base de datos SQLite
+            ttl_hours (float): Horas que recuerdo cada publicación
+            claim_seconds (float): Segundos que dura la reclamación de una publicación
+        """
+        self.db_path = db_path
+        self.ttl = ttl_hours * 3600
+        self.claim_seconds = claim_seconds
+        self._ready = False
+        self._last_purge = 0
+
+    @property
+    def enabled(self):
+        """
+        Compruebo si el registro está activado.
+
+        Returns:
+            bool: True si se recuerdan las publicaciones
+        """
+        return self.ttl > 0
+
+    @contextmanager
+    def _connect(self):
+        """
+        Abro una conexión nueva, creando las tablas la primera vez. Al salir
+        confirmo la transacción y cierro la conexión.
+
+        Yields:
+            sqlite3.Connection: Conexión a la base de datos
+        """
+        if not self._ready:
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                if not self._ready:
+                    conn.execute('PRAGMA journal_mode=WAL')
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS posts (
+                            project TEXT NOT NULL,
+                            network TEXT NOT NULL,
+                            key TEXT NOT NULL,
+                            result TEXT NOT NULL,
+                            created_at REAL NOT NULL,
+                            PRIMARY KEY (project, network, key)
+                        )
+                    """)
+                    conn.execute("""
+                        CREATE TABLE IF NOT EXISTS claims (
+                            project TEXT NOT NULL,
+                            network TEXT NOT NULL,
+                            key TEXT NOT NULL,
+                            expires_at REAL NOT NULL,
+                            PRIMARY KEY (project, network, key)
+                        )
+                    """)
+                    self._ready = True
+
+                yield conn
+        finally:
+            conn.close()
+
+    def claim(self, project, network, key):
+        """
+        Reclamo una publicación para que dos peticiones iguales a la vez no
+        publiquen las dos. La reclamación es una fila en SQLite, así que vale
+        entre procesos: solo una petición consigue insertarla, y una
+        reclamación caducada (de un proceso que murió) se puede volver a
+        tomar.
+
+        Args:
+            project (str): Nombre del proyecto
+            network (str): Nombre de la red social
+            key (str): Clave de idempotencia
+
+        Returns:
+            bool: True si la publicación es mía, False si otra petición la tiene
+        """
+        now = time.time()
+
+        with self._connect() as conn:
+            conn.execute(
+                'DELETE FROM claims WHERE project = ? AND network = ? AND key = ? AND expires_at <= ?',
+                (project, network, key, now)
+            )
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO claims (project, network, key, expires_at) VALUES (?, ?, ?, ?)',
+                (project, network, key, now + self.claim_seconds)
+            )
+
+        return cursor.rowcount == 1
+
+    def release(self, project, network, key, result=None):
+        """
+        Libero una publicación reclamada, guardando antes su resultado si se
+        publicó. Las dos cosas van en la misma transacción, así quien espera
+        la reclamación encuentra el resultado al conseguirla.
+
+        Args:
+            project (str): Nombre del proyecto
+            network (str): Nombre de la red social
+            key (str): Clave de idempotencia
+            result (dict, optional): Resultado de la red social si se publicó
+        """
+        now = time.time()
+
+        with self._connect() as conn:
+            if result is not None:
+                conn.execute(
+                    'INSERT OR REPLACE INTO posts (project, network, key, result, created_at) VALUES (?, ?, ?, ?, ?)',
+                    (project, network, key, json.dumps(result), now)
+                )
+
+            conn.execute(
+                'DELETE FROM claims WHERE project = ? AND network = ? AND key = ?',
+                (project, network, key)
+            )
+
+            # Borro de vez en cuando las publicaciones y reclamaciones caducadas
+            if now - self._last_purge > 3600:
+                self._last_purge = now
+                conn.execute('DELETE FROM posts WHERE created_at <= ?', (now - self.ttl,))
+                conn.execute('DELETE FROM claims WHERE expires_at <= ?', (now,))
+
+    def get(self, project, network, key):
+        """
+        Obtengo el resultado de una publicación reciente.
+
+        Args:
+            project (str): Nombre del proyecto
+            network (str): Nombre de la red social
+            key (str): Clave de idempotencia
+
+        Returns:
+            dict: Resultado guardado o None si no se publicó recientemente
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT result FROM posts WHERE project = ? AND network = ? AND key = ? AND created_at > ?',
+                (project, network, key, time.time() - self.ttl)
+            ).fetchone()
+
+        return json.loads(row[0]) if row else None
+
+# Registro compartido por todas las publicaciones
+idempotency = IdempotencyStore()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Caché de imágenes optimizadas direccionada por contenido.
+
+La clave de cada imagen es el hash de los bytes originales junto a los
+parámetros de optimización, así una imagen repetida (en otro proyecto u otro
+post) no se vuelve a redimensionar ni codificar. Para las URLs guardo además
+su ETag y Last-Modified, y si el servidor responde 304 tampoco la descargo.
+
+Hay dos niveles, memoria y disco, cada uno limitado en bytes y con expulsión
+de la imagen usada hace más tiempo (LRU).
+"""
+
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+# Bytes máximos de imágenes optimizadas en memoria (0 = desactivada)
+IMAGE_CACHE_MEMORY_BYTES = int(os.getenv('IMAGE_CACHE_MEMORY_BYTES', str(64 * 1024 * 1024)))
+
+# Bytes máximos de imágenes optimizadas en disco (0 = desactivada)
+IMAGE_CACHE_DISK_BYTES = int(os.getenv('IMAGE_CACHE_DISK_BYTES', str(512 * 1024 * 1024)))
+
+# Directorio de la caché en disco
+IMAGE_CACHE_DIR = os.getenv('IMAGE_CACHE_DIR', os.path.join('data', 'cache', 'images'))
+
+# Número máximo de URLs de las que recuerdo ETag y Last-Modified
+IMAGE_CACHE_MAX_URLS = 4096
+
+class ImageCache:
+    """
+    Caché LRU de imágenes optimizadas en memoria y disco.
+    """
+
+    def __init__(self, memory_bytes=IMAGE_CACHE_MEMORY_BYTES, disk_bytes=IMAGE_CACHE_DISK_BYTES,
+                 disk_dir=IMAGE_CACHE_DIR):
+        """
+        Inicializo la caché.
+
+        Args:
+            memory_bytes (int): Bytes máximos en memoria
+            disk_bytes (int): Bytes máximos en disco
+            disk_dir (str): Directorio de la caché en disco
+        """
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.disk_dir = disk_dir
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk = None
+        self._disk_size = 0
+        self._urls = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    @staticmethod
+    def key(source_hash, variant):
+        """
+        Calculo la clave de una imagen.
+
+        Args:
+            source_hash (str): Hash SHA-256 del contenido original de la imagen
+            variant (str): Identificador de los parámetros de optimización
+
+        Returns:
+            str: Clave de la imagen en la caché
+        """
+        return f"{source_hash}-{variant}"
+
+    def _load_disk(self):
+        """
+        Construyo el índice de la caché en disco la primera vez que se usa,
+        ordenando los archivos por fecha de último uso.
+        """
+        if self._disk is not None:
+            return
+
+        self._disk = OrderedDict()
+
+        if not self.disk_bytes:
+            return
+
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            entries = []
+            for filename in os.listdir(self.disk_dir):
+                key, _, img_format = filename.rpartition('.')
+                if not key or img_format == 'tmp':
+                    continue
+
+                stat = os.stat(os.path.join(self.disk_dir, filename))
+                entries.append((stat.st_mtime, key, img_format, stat.st_size))
+
+            for _, key, img_format, size in sorted(entries):
+                self._disk[key] = (img_format, size)
+                self._disk_size += size
+        except Exception as e:
+            print(f"Error leyendo la caché de imágenes: {str(e)}")
+
+    def _disk_path(self, key, img_format):
+        return os.path.join(self.disk_dir, f"{key}.{img_format}")
+
+    def get(self, key):
+        """
+        Obtengo una imagen optimizada de la caché.
+
+        Args:
+            key (str): Clave de la imagen
+
+        Returns:
+            tuple: Contenido y formato de la imagen o None si no está
+        """
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return cached
+
+            self._load_disk()
+            disk_entry = self._disk.get(key)
+            if disk_entry:
+                self._disk.move_to_end(key)
+
+        if disk_entry:
+            img_format = disk_entry[0]
+            path = self._disk_path(key, img_format)
+            try:
+                with open(path, 'rb') as f:
+                    img_data = f.read()
+
+                # Marco el archivo como usado para conservar el orden LRU tras reiniciar
+                os.utime(path)
+
+                with self._lock:
+                    self.hits += 1
+                    self._put_memory(key, img_data, img_format)
+
+                return img_data, img_format
+            except OSError:
+                with self._lock:
+                    if self._disk.pop(key, None):
+                        self._disk_size -= disk_entry[1]
+
+        with self._lock:
+            self.misses += 1
+
+        return None
+
+    def put(self, key, img_data, img_format):
+        """
+        Guardo una imagen optimizada en la caché.
+
+        Args:
+            key (str): Clave de la imagen
+            img_data (bytes): Contenido de la imagen optimizada
+            img_format (str): Formato de la imagen
+        """
+        with self._lock:
+            self._put_memory(key, img_data, img_format)
+            self._load_disk()
+            stored = key in self._disk
+
+        if stored or not self.disk_bytes or len(img_data) > self.disk_bytes:
+            return
+
+        # Cada escritura usa su propio archivo temporal (otros hilos o
+        # procesos pueden estar guardando la misma imagen) y lo renombro de
+        # una vez, así nunca queda a medias el archivo de la caché
+        path = self._disk_path(key, img_format)
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(img_data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error guardando imagen en caché: {str(e)}")
+            if tmp_path:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+            return
+
+        with self._lock:
+            if key in self._disk:
+                return
+
+            self._disk[key] = (img_format, len(img_data))
+            self._disk_size += len(img_data)
+
+            # Expulso las imágenes usadas hace más tiempo
+            evicted = []
+            while self._disk_size > self.disk_bytes and self._disk:
+                old_key, (old_format, old_size) = self._disk.popitem(last=False)
+                self._disk_size -= old_size
+                evicted.append(self._disk_path(old_key, old_format))
+
+        for old_path in evicted:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+    def _put_memory(self, key, img_data, img_format):
+        """
+        Guardo una imagen en el nivel de memoria (con el bloqueo adquirido).
+
+        Args:
+            key (str): Clave de la imagen
+            img_data (bytes): Contenido de la imagen optimizada
+            img_format (str): Formato de la imagen
+        """
+        if not self.memory_bytes or len(img_data) > self.memory_bytes or key in self._memory:
+            return
+
+        self._memory[key] = (img_data, img_format)
+        self._memory_size += len(img_data)
+
+        while self._memory_size > self.memory_bytes and self._memory:
+            _, (old_data, _) = self._memory.popitem(last=False)
+            self._memory_size -= len(old_data)
+
+    def get_url(self, url):
+        """
+        Obtengo los datos de revalidación guardados para una URL.
+
+        Args:
+            url (str): URL de la imagen
+
+        Returns:
+            dict: Hash de la imagen original, etag y last_modified o None
+        """
+        with self._lock:
+            entry = self._urls.get(url)
+            if entry:
+                self._urls.move_to_end(url)
+            return entry
+
+    def set_url(self, url, source_hash, etag=None, last_modified=None):
+        """
+        Guardo los datos de revalidación de una URL.
+
+        Args:
+            url (str): URL de la imagen
+            source_hash (str): Hash del contenido original de la imagen
+            etag (str, optional): Cabecera ETag de la respuesta
+            last_modified (str, optional): Cabecera Last-Modified de la respuesta
+        """
+        if not etag and not last_modified:
+            return
+
+        with self._lock:
+            self._urls[url] = {'hash': source_hash, 'etag': etag, 'last_modified': last_modified}
+            self._urls.move_to_end(url)
+
+            while len(self._urls) > IMAGE_CACHE_MAX_URLS:
+                self._urls.popitem(last=False)
+
+    def revalidated(self):
+        """
+        Cuento una URL que el servidor confirmó sin cambios (304).
+        """
+        with self._lock:
+            self.revalidations += 1
+
+    def stats(self):
+        """
+        Obtengo los contadores de la caché.
+
+        Returns:
+            dict: Aciertos, fallos, revalidaciones y ocupación de cada nivel
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'revalidations': self.revalidations,
+                'memory_items': len(self._memory),
+                'memory_bytes': self._memory_size,
+                'disk_items': len(self._disk) if self._disk is not None else 0,
+                'disk_bytes': self._disk_size
+            }
+
+# Caché compartida por todas las publicaciones
+image_cache = ImageCache()
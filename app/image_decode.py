@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Decodificación acotada de imágenes.
+
+Antes de decodificar una imagen leo solo su cabecera para conocer sus
+dimensiones: rechazo las que superan el número máximo de píxeles (bombas de
+descompresión) y estimo la memoria que ocupará decodificada. Las imágenes JPEG
+se decodifican directamente a escala reducida (modo draft de Pillow) cuando
+son mucho mayores que el tamaño final.
+
+La memoria estimada de las imágenes que se están decodificando a la vez está
+limitada por un presupuesto global, así una ráfaga de imágenes grandes espera
+en lugar de agotar la memoria del contenedor.
+"""
+
+import os
+import warnings
+import threading
+from io import BytesIO
+from contextlib import contextmanager
+from PIL import Image
+
+# Número máximo de píxeles de una imagen recibida
+IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', str(50 * 1000 * 1000)))
+
+# Memoria estimada máxima de las imágenes que se decodifican a la vez
+IMAGE_DECODE_MEMORY_BYTES = int(os.getenv('IMAGE_DECODE_MEMORY_BYTES', str(512 * 1024 * 1024)))
+
+# Copias de la imagen decodificada que hay en memoria a la vez durante la
+# optimización (original, fondo al quitar la transparencia, redimensionada)
+DECODE_COPIES = 2
+
+# Mantengo también la protección de Pillow con el mismo límite, sin su aviso
+# (las imágenes que lo provocarían las rechaza open_image)
+Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+
+class ImageTooLargeError(Exception):
+    """
+    La imagen supera los límites de decodificación y no debe procesarse.
+    """
+
+def open_image(img_data, max_size=None):
+    """
+    Abro una imagen leyendo solo su cabecera, compruebo sus dimensiones y, si
+    es JPEG y se indica el tamaño final, preparo la decodificación a escala
+    reducida. La imagen no se decodifica hasta llamar a load().
+
+    Args:
+        img_data (bytes): Contenido de la imagen
+        max_size (int, optional): Ancho o alto máximo que se va a usar
+
+    Returns:
+        PIL.Image.Image: Imagen sin decodificar
+    """
+    try:
+        img = Image.open(BytesIO(img_data))
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(str(e))
+
+    width, height = img.size
+    if width * height > IMAGE_MAX_PIXELS:
+        raise ImageTooLargeError(
+            f"La imagen de {width}x{height} supera el máximo de {IMAGE_MAX_PIXELS} píxeles"
+        )
+
+    # JPEG puede decodificar a 1/2, 1/4 o 1/8 sin quedar por debajo del tamaño pedido
+    if max_size and img.format == 'JPEG' and max(width, height) > max_size:
+        img.draft(img.mode, (max_size, max_size))
+
+    return img
+
+def estimate_decode_bytes(img_data, max_size=None):
+    """
+    Estimo la memoria que ocupará una imagen al decodificarla, sin
+    decodificarla.
+
+    Args:
+        img_data (bytes): Contenido de la imagen
+        max_size (int, optional): Ancho o alto máximo que se va a usar
+
+    Returns:
+        int: Bytes estimados
+    """
+    img = open_image(img_data, max_size)
+    width, height = img.size
+
+    # Pillow guarda 4 bytes por píxel en las imágenes de varias bandas
+    bytes_per_pixel = 1 if len(img.getbands()) == 1 else 4
+
+    return width * height * bytes_per_pixel * DECODE_COPIES
+
+class DecodeBudget:
+    """
+    Presupuesto de memoria compartido por las imágenes que se decodifican a
+    la vez.
+    """
+
+    def __init__(self, max_bytes=IMAGE_DECODE_MEMORY_BYTES):
+        """
+        Inicializo el presupuesto.
+
+        Args:
+            max_bytes (int): Memoria estimada máxima (0 = sin límite)
+        """
+        self.max_bytes = max_bytes
+        self._condition = threading.Condition()
+        self._used = 0
+
+        self.peak_bytes = 0
+        self.peak_image_bytes = 0
+        self.waits = 0
+
+    @contextmanager
+    def reserve(self, size):
+        """
+        Reservo memoria para decodificar una imagen, esperando a que haya
+        sitio. Una imagen mayor que el presupuesto completo solo se decodifica
+        cuando no hay ninguna otra en curso.
+
+        Args:
+            size (int): Bytes estimados de la imagen
+        """
+        with self._condition:
+            if self.max_bytes and self._used and self._used + size > self.max_bytes:
+                self.waits += 1
+                self._condition.wait_for(lambda: not self._used or self._used + size <= self.max_bytes)
+
+            self._used += size
+            self.peak_bytes = max(self.peak_bytes, self._used)
+            self.peak_image_bytes = max(self.peak_image_bytes, size)
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._used -= size
+                self._condition.notify_all()
+
+    def stats(self):
+        """
+        Obtengo los contadores del presupuesto.
+
+        Returns:
+            dict: Memoria reservada ahora, picos y esperas
+        """
+        with self._condition:
+            return {
+                'max_bytes': self.max_bytes,
+                'used_bytes': self._used,
+                'peak_bytes': self.peak_bytes,
+                'peak_image_bytes': self.peak_image_bytes,
+                'waits': self.waits
+            }
+
+# Presupuesto compartido por todas las publicaciones
+decode_budget = DecodeBudget()
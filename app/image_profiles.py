@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Perfiles de codificación de imágenes de cada red social.
+
+Cada red tiene sus propios límites (tamaño máximo, peso máximo, formatos
+aceptados), así que las imágenes se preparan por separado para cada una. Las
+redes con el mismo perfil comparten la misma imagen.
+"""
+
+from collections import namedtuple
+
+class EncodingProfile(namedtuple('EncodingProfile', 'max_size max_bytes formats quality min_quality')):
+    """
+    Límites de las imágenes de una red social.
+
+    Attributes:
+        max_size (int): Ancho o alto máximo en píxeles
+        max_bytes (int): Peso máximo en bytes (None = sin límite)
+        formats (tuple): Formatos aceptados, el primero es al que convierto
+                         los no aceptados
+        quality (int): Calidad inicial de JPEG y WebP
+        min_quality (int): Calidad mínima a la que bajo para ajustarme a
+                           max_bytes antes de reducir el tamaño
+    """
+
+    __slots__ = ()
+
+    @property
+    def signature(self):
+        """
+        Identificador del perfil, forma parte de la clave de la caché de
+        imágenes optimizadas.
+
+        Returns:
+            str: Identificador del perfil
+        """
+        return f"v2-{self.max_size}-{self.max_bytes or 0}-{'.'.join(self.formats)}-q{self.quality}-{self.min_quality}"
+
+# Perfil para las redes sin perfil propio (el comportamiento original)
+DEFAULT_PROFILE = EncodingProfile(
+    max_size=1280,
+    max_bytes=None,
+    formats=('jpeg', 'png', 'gif', 'webp'),
+    quality=85,
+    min_quality=85
+)
+
+# Perfiles por nombre de la clase de cada red social
+ENCODING_PROFILES = {
+    # Bluesky rechaza blobs de imagen de más de 1 MB
+    'Bluesky': EncodingProfile(
+        max_size=2000,
+        max_bytes=950 * 1024,
+        formats=('jpeg', 'png', 'webp'),
+        quality=90,
+        min_quality=50
+    ),
+    # Twitter admite imágenes de hasta 5 MB
+    'Twitter': EncodingProfile(
+        max_size=4096,
+        max_bytes=5 * 1024 * 1024,
+        formats=('jpeg', 'png', 'gif', 'webp'),
+        quality=90,
+        min_quality=50
+    ),
+    # Telegram comprime las fotos a 2560 px y admite hasta 10 MB
+    'Telegram': EncodingProfile(
+        max_size=2560,
+        max_bytes=10 * 1024 * 1024,
+        formats=('jpeg', 'png'),
+        quality=90,
+        min_quality=50
+    ),
+    # Mastodon admite 16 MB por defecto, pero muchas instancias lo bajan a 8 MB
+    'Mastodon': EncodingProfile(
+        max_size=2560,
+        max_bytes=8 * 1024 * 1024,
+        formats=('jpeg', 'png', 'gif', 'webp'),
+        quality=90,
+        min_quality=50
+    ),
+}
+
+def get_encoding_profile(network_name):
+    """
+    Obtengo el perfil de codificación de una red social.
+
+    Args:
+        network_name (str): Nombre de la red social
+
+    Returns:
+        EncodingProfile: Perfil de la red o el perfil por defecto
+    """
+    return ENCODING_PROFILES.get(network_name, DEFAULT_PROFILE)
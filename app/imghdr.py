@@ -94,4 +94,146 @@ tests = [
     test_tiff,
     test_bmp,
     test_webp,
-]
\ No newline at end of file
+]
+
+# Modos de Pillow equivalentes a los tipos de color de PNG
+PNG_COLOR_MODES = {0: 'L', 2: 'RGB', 3: 'P', 4: 'LA', 6: 'RGBA'}
+
+# Modos de Pillow según el número de componentes de un JPEG
+JPEG_COMPONENT_MODES = {1: 'L', 3: 'RGB', 4: 'CMYK'}
+
+# Marcadores SOF de JPEG (todos los C0-CF salvo DHT, JPG y DAC)
+JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# Cabeceras de los segmentos APP1 (EXIF y XMP) y APP13 (IPTC) de un JPEG
+JPEG_METADATA_SEGMENTS = {
+    0xE1: (b'Exif\x00\x00', b'http://ns.adobe.com/xap/1.0/\x00', b'http://ns.adobe.com/xmp/extension/\x00'),
+    0xED: (b'Photoshop 3.0\x00',)
+}
+
+# Fragmentos de un PNG con metadatos: EXIF y textos (donde se guarda XMP o
+# el EXIF de ImageMagick, "Raw profile type exif")
+PNG_METADATA_CHUNKS = {b'eXIf', b'tEXt', b'zTXt', b'iTXt'}
+
+# Flags de metadatos del fragmento VP8X de un WebP (EXIF y XMP)
+WEBP_METADATA_FLAGS = 0x08 | 0x04
+
+def header_info(data):
+    """
+    Obtengo el formato, las dimensiones y el modo de una imagen leyendo solo
+    su cabecera, sin decodificarla.
+
+    Args:
+        data (bytes): Contenido de la imagen
+
+    Returns:
+        dict: Formato, ancho, alto, modo (como en Pillow) y si lleva
+              metadatos (EXIF, XMP, IPTC o textos de PNG), o None si no se
+              reconoce la cabecera
+    """
+    img_format = what(None, h=data[:32])
+
+    try:
+        if img_format == 'jpeg':
+            return _jpeg_info(data)
+
+        if img_format == 'png' and data[12:16] == b'IHDR':
+            width, height, _, color_type = struct.unpack('>IIBB', data[16:26])
+            return _info('png', width, height, PNG_COLOR_MODES.get(color_type), _png_metadata(data))
+
+        if img_format == 'gif':
+            width, height = struct.unpack('<HH', data[6:10])
+            # XMP va en una extensión de aplicación con este identificador
+            return _info('gif', width, height, 'P', b'XMP DataXMP' in data)
+
+        if img_format == 'webp':
+            return _webp_info(data)
+    except struct.error:
+        pass
+
+    return None
+
+def _info(img_format, width, height, mode, metadata=False):
+    if not mode:
+        return None
+
+    return {'format': img_format, 'width': width, 'height': height, 'mode': mode, 'metadata': metadata}
+
+def _jpeg_info(data):
+    """
+    Recorro los segmentos de un JPEG hasta el marcador SOF, que tiene las
+    dimensiones y el número de componentes. Los segmentos APPn de metadatos
+    van siempre antes.
+    """
+    metadata = False
+    offset = 2
+
+    while offset + 4 <= len(data):
+        if data[offset] != 0xFF:
+            return None
+
+        marker = data[offset + 1]
+
+        # Relleno entre segmentos
+        if marker == 0xFF:
+            offset += 1
+            continue
+
+        length = struct.unpack('>H', data[offset + 2:offset + 4])[0]
+
+        if marker in JPEG_METADATA_SEGMENTS and data[offset + 4:offset + 2 + length].startswith(JPEG_METADATA_SEGMENTS[marker]):
+            metadata = True
+
+        if marker in JPEG_SOF_MARKERS:
+            height, width, components = struct.unpack('>HHB', data[offset + 5:offset + 10])
+            return _info('jpeg', width, height, JPEG_COMPONENT_MODES.get(components), metadata)
+
+        offset += 2 + length
+
+    return None
+
+def _png_metadata(data):
+    """
+    Recorro los fragmentos de un PNG buscando los de metadatos. Los textos
+    pueden ir también después de los datos de la imagen, así que los
+    recorro todos (solo se leen las cabeceras).
+    """
+    offset = 8
+
+    while offset + 8 <= len(data):
+        length = struct.unpack('>I', data[offset:offset + 4])[0]
+        chunk = data[offset + 4:offset + 8]
+
+        if chunk in PNG_METADATA_CHUNKS:
+            return True
+
+        if chunk == b'IEND':
+            break
+
+        offset += 12 + length
+
+    return False
+
+def _webp_info(data):
+    """
+    Leo las dimensiones del primer fragmento de un WebP (VP8, VP8L o VP8X).
+    """
+    chunk = data[12:16]
+
+    if chunk == b'VP8 ':
+        width, height = struct.unpack('<HH', data[26:30])
+        return _info('webp', width & 0x3FFF, height & 0x3FFF, 'RGB')
+
+    if chunk == b'VP8L':
+        bits = struct.unpack('<I', data[21:25])[0]
+        mode = 'RGBA' if bits >> 28 & 1 else 'RGB'
+        return _info('webp', (bits & 0x3FFF) + 1, (bits >> 14 & 0x3FFF) + 1, mode)
+
+    if chunk == b'VP8X':
+        flags = data[20]
+        width = int.from_bytes(data[24:27], 'little') + 1
+        height = int.from_bytes(data[27:30], 'little') + 1
+        mode = 'RGBA' if flags & 0x10 else 'RGB'
+        return _info('webp', width, height, mode, bool(flags & WEBP_METADATA_FLAGS))
+
+    return None
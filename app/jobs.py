@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cola de trabajos persistente en SQLite para publicar de forma asíncrona.
+
+El endpoint /publish guarda el post en la cola y responde al momento con el
+id del trabajo, mientras un grupo de workers en segundo plano va publicando
+los trabajos pendientes.
+
+Varios procesos pueden compartir la cola. Cada trabajo en curso lleva el
+proceso que lo tomó y una concesión que ese proceso renueva mientras vive;
+solo si la concesión caduca (el proceso murió o se reinició) otro worker
+vuelve a tomar el trabajo.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Activo el modo asíncrono de /publish
+ASYNC_PUBLISH = os.getenv('ASYNC_PUBLISH', 'false').lower() == 'true'
+
+# Base de datos donde persisto la cola de trabajos
+JOBS_DB = os.getenv('JOBS_DB', os.path.join('data', 'jobs.sqlite3'))
+
+# Número de workers que publican los trabajos en segundo plano
+JOBS_WORKERS = int(os.getenv('JOBS_WORKERS', '2'))
+
+# Horas que conservo los trabajos terminados antes de borrarlos
+JOBS_RETENTION_HOURS = int(os.getenv('JOBS_RETENTION_HOURS', '24'))
+
+# Segundos que dura la concesión de un trabajo en curso sin renovarla
+JOBS_LEASE_SECONDS = int(os.getenv('JOBS_LEASE_SECONDS', '60'))
+
+# Segundos que espera un worker sin trabajo antes de volver a mirar la cola
+JOBS_POLL_INTERVAL = 5
+
+class JobProgress:
+    """
+    Registra en la cola el avance de un trabajo mientras se publica.
+    """
+
+    def __init__(self, queue, job_id):
+        """
+        Inicializo el registro de avance de un trabajo.
+
+        Args:
+            queue (JobQueue): Cola a la que pertenece el trabajo
+            job_id (str): Id del trabajo
+        """
+        self.queue = queue
+        self.job_id = job_id
+
+    def start(self, network_names):
+        """
+        Marco como pendientes las redes sociales en las que se va a publicar.
+
+        Args:
+            network_names (list): Nombres de las redes sociales habilitadas
+        """
+        self.queue.set_networks(self.job_id, {name: {'status': 'pending'} for name in network_names})
+
+    def result(self, result):
+        """
+        Guardo el resultado de una red social en cuanto termina.
+
+        Args:
+            result (dict): Resultado de la publicación en la red social
+        """
+        self.queue.set_network_result(self.job_id, result)
+
+class JobQueue:
+    """
+    Cola de trabajos de publicación guardada en SQLite.
+    """
+
+    def __init__(self, db_path=JOBS_DB):
+        """
+        Inicializo la cola y creo la tabla de trabajos si no existe.
+
+        Args:
+            db_path (str): Ruta de la base de datos SQLite
+        """
+        self.db_path = db_path
+        self.owner = uuid.uuid4().hex  # Identifica a este proceso en los trabajos que toma
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._workers = []
+        self._last_purge = 0
+
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    networks TEXT NOT NULL DEFAULT '{}',
+                    response TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    owner TEXT,
+                    lease_until REAL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)')
+
+            # Añado las columnas de la concesión a las bases de datos anteriores
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(jobs)')}
+            for column, column_type in (('owner', 'TEXT'), ('lease_until', 'REAL')):
+                if column not in columns:
+                    conn.execute(f'ALTER TABLE jobs ADD COLUMN {column} {column_type}')
+
+    @contextmanager
+    def _connect(self):
+        """
+        Abro una conexión nueva, cada hilo usa la suya. Al salir confirmo la
+        transacción y cierro la conexión.
+
+        Yields:
+            sqlite3.Connection: Conexión a la base de datos
+        """
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, payload):
+        """
+        Añado un post a la cola. Si el cliente no envía clave de
+        idempotencia uso el id del trabajo, así un trabajo que se vuelve a
+        tomar tras caducar su concesión no publica otra vez en las redes
+        donde ya se publicó.
+
+        Args:
+            payload (dict): Datos del post (ver endpoint /publish)
+
+        Returns:
+            str: Id del trabajo creado
+        """
+        job_id = uuid.uuid4().hex
+        payload = dict(payload, idempotency_key=payload.get('idempotency_key') or f'job-{job_id}')
+
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, status, payload, created_at) VALUES (?, ?, ?, ?)',
+                (job_id, 'pending', json.dumps(payload), time.time())
+            )
+
+        # Despierto a un worker para que no espere al siguiente sondeo
+        self._wakeup.set()
+
+        return job_id
+
+    def claim(self):
+        """
+        Tomo el trabajo pendiente más antiguo (o uno en curso cuya concesión
+        caducó) marcándolo como en curso por este proceso. Varios procesos
+        del servicio pueden compartir la base de datos, así que solo me quedo
+        con el trabajo si el UPDATE lo encuentra aún disponible; si otro
+        proceso lo tomó antes, pruebo con el siguiente.
+
+        Returns:
+            tuple: (id, payload) del trabajo o None si no hay pendientes
+        """
+        # Los trabajos en curso de versiones sin concesión caducan según su inicio
+        available = """(status = 'pending' OR (status = 'running'
+                        AND COALESCE(lease_until, started_at + ?) < ?))"""
+
+        while True:
+            now = time.time()
+
+            with self._connect() as conn:
+                row = conn.execute(
+                    f"SELECT id, payload FROM jobs WHERE {available} ORDER BY created_at LIMIT 1",
+                    (JOBS_LEASE_SECONDS, now)
+                ).fetchone()
+
+                if not row:
+                    return None
+
+                # Si el trabajo se había quedado a medias empieza de cero (la
+                # idempotencia evita volver a publicar en las redes que ya terminaron)
+                claimed = conn.execute(
+                    f"""UPDATE jobs SET status = 'running', started_at = ?, owner = ?, lease_until = ?, networks = '{{}}'
+                        WHERE id = ? AND {available}""",
+                    (now, self.owner, now + JOBS_LEASE_SECONDS, row['id'], JOBS_LEASE_SECONDS, now)
+                ).rowcount
+
+            if claimed:
+                return row['id'], json.loads(row['payload'])
+
+    def set_networks(self, job_id, networks):
+        """
+        Guardo el estado de todas las redes sociales de un trabajo.
+
+        Args:
+            job_id (str): Id del trabajo
+            networks (dict): Estado de cada red social por nombre
+        """
+        with self._lock, self._connect() as conn:
+            conn.execute('UPDATE jobs SET networks = ? WHERE id = ? AND owner = ?', (json.dumps(networks), job_id, self.owner))
+
+    def set_network_result(self, job_id, result):
+        """
+        Guardo el resultado de una red social de un trabajo.
+
+        Args:
+            job_id (str): Id del trabajo
+            result (dict): Resultado de la publicación en la red social
+        """
+        with self._lock, self._connect() as conn:
+            row = conn.execute('SELECT networks FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            networks = json.loads(row['networks']) if row else {}
+            networks[result['network']] = dict(result, status='done')
+            conn.execute('UPDATE jobs SET networks = ? WHERE id = ? AND owner = ?', (json.dumps(networks), job_id, self.owner))
+
+    def finish(self, job_id, response=None, error=None):
+        """
+        Marco un trabajo como terminado guardando su respuesta final. Si
+        otro proceso lo tomó porque caducó la concesión, el trabajo es suyo y
+        no lo toco.
+
+        Args:
+            job_id (str): Id del trabajo
+            response (dict, optional): Respuesta de la publicación
+            error (str, optional): Error si el trabajo falló por completo
+        """
+        status = 'failed' if error or not (response or {}).get('success') else 'done'
+
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, response = ?, error = ?, finished_at = ?, lease_until = NULL WHERE id = ? AND owner = ?',
+                (status, json.dumps(response) if response is not None else None,
+                 error or (response or {}).get('error'), time.time(), job_id, self.owner)
+            )
+
+    def get(self, job_id):
+        """
+        Obtengo el estado de un trabajo.
+
+        Args:
+            job_id (str): Id del trabajo
+
+        Returns:
+            dict: Estado del trabajo o None si no existe
+        """
+        with self._connect() as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+
+        if not row:
+            return None
+
+        networks = json.loads(row['networks'])
+        payload = json.loads(row['payload'])
+
+        return {
+            'id': row['id'],
+            'status': row['status'],
+            'project': payload.get('project'),
+            'progress': {
+                'total': len(networks),
+                'completed': sum(1 for network in networks.values() if network.get('status') == 'done')
+            },
+            'networks': networks,
+            'response': json.loads(row['response']) if row['response'] else None,
+            'error': row['error'],
+            'created_at': row['created_at'],
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at']
+        }
+
+    def renew_leases(self):
+        """
+        Renuevo la concesión de los trabajos que está publicando este
+        proceso, para que ningún otro los vuelva a tomar.
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE status = 'running' AND owner = ?",
+                (time.time() + JOBS_LEASE_SECONDS, self.owner)
+            )
+
+    def purge(self):
+        """
+        Borro los trabajos terminados más antiguos que JOBS_RETENTION_HOURS.
+        """
+        limit = time.time() - JOBS_RETENTION_HOURS * 3600
+
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (limit,))
+
+        self._last_purge = time.time()
+
+    def start_workers(self, handler, count=JOBS_WORKERS):
+        """
+        Arranco los workers que publican los trabajos en segundo plano.
+
+        Args:
+            handler (callable): Función que publica un trabajo, recibe el
+                                payload y un JobProgress y devuelve la respuesta
+            count (int): Número de workers
+        """
+        if self._workers:
+            return
+
+        for i in range(max(1, count)):
+            worker = threading.Thread(target=self._work, args=(handler,), name=f'job-worker-{i}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+        threading.Thread(target=self._heartbeat, name='job-heartbeat', daemon=True).start()
+
+    def _heartbeat(self):
+        """
+        Renuevo las concesiones de este proceso tres veces por concesión, así
+        una renovación fallida no basta para perder los trabajos.
+        """
+        while True:
+            time.sleep(JOBS_LEASE_SECONDS / 3)
+
+            try:
+                self.renew_leases()
+            except Exception as e:
+                print(f"Error renovando los trabajos en curso: {str(e)}")
+
+    def _work(self, handler):
+        """
+        Bucle de un worker: tomo trabajos pendientes y los publico.
+
+        Args:
+            handler (callable): Función que publica un trabajo
+        """
+        while True:
+            try:
+                job = self.claim()
+
+                if not job and time.time() - self._last_purge > 3600:
+                    self.purge()
+            except Exception as e:
+                print(f"Error leyendo la cola de trabajos: {str(e)}")
+                job = None
+
+            if not job:
+                self._wakeup.wait(JOBS_POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+
+            job_id, payload = job
+
+            try:
+                response = handler(payload, JobProgress(self, job_id))
+                self.finish(job_id, response=response)
+            except Exception as e:
+                print(f"Error procesando el trabajo {job_id}: {str(e)}")
+                self.finish(job_id, error=str(e))
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Caché de imágenes ya subidas a cada cuenta de las redes sociales.
+
+Guardo la referencia que devuelve cada red al subir una imagen (blob de
+Bluesky, file_id de Telegram, media_id de Twitter) por cuenta y hash del
+contenido, con una caducidad adecuada a cada red. Si se vuelve a publicar la
+misma imagen en la misma cuenta se usa la referencia en lugar de subirla otra
+vez.
+"""
+
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Número máximo de referencias que guardo entre todas las cuentas
+MEDIA_CACHE_MAX_ENTRIES = int(os.getenv('MEDIA_CACHE_MAX_ENTRIES', '4096'))
+
+def account_key(*parts):
+    """
+    Calculo la clave de una cuenta a partir de sus credenciales, sin guardar
+    las credenciales en memoria más tiempo del necesario.
+
+    Args:
+        *parts (str): Datos que identifican la cuenta
+
+    Returns:
+        str: Huella de la cuenta
+    """
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()[:32]
+
+class MediaUploadCache:
+    """
+    Caché con caducidad de referencias a imágenes subidas por cuenta.
+    """
+
+    def __init__(self, max_entries=MEDIA_CACHE_MAX_ENTRIES):
+        """
+        Inicializo la caché.
+
+        Args:
+            max_entries (int): Número máximo de referencias guardadas
+        """
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, network, account, content_hash):
+        """
+        Obtengo la referencia de una imagen ya subida a una cuenta.
+
+        Args:
+            network (str): Nombre de la red social
+            account (str): Huella de la cuenta (ver account_key)
+            content_hash (str): Hash del contenido de la imagen
+
+        Returns:
+            object: Referencia de la imagen en la red social o None
+        """
+        key = (network, account, content_hash)
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry and entry[1] > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            if entry:
+                del self._entries[key]
+
+            self.misses += 1
+            return None
+
+    def put(self, network, account, content_hash, handle, ttl):
+        """
+        Guardo la referencia de una imagen subida a una cuenta.
+
+        Args:
+            network (str): Nombre de la red social
+            account (str): Huella de la cuenta (ver account_key)
+            content_hash (str): Hash del contenido de la imagen
+            handle (object): Referencia devuelta por la red social
+            ttl (float): Segundos durante los que la referencia es reutilizable
+        """
+        if not handle or ttl <= 0:
+            return
+
+        key = (network, account, content_hash)
+
+        with self._lock:
+            self._entries[key] = (handle, time.time() + ttl)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, network, account, content_hash):
+        """
+        Descarto una referencia que la red social ya no acepta.
+
+        Args:
+            network (str): Nombre de la red social
+            account (str): Huella de la cuenta (ver account_key)
+            content_hash (str): Hash del contenido de la imagen
+        """
+        with self._lock:
+            self._entries.pop((network, account, content_hash), None)
+
+    def stats(self):
+        """
+        Obtengo los contadores de la caché.
+
+        Returns:
+            dict: Aciertos, fallos y número de referencias guardadas
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'items': len(self._entries)
+            }
+
+# Caché compartida por todas las publicaciones
+media_cache = MediaUploadCache()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Métricas del servicio en el formato de texto de Prometheus (endpoint
+/metrics).
+
+Cada métrica guarda sus valores en memoria del proceso por combinación de
+etiquetas, con un bloqueo propio que solo se toma para sumar un valor, así
+medir cuesta muy poco y no hay contención entre métricas distintas. No
+dependo de prometheus_client: el formato de salida es el mismo y cualquier
+servidor Prometheus puede leerlo.
+
+Las métricas de las imágenes que se optimizan en el pool de procesos se
+miden en el propio proceso hijo y se registran en el principal al recibir el
+resultado.
+"""
+
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Prefijo de todas las métricas del servicio
+METRICS_PREFIX = 'social_publisher_'
+
+# Límites de los tramos de los histogramas de duración, en segundos
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Tipo MIME del formato de texto de Prometheus
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Métricas registradas, en el orden en que se muestran
+registry = []
+
+class Metric:
+    """
+    Métrica con etiquetas.
+    """
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        """
+        Inicializo la métrica y la registro.
+
+        Args:
+            name (str): Nombre de la métrica, sin el prefijo
+            documentation (str): Descripción de la métrica
+            labelnames (tuple): Nombres de sus etiquetas
+        """
+        self.name = METRICS_PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+        registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def _labels(self, key, extra=None):
+        pairs = list(zip(self.labelnames, key))
+        if extra:
+            pairs.append(extra)
+
+        if not pairs:
+            return ''
+
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+    def _add(self, amount, labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        """
+        Obtengo las líneas con los valores de la métrica.
+
+        Returns:
+            list: Líneas en formato de texto de Prometheus
+        """
+        with self._lock:
+            values = sorted(self._values.items())
+
+        return [f'{self.name}{self._labels(key)} {_format(value)}' for key, value in values]
+
+class Counter(Metric):
+    """
+    Contador que solo aumenta.
+    """
+
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        self._add(amount, labels)
+
+class Gauge(Metric):
+    """
+    Valor que sube y baja.
+    """
+
+    type = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        self._add(amount, labels)
+
+    def dec(self, amount=1, **labels):
+        self._add(-amount, labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    @contextmanager
+    def track(self, **labels):
+        """
+        Sumo uno mientras dura el bloque (por ejemplo peticiones en curso).
+        """
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+class Histogram(Metric):
+    """
+    Distribución de valores por tramos, con su suma y número de valores.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Mido la duración del bloque en segundos.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+
+        lines = []
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{self._labels(key, ("le", _format(bound)))} {cumulative}')
+
+            lines.append(f'{self.name}_sum{self._labels(key)} {_format(total)}')
+            lines.append(f'{self.name}_count{self._labels(key)} {count}')
+
+        return lines
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format(value):
+    if value == float('inf'):
+        return '+Inf'
+
+    if isinstance(value, float) and value.is_integer():
+        return repr(value)
+
+    return str(value)
+
+def render():
+    """
+    Genero el texto de todas las métricas para el endpoint /metrics.
+
+    Returns:
+        str: Métricas en formato de texto de Prometheus
+    """
+    lines = []
+
+    for metric in registry:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        lines.extend(metric.samples())
+
+    return '\n'.join(lines) + '\n'
+
+# Peticiones HTTP
+HTTP_REQUESTS = Counter('http_requests_total', 'Peticiones HTTP atendidas', ('endpoint', 'method', 'status'))
+HTTP_REQUESTS_IN_FLIGHT = Gauge('http_requests_in_flight', 'Peticiones HTTP en curso', ('endpoint',))
+HTTP_REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Duración de las peticiones HTTP', ('endpoint',))
+HTTP_REQUEST_BYTES = Counter('http_request_bytes_total', 'Bytes recibidos en el cuerpo de las peticiones HTTP', ('endpoint',))
+UPLOAD_FILES = Counter('upload_files_total', 'Imágenes recibidas como archivo en peticiones multipart')
+UPLOAD_BYTES = Counter('upload_bytes_total', 'Bytes de las imágenes recibidas como archivo en peticiones multipart')
+
+# Publicación en las redes sociales
+PUBLISH_DURATION = Histogram('network_publish_duration_seconds', 'Duración de la publicación en cada red social, con sus reintentos', ('network',))
+PUBLISH_RESULTS = Counter('network_publish_total', 'Publicaciones en cada red social por resultado (success, error, skipped o replayed)', ('network', 'result'))
+PUBLISH_RETRIES = Counter('network_publish_retries_total', 'Reintentos de publicación por errores transitorios', ('network',))
+NETWORK_MEDIA_BYTES = Counter('network_media_bytes_total', 'Bytes de imágenes subidos a cada red social', ('network',))
+NETWORK_REQUEST_DURATION = Histogram('network_request_duration_seconds', 'Duración de las llamadas a la api de cada red social por operación (auth, media o post)', ('network', 'operation'))
+
+# Imágenes
+IMAGE_DOWNLOAD_DURATION = Histogram('image_download_duration_seconds', 'Duración de la descarga de imágenes por URL')
+IMAGE_DOWNLOAD_BYTES = Counter('image_download_bytes_total', 'Bytes de imágenes descargados')
+IMAGE_STAGE_DURATION = Histogram('image_stage_duration_seconds', 'Duración de la decodificación y codificación de imágenes', ('stage',))
+IMAGE_RESULTS = Counter('image_results_total', 'Variantes de imagen preparadas por origen (cache, passthrough u optimized)', ('source',))
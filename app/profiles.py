@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Registro de perfiles de proyecto.
+
+Cada perfil (data/profiles/<proyecto>.env) se lee una sola vez y se guarda en
+memoria como un objeto inmutable, que solo se vuelve a leer cuando cambia la
+fecha de modificación del archivo. No modifico os.environ, así peticiones
+simultáneas de proyectos distintos no se pisan la configuración.
+"""
+
+import os
+import threading
+from types import MappingProxyType
+from dotenv import dotenv_values
+
+# Directorio con los perfiles de cada proyecto
+PROFILES_DIR = os.path.join('data', 'profiles')
+
+class Profile:
+    """
+    Configuración inmutable de un proyecto.
+    """
+
+    __slots__ = ('project', 'values', 'version')
+
+    def __init__(self, project, values, version):
+        """
+        Inicializo el perfil.
+
+        Args:
+            project (str): Nombre del proyecto
+            values (dict): Variables leídas del archivo .env
+            version (tuple): Fecha de modificación y tamaño del archivo leído
+        """
+        object.__setattr__(self, 'project', project)
+        object.__setattr__(self, 'values', MappingProxyType(dict(values)))
+        object.__setattr__(self, 'version', version)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Los perfiles son inmutables')
+
+    def get(self, key, default=None):
+        """
+        Obtengo el valor de una variable del perfil.
+
+        Args:
+            key (str): Nombre de la variable
+            default (str, optional): Valor si la variable no existe o está vacía
+
+        Returns:
+            str: Valor de la variable
+        """
+        # Una variable sin valor (VAR= o VAR sin =) cuenta como no definida
+        return self.values.get(key) or default
+
+    def is_enabled(self, network):
+        """
+        Compruebo si una red social está habilitada en el perfil.
+
+        Args:
+            network (str): Prefijo de la red social en el perfil (ej: MASTODON)
+
+        Returns:
+            bool: True si <network>_ENABLED es true
+        """
+        return self.get(f'{network}_ENABLED', 'false').lower() == 'true'
+
+class ProfileRegistry:
+    """
+    Caché de perfiles invalidada por la fecha de modificación del archivo.
+    """
+
+    def __init__(self, profiles_dir=PROFILES_DIR):
+        """
+        Inicializo el registro.
+
+        Args:
+            profiles_dir (str): Directorio con los perfiles
+        """
+        self.profiles_dir = profiles_dir
+        self._profiles = {}
+        self._lock = threading.Lock()
+
+    def path(self, project):
+        """
+        Obtengo la ruta del archivo .env de un proyecto.
+
+        Args:
+            project (str): Nombre del proyecto
+
+        Returns:
+            str: Ruta del archivo
+        """
+        return os.path.join(self.profiles_dir, f'{project}.env')
+
+    def exists(self, project):
+        """
+        Compruebo si existe el perfil de un proyecto.
+
+        Args:
+            project (str): Nombre del proyecto
+
+        Returns:
+            bool: True si existe el archivo .env del proyecto
+        """
+        return os.path.exists(self.path(project))
+
+    def get(self, project):
+        """
+        Obtengo el perfil de un proyecto, leyendo el archivo solo si ha
+        cambiado desde la última vez.
+
+        Args:
+            project (str): Nombre del proyecto
+
+        Returns:
+            Profile: Perfil del proyecto o None si no existe
+        """
+        path = self.path(project)
+
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._profiles.pop(project, None)
+            return None
+
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        profile = self._profiles.get(project)
+        if profile and profile.version == version:
+            return profile
+
+        with self._lock:
+            # Otro hilo pudo haberlo leído mientras esperaba el bloqueo
+            profile = self._profiles.get(project)
+            if profile and profile.version == version:
+                return profile
+
+            profile = Profile(project, dotenv_values(path), version)
+            self._profiles[project] = profile
+
+        return profile
+
+# Registro compartido por toda la aplicación
+profiles = ProfileRegistry()
+
+def get_profile(project):
+    """
+    Obtengo el perfil de un proyecto desde el registro compartido.
+
+    Args:
+        project (str): Nombre del proyecto
+
+    Returns:
+        Profile: Perfil del proyecto o None si no existe
+    """
+    return profiles.get(project)
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Perfilado opcional de peticiones de publicación mediante muestreo de pilas.
+
+Una petición se perfila si lleva la cabecera X-Profile con el token
+PROFILE_TOKEN (sin token configurado la cabecera se ignora, así ningún
+cliente puede perfilar el servicio) o, sin ella, con probabilidad
+PROFILE_SAMPLE_RATE. Mientras dura, un hilo toma cada PROFILE_INTERVAL
+segundos la pila de todos los hilos del proceso (las imágenes y las redes
+sociales se procesan en otros hilos, que cProfile no vería) y al terminar
+guarda el recuento en PROFILE_DIR en formato de pilas plegadas, que leen
+flamegraph.pl o speedscope. Solo conservo los PROFILE_MAX_FILES perfiles más
+recientes.
+
+Solo se perfila una petición a la vez: el muestreo ve todos los hilos, así
+que dos perfiles simultáneos mostrarían lo mismo.
+"""
+
+import os
+import sys
+import hmac
+import time
+import uuid
+import random
+import threading
+from collections import Counter
+
+# Fracción de las peticiones que se perfilan sin pedirlo (0 = solo con la cabecera)
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+
+# Token que debe llevar la cabecera X-Profile (vacío = se ignora la cabecera)
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')
+
+# Directorio donde guardo los perfiles
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join('data', 'profiling'))
+
+# Número máximo de perfiles que conservo, borro los más antiguos
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', '20'))
+
+# Segundos entre dos muestras de las pilas
+PROFILE_INTERVAL = 0.005
+
+class StackSampler:
+    """
+    Muestreo periódico de las pilas de todos los hilos.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                    frame = frame.f_back
+
+                stack.append(names.get(ident, str(ident)))
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def dump(self, path):
+        """
+        Guardo las muestras en formato de pilas plegadas (una pila por línea
+        con su número de muestras).
+
+        Args:
+            path (str): Ruta del archivo
+        """
+        with open(path, 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f'{stack} {count}\n')
+
+_lock = threading.Lock()
+
+def should_profile(requested):
+    """
+    Decido si perfilo una petición.
+
+    Args:
+        requested (str): Valor de la cabecera X-Profile
+
+    Returns:
+        bool: True si hay que perfilarla
+    """
+    if requested and PROFILE_TOKEN:
+        return hmac.compare_digest(requested.encode('utf-8'), PROFILE_TOKEN.encode('utf-8'))
+
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+def rotate_profiles(directory=PROFILE_DIR, max_files=PROFILE_MAX_FILES):
+    """
+    Borro los perfiles más antiguos para conservar solo max_files.
+
+    Args:
+        directory (str): Directorio de los perfiles
+        max_files (int): Número de perfiles que conservo
+    """
+    names = sorted(name for name in os.listdir(directory) if name.endswith('.folded'))
+
+    # Los nombres empiezan por la fecha con microsegundos, así que ordenados
+    # van del más antiguo al más reciente
+    for name in names[:max(0, len(names) - max_files)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass  # Lo ha borrado otro proceso
+
+class RequestProfile:
+    """
+    Perfil de una petición. Se usa como bloque with alrededor de la
+    publicación y, al salir, path tiene la ruta del perfil guardado y name
+    el nombre del archivo dentro de PROFILE_DIR (None si no se perfiló). Al
+    cliente solo le devuelvo el nombre.
+    """
+
+    def __init__(self, requested=None):
+        """
+        Inicializo el perfil y decido si se perfila la petición.
+
+        Args:
+            requested (str, optional): Valor de la cabecera X-Profile
+        """
+        self.enabled = should_profile(requested)
+        self.path = None
+        self.name = None
+        self._sampler = None
+
+    def __enter__(self):
+        # Si ya se está perfilando otra petición, esta no se perfila
+        if self.enabled and _lock.acquire(blocking=False):
+            self._sampler = StackSampler()
+            self._sampler.start()
+
+        return self
+
+    def __exit__(self, *exc_info):
+        if not self._sampler:
+            return
+
+        try:
+            self._sampler.stop()
+
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            now = time.time()
+            self.name = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}.{int(now % 1 * 1e6):06d}-{uuid.uuid4().hex[:8]}.folded"
+            self.path = os.path.join(PROFILE_DIR, self.name)
+            self._sampler.dump(self.path)
+            rotate_profiles()
+        except Exception as e:
+            print(f"Error guardando el perfil de la petición: {str(e)}")
+        finally:
+            _lock.release()
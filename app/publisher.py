@@ -0,0 +1,598 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Flujo completo de publicación de un post en las redes sociales habilitadas.
+
+Lo comparten el endpoint /publish y los workers de la cola de trabajos.
+"""
+
+import os
+import time
+import random
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from social_networks import build_networks
+from functions import process_hashtags, process_images, cleanup_images, cleanup_uploads, UPLOADS_FIELD
+from profiles import profiles
+from client_pool import client_pool
+from idempotency import idempotency, post_key, IDEMPOTENCY_CLAIM_POLL
+from metrics import PUBLISH_DURATION, PUBLISH_RESULTS, PUBLISH_RETRIES
+from timings import collect, stage, record, run_in_context
+
+# Número máximo de redes sociales en las que publico a la vez (1 = secuencial)
+PUBLISH_MAX_WORKERS = int(os.getenv('PUBLISH_MAX_WORKERS', '4'))
+
+# Reintentos de cada red social ante errores transitorios (timeouts, 5xx)
+NETWORK_MAX_RETRIES = int(os.getenv('NETWORK_MAX_RETRIES', '2'))
+
+# Segundos base de la espera exponencial entre reintentos
+NETWORK_RETRY_BACKOFF = float(os.getenv('NETWORK_RETRY_BACKOFF', '0.5'))
+
+# Número máximo de posts de un lote que publico a la vez (1 = secuencial)
+BATCH_MAX_WORKERS = int(os.getenv('BATCH_MAX_WORKERS', '4'))
+
+# Número máximo de posts por lote
+BATCH_MAX_POSTS = int(os.getenv('BATCH_MAX_POSTS', '100'))
+
+def validate_post(data):
+    """
+    Compruebo que los datos de un post tienen los parámetros requeridos.
+
+    Args:
+        data (dict): Datos recibidos en la petición
+
+    Returns:
+        str: Mensaje de error o None si los datos son válidos
+    """
+    if not data:
+        return 'No se recibieron datos'
+
+    if not data.get('content'):
+        return 'El contenido es requerido'
+
+    if not data.get('project'):
+        return 'El proyecto es requerido'
+
+    project = data.get('project')
+    if not profiles.exists(project):
+        return f'No se encontró el archivo de configuración para el proyecto {project}'
+
+    # Las referencias upload:<id> solo valen para las imágenes que guardó el
+    # servicio al encolar el post (ver save_uploads)
+    uploads = data.get(UPLOADS_FIELD) or []
+    for image in data.get('images') or []:
+        if isinstance(image, str) and image.startswith('upload:') and image not in uploads:
+            return f'Imagen no válida: {image} (las referencias upload:<id> solo las crea el servicio)'
+
+    return None
+
+def publish_to_network(network, content, title, hashtags, project, images, idempotency_key=None):
+    """
+    Publico en una red social y devuelvo su resultado con el formato de la
+    respuesta de la api. Si ya publiqué este mismo post en la red hace poco,
+    devuelvo el resultado guardado en lugar de volver a publicarlo, y si otra
+    petición lo está publicando espero a que termine.
+
+    Args:
+        network (SocialNetwork): Red social en la que publicar
+        content (str): Contenido a publicar
+        title (str): Título del contenido
+        hashtags (list): Lista de hashtags
+        project (str): Nombre del proyecto
+        images (list): Lista de rutas a imágenes
+        idempotency_key (str, optional): Clave de idempotencia del post
+
+    Returns:
+        dict: Resultado de la publicación en la red social
+    """
+    name = network.__class__.__name__
+
+    if not idempotency_key or not idempotency.enabled:
+        return publish_with_retries(network, content, title, hashtags, project, images)
+
+    # Si otra petición está publicando este post, espero a que termine
+    while not idempotency.claim(project, name, idempotency_key):
+        stored = idempotency.get(project, name, idempotency_key)
+        if stored:
+            return replay(name, stored)
+
+        time.sleep(IDEMPOTENCY_CLAIM_POLL)
+
+    result = None
+    try:
+        stored = idempotency.get(project, name, idempotency_key)
+        if stored:
+            return replay(name, stored)
+
+        result = publish_with_retries(network, content, title, hashtags, project, images)
+        return result
+    finally:
+        idempotency.release(project, name, idempotency_key, result['result'] if result and is_published(result) else None)
+
+def publish_with_retries(network, content, title, hashtags, project, images):
+    """
+    Publico en una red social reintentando con espera exponencial aleatoria
+    los errores en los que la petición no llegó a enviarse (ver
+    SocialNetwork.is_transient_error). Crear un post no es idempotente, así
+    que un timeout o un 5xx no se reintentan: el post puede existir ya.
+
+    Args:
+        network (SocialNetwork): Red social en la que publicar
+        content (str): Contenido a publicar
+        title (str): Título del contenido
+        hashtags (list): Lista de hashtags
+        project (str): Nombre del proyecto
+        images (list): Lista de rutas a imágenes
+
+    Returns:
+        dict: Resultado de la publicación en la red social
+    """
+    started = time.perf_counter()
+
+    for attempt in range(NETWORK_MAX_RETRIES + 1):
+        try:
+            result = network.publish(content=content, title=title, hashtags=hashtags, project=project, images=images)
+            result = {
+                'network': network.__class__.__name__,
+                'success': True,
+                'result': result
+            }
+        except Exception as e:
+            result = {
+                'network': network.__class__.__name__,
+                'success': False,
+                'error': str(e),
+                'retryable': network.is_transient_error(e)
+            }
+
+        if attempt == NETWORK_MAX_RETRIES or not is_retryable(result):
+            break
+
+        PUBLISH_RETRIES.inc(network=result['network'])
+        time.sleep(retry_delay(attempt))
+
+    if attempt:
+        result['attempts'] = attempt + 1
+
+    record_publish(result, time.perf_counter() - started)
+
+    return result
+
+async def publish_to_network_async(network, content, title, hashtags, project, images, idempotency_key=None):
+    """
+    Publico en una red social desde un bucle de eventos (ver
+    publish_to_network).
+
+    Args:
+        network (SocialNetwork): Red social en la que publicar
+        content (str): Contenido a publicar
+        title (str): Título del contenido
+        hashtags (list): Lista de hashtags
+        project (str): Nombre del proyecto
+        images (list): Lista de rutas a imágenes
+        idempotency_key (str, optional): Clave de idempotencia del post
+
+    Returns:
+        dict: Resultado de la publicación en la red social
+    """
+    name = network.__class__.__name__
+
+    if not idempotency_key or not idempotency.enabled:
+        return await publish_with_retries_async(network, content, title, hashtags, project, images)
+
+    # Consulto el registro (SQLite) en un hilo y espero en el bucle
+    while not await asyncio.to_thread(idempotency.claim, project, name, idempotency_key):
+        stored = await asyncio.to_thread(idempotency.get, project, name, idempotency_key)
+        if stored:
+            return replay(name, stored)
+
+        await asyncio.sleep(IDEMPOTENCY_CLAIM_POLL)
+
+    result = None
+    try:
+        stored = await asyncio.to_thread(idempotency.get, project, name, idempotency_key)
+        if stored:
+            return replay(name, stored)
+
+        result = await publish_with_retries_async(network, content, title, hashtags, project, images)
+        return result
+    finally:
+        await asyncio.to_thread(idempotency.release, project, name, idempotency_key,
+                                result['result'] if result and is_published(result) else None)
+
+async def publish_with_retries_async(network, content, title, hashtags, project, images):
+    """
+    Publico en una red social reintentando los errores transitorios desde un
+    bucle de eventos (ver publish_with_retries).
+
+    Args:
+        network (SocialNetwork): Red social en la que publicar
+        content (str): Contenido a publicar
+        title (str): Título del contenido
+        hashtags (list): Lista de hashtags
+        project (str): Nombre del proyecto
+        images (list): Lista de rutas a imágenes
+
+    Returns:
+        dict: Resultado de la publicación en la red social
+    """
+    started = time.perf_counter()
+
+    for attempt in range(NETWORK_MAX_RETRIES + 1):
+        try:
+            result = await network.publish_async(content=content, title=title, hashtags=hashtags, project=project, images=images)
+            result = {
+                'network': network.__class__.__name__,
+                'success': True,
+                'result': result
+            }
+        except Exception as e:
+            result = {
+                'network': network.__class__.__name__,
+                'success': False,
+                'error': str(e),
+                'retryable': network.is_transient_error(e)
+            }
+
+        if attempt == NETWORK_MAX_RETRIES or not is_retryable(result):
+            break
+
+        PUBLISH_RETRIES.inc(network=result['network'])
+        await asyncio.sleep(retry_delay(attempt))
+
+    if attempt:
+        result['attempts'] = attempt + 1
+
+    record_publish(result, time.perf_counter() - started)
+
+    return result
+
+def record_publish(result, seconds):
+    """
+    Registro en las métricas la duración y el resultado de la publicación en
+    una red social.
+
+    Args:
+        result (dict): Resultado de la publicación en la red social
+        seconds (float): Segundos que tardó, con sus reintentos
+    """
+    if is_published(result):
+        outcome = 'success'
+    elif result['success'] and isinstance(result['result'], dict) and result['result'].get('status') == 'skipped':
+        outcome = 'skipped'
+    else:
+        outcome = 'error'
+
+    record('network.publish', seconds, PUBLISH_DURATION, network=result['network'])
+    PUBLISH_RESULTS.inc(network=result['network'], result=outcome)
+
+def replay(name, stored):
+    """
+    Devuelvo el resultado guardado de una publicación que ya se hizo, con el
+    formato de la respuesta de la api.
+
+    Args:
+        name (str): Nombre de la red social
+        stored (dict): Resultado guardado de la red social
+
+    Returns:
+        dict: Resultado de la publicación en la red social
+    """
+    PUBLISH_RESULTS.inc(network=name, result='replayed')
+
+    return {'network': name, 'success': True, 'result': stored, 'replayed': True}
+
+def is_retryable(result):
+    """
+    Compruebo si el resultado de una red social es un error transitorio que
+    merece reintentarse. Las redes devuelven sus errores como resultado con
+    status error y marcan los transitorios con retryable.
+
+    Args:
+        result (dict): Resultado de la publicación en la red social
+
+    Returns:
+        bool: True si hay que reintentar
+    """
+    if not result['success']:
+        return result.get('retryable', False)
+
+    return isinstance(result['result'], dict) and result['result'].get('retryable', False)
+
+def is_published(result):
+    """
+    Compruebo si el resultado de una red social es una publicación correcta.
+
+    Args:
+        result (dict): Resultado de la publicación en la red social
+
+    Returns:
+        bool: True si el post se publicó
+    """
+    return result['success'] and isinstance(result['result'], dict) and result['result'].get('status') == 'success'
+
+def retry_delay(attempt):
+    """
+    Calculo la espera antes de un reintento: exponencial con el número de
+    intento y aleatoria entre 0 y ese máximo para que los reintentos de
+    varias peticiones no coincidan.
+
+    Args:
+        attempt (int): Número de intento que falló, empezando en 0
+
+    Returns:
+        float: Segundos de espera
+    """
+    return random.uniform(0, NETWORK_RETRY_BACKOFF * 2 ** attempt)
+
+def publish_to_networks(networks, progress=None, images=None, **kwargs):
+    """
+    Publico en todas las redes sociales a la vez, con un máximo de
+    PUBLISH_MAX_WORKERS hilos. Así la petición tarda lo que la red más lenta
+    en lugar de la suma de todas.
+
+    Args:
+        networks (list): Lista de redes sociales en las que publicar
+        progress (object, optional): Recibe cada resultado en cuanto termina
+                                     su red social mediante progress.result()
+        images (dict, optional): Imágenes preparadas para cada red social
+                                 por nombre (ver process_images)
+        **kwargs: Parámetros de la publicación (ver publish_to_network)
+
+    Returns:
+        list: Resultados de cada red social, en el mismo orden que networks
+    """
+    images = images or {}
+
+    def publish(network):
+        return publish_to_network(network, images=images.get(network.__class__.__name__, []), **kwargs)
+
+    if PUBLISH_MAX_WORKERS <= 1 or len(networks) <= 1:
+        results = []
+        for network in networks:
+            result = publish(network)
+            if progress:
+                progress.result(result)
+            results.append(result)
+        return results
+
+    with ThreadPoolExecutor(max_workers=min(PUBLISH_MAX_WORKERS, len(networks))) as executor:
+        futures = [executor.submit(run_in_context(publish), network) for network in networks]
+
+        if progress:
+            for future in as_completed(futures):
+                progress.result(future.result())
+
+        return [future.result() for future in futures]
+
+def publish_post(data, progress=None, networks=None):
+    """
+    Publico un post en todas las redes sociales habilitadas en el perfil de
+    su proyecto.
+
+    Args:
+        data (dict): Datos del post (ver endpoint /publish)
+        progress (object, optional): Objeto que recibe el avance de la
+                                     publicación con los métodos
+                                     start(network_names) y result(result)
+        networks (list, optional): Redes sociales ya inicializadas para el
+                                   proyecto del post (ver build_networks)
+
+    Returns:
+        dict: Respuesta con el resultado global y el de cada red social
+    """
+    error = validate_post(data)
+    if error:
+        return {'success': False, 'error': error}
+
+    # Si se piden, devuelvo los tiempos de cada fase en la respuesta
+    with collect(data.get('timings')) as timings:
+        response = _publish_post(data, progress, networks)
+
+    if timings and 'results' in response:
+        response['timings'] = timings.summary()
+
+    return response
+
+def _publish_post(data, progress, networks):
+    """
+    Publico un post ya validado (ver publish_post).
+    """
+    # Proceso datos
+    content = data.get('content')
+    title = data.get('title', '')
+    hashtags = process_hashtags(data.get('hashtags', []))
+    project = data.get('project')
+
+    with stage('profile'):
+        # Cargo la configuración del proyecto (solo se relee si el .env cambió)
+        profile = profiles.get(project)
+        if not profile:
+            return {'success': False, 'error': f'No se encontró el archivo de configuración para el proyecto {project}'}
+
+        # Reutilizo las redes sociales del proyecto mientras su perfil no cambie
+        if networks is None:
+            networks = client_pool.get('networks', project, profile.version, lambda: build_networks(profile))
+
+    network_names = [network.__class__.__name__ for network in networks]
+
+    # Preparo las imágenes con el perfil de codificación de cada red social
+    with stage('images'):
+        images = process_images(data.get('images', []), network_names)
+
+    try:
+        if progress:
+            progress.start(network_names)
+
+        # Publico en todas las redes sociales habilitadas a la vez
+        results = publish_to_networks(networks, progress=progress, content=content, title=title, hashtags=hashtags, project=project, images=images, idempotency_key=post_key(data))
+    finally:
+        # Limpio imágenes temporales (las redes con el mismo perfil comparten imagen)
+        cleanup_images({image for network_images in images.values() for image in network_images})
+        cleanup_uploads(data.get(UPLOADS_FIELD))
+
+    # Verifico si al menos una publicación se hizo bien para responder estado
+    success = any(result['success'] for result in results)
+
+    return {
+        'success': success,
+        'results': results
+    }
+
+async def publish_post_async(data):
+    """
+    Publico un post en todas las redes sociales habilitadas en el perfil de
+    su proyecto desde un bucle de eventos (ver publish_post). La lectura del
+    perfil, las imágenes y los archivos temporales se procesan en hilos, y
+    las redes sociales se publican a la vez sin ocupar un hilo por petición.
+
+    Args:
+        data (dict): Datos del post (ver endpoint /publish)
+
+    Returns:
+        dict: Respuesta con el resultado global y el de cada red social
+    """
+    error = await asyncio.to_thread(validate_post, data)
+    if error:
+        return {'success': False, 'error': error}
+
+    # Si se piden, devuelvo los tiempos de cada fase en la respuesta
+    with collect(data.get('timings')) as timings:
+        response = await _publish_post_async(data)
+
+    if timings and 'results' in response:
+        response['timings'] = timings.summary()
+
+    return response
+
+async def _publish_post_async(data):
+    """
+    Publico un post ya validado desde un bucle de eventos (ver
+    publish_post_async).
+    """
+    # Proceso datos
+    content = data.get('content')
+    title = data.get('title', '')
+    hashtags = process_hashtags(data.get('hashtags', []))
+    project = data.get('project')
+
+    with stage('profile'):
+        # Cargo el perfil (lee el .env si cambió) y creo las redes sociales en un hilo
+        networks = await asyncio.to_thread(project_networks, project)
+        if networks is None:
+            return {'success': False, 'error': f'No se encontró el archivo de configuración para el proyecto {project}'}
+
+    network_names = [network.__class__.__name__ for network in networks]
+
+    # Preparo las imágenes con el perfil de codificación de cada red social
+    with stage('images'):
+        images = await asyncio.to_thread(process_images, data.get('images', []), network_names)
+
+    key = post_key(data)
+
+    try:
+        # Publico en todas las redes sociales habilitadas a la vez
+        results = await asyncio.gather(*(
+            publish_to_network_async(network, content=content, title=title, hashtags=hashtags, project=project,
+                                     images=images.get(network.__class__.__name__, []), idempotency_key=key)
+            for network in networks
+        ))
+    finally:
+        # Limpio imágenes temporales (las redes con el mismo perfil comparten imagen)
+        await asyncio.to_thread(cleanup_images, {image for network_images in images.values() for image in network_images})
+        await asyncio.to_thread(cleanup_uploads, data.get(UPLOADS_FIELD))
+
+    return {
+        'success': any(result['success'] for result in results),
+        'results': list(results)
+    }
+
+def project_networks(project):
+    """
+    Obtengo las redes sociales habilitadas de un proyecto, reutilizándolas
+    mientras su perfil no cambie.
+
+    Args:
+        project (str): Nombre del proyecto
+
+    Returns:
+        list: Redes sociales inicializadas o None si no existe el perfil
+    """
+    # Cargo la configuración del proyecto (solo se relee si el .env cambió)
+    profile = profiles.get(project)
+    if not profile:
+        return None
+
+    return client_pool.get('networks', project, profile.version, lambda: build_networks(profile))
+
+def validate_batch(posts):
+    """
+    Compruebo que un lote es una lista de posts con un tamaño permitido. Cada
+    post se valida por separado al publicarlo.
+
+    Args:
+        posts (list): Posts recibidos en la petición
+
+    Returns:
+        str: Mensaje de error o None si el lote es válido
+    """
+    if not isinstance(posts, list) or not posts:
+        return 'Se requiere una lista de posts'
+
+    if len(posts) > BATCH_MAX_POSTS:
+        return f'El lote supera el máximo de {BATCH_MAX_POSTS} posts'
+
+    return None
+
+def publish_batch(posts):
+    """
+    Publico un lote de posts, posiblemente de proyectos distintos. Agrupo los
+    posts por proyecto para cargar su perfil e inicializar sus redes sociales
+    una sola vez, y publico hasta BATCH_MAX_WORKERS posts a la vez.
+
+    Args:
+        posts (list): Datos de cada post (ver endpoint /publish)
+
+    Returns:
+        dict: Respuesta con el resultado global (éxito si todos los posts se
+              publicaron en alguna red) y el de cada post, en el mismo orden
+              que se recibieron
+    """
+    error = validate_batch(posts)
+    if error:
+        return {'success': False, 'error': error}
+
+    results = [None] * len(posts)
+    groups = {}
+
+    for index, data in enumerate(posts):
+        error = validate_post(data) if isinstance(data, dict) else 'No se recibieron datos'
+        if error:
+            results[index] = {'success': False, 'error': error}
+            continue
+
+        groups.setdefault(data.get('project'), []).append(index)
+
+    tasks = []
+    for project, indexes in groups.items():
+        networks = project_networks(project)
+        tasks.extend((index, networks) for index in indexes)
+
+    def publish(task):
+        index, networks = task
+        return index, publish_post(posts[index], networks=networks)
+
+    if BATCH_MAX_WORKERS <= 1 or len(tasks) <= 1:
+        completed = [publish(task) for task in tasks]
+    else:
+        with ThreadPoolExecutor(max_workers=min(BATCH_MAX_WORKERS, len(tasks))) as executor:
+            completed = list(executor.map(publish, tasks))
+
+    for index, result in completed:
+        results[index] = result
+
+    return {
+        'success': all(result['success'] for result in results),
+        'results': [dict(result, index=index) for index, result in enumerate(results)]
+    }
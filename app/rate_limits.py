@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Control de los límites de peticiones de cada red social por cuenta.
+
+Cada red informa de su cuota en las respuestas (Twitter x-rate-limit-*,
+Mastodon X-RateLimit-*, Bluesky ratelimit-*, Telegram retry_after y la
+cabecera Retry-After). Guardo ese estado por red y cuenta en un cubo de
+fichas: antes de cada envío se toma una ficha y, si la cuota está agotada o
+la red pidió esperar, el envío espera hasta que vuelva a haber cuota en lugar
+de lanzarse contra un límite conocido. Cuando quedan pocas fichas espacio los
+envíos hasta el reinicio de la ventana para repartir las ráfagas.
+
+Si la espera necesaria supera RATE_LIMIT_MAX_WAIT el envío falla con
+RateLimitError indicando cuándo habrá cuota.
+"""
+
+import os
+import time
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+
+# Segundos máximos que un envío espera a que haya cuota
+RATE_LIMIT_MAX_WAIT = float(os.getenv('RATE_LIMIT_MAX_WAIT', '60'))
+
+# Fracción de la cuota a partir de la cual espacio los envíos hasta el reinicio
+RATE_LIMIT_PACE_FRACTION = 0.1
+
+class RateLimitError(Exception):
+    """
+    La cuota de la red social está agotada durante más tiempo del que se
+    puede esperar.
+    """
+
+    def __init__(self, network, wait):
+        super().__init__(f'Límite de peticiones de {network} alcanzado, habrá cuota en {int(wait) + 1} segundos')
+        self.wait = wait
+
+class TokenBucket:
+    """
+    Cuota de una cuenta en una red social.
+    """
+
+    def __init__(self):
+        self.limit = None
+        self.tokens = None
+        self.reset_at = None
+        self.retry_at = 0
+        self.last_at = 0
+
+    def delay(self, now):
+        """
+        Calculo cuánto hay que esperar para el siguiente envío y, si no hay
+        que esperar, tomo una ficha.
+
+        Args:
+            now (float): Instante actual
+
+        Returns:
+            float: Segundos de espera (0 si se puede enviar ya)
+        """
+        if now < self.retry_at:
+            return self.retry_at - now
+
+        # La ventana se ha reiniciado, vuelvo a tener la cuota completa
+        if self.reset_at is not None and now >= self.reset_at:
+            self.tokens = self.limit
+            self.reset_at = None
+
+        if self.tokens is not None:
+            if self.tokens <= 0:
+                return (self.reset_at - now) if self.reset_at else 0
+
+            # Con poca cuota reparto los envíos que quedan hasta el reinicio
+            if self.reset_at and self.limit and self.tokens <= self.limit * RATE_LIMIT_PACE_FRACTION:
+                spacing = (self.reset_at - now) / self.tokens
+                if now < self.last_at + spacing:
+                    return self.last_at + spacing - now
+
+            self.tokens -= 1
+
+        self.last_at = now
+        return 0
+
+    def state(self, now):
+        return {
+            'limit': self.limit,
+            'remaining': self.tokens,
+            'reset_in': round(self.reset_at - now, 1) if self.reset_at else None,
+            'retry_in': round(self.retry_at - now, 1) if self.retry_at > now else None
+        }
+
+class RateLimiter:
+    """
+    Cubos de fichas por red social y cuenta.
+    """
+
+    def __init__(self, max_wait=RATE_LIMIT_MAX_WAIT):
+        """
+        Inicializo el control de límites.
+
+        Args:
+            max_wait (float): Segundos máximos que un envío espera
+        """
+        self.max_wait = max_wait
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+        self.waits = 0
+        self.rejections = 0
+
+    def _reserve(self, network, account):
+        """
+        Intento tomar una ficha para un envío.
+
+        Returns:
+            float: Segundos de espera (0 si se tomó la ficha)
+        """
+        with self._lock:
+            bucket = self._buckets.get((network, account))
+            if not bucket:
+                return 0
+
+            delay = bucket.delay(time.time())
+            if delay > self.max_wait:
+                self.rejections += 1
+                raise RateLimitError(network, delay)
+
+            if delay:
+                self.waits += 1
+
+            return delay
+
+    def wait(self, network, account):
+        """
+        Espero a que haya cuota para un envío y tomo una ficha.
+
+        Args:
+            network (str): Nombre de la red social
+            account (str): Huella de la cuenta (ver account_key)
+        """
+        delay = self._reserve(network, account)
+        while delay:
+            time.sleep(delay)
+            delay = self._reserve(network, account)
+
+    async def wait_async(self, network, account):
+        """
+        Espero a que haya cuota para un envío sin bloquear el bucle de
+        eventos (ver wait).
+
+        Args:
+            network (str): Nombre de la red social
+            account (str): Huella de la cuenta (ver account_key)
+        """
+        delay = self._reserve(network, account)
+        while delay:
+            await asyncio.sleep(delay)
+            delay = self._reserve(network, account)
+
+    def update(self, network, account, limit=None, remaining=None, reset=None, retry_after=None):
+        """
+        Actualizo la cuota de una cuenta con lo que informa la red social.
+
+        Args:
+            network (str): Nombre de la red social
+            account (str): Huella de la cuenta (ver account_key)
+            limit (int, optional): Peticiones permitidas en la ventana
+            remaining (int, optional): Peticiones que quedan en la ventana
+            reset (float, optional): Instante (epoch) en el que se reinicia la ventana
+            retry_after (float, optional): Segundos que la red pide esperar
+        """
+        if limit is None and remaining is None and reset is None and retry_after is None:
+            return
+
+        with self._lock:
+            bucket = self._buckets.setdefault((network, account), TokenBucket())
+
+            if limit is not None:
+                bucket.limit = limit
+            if remaining is not None:
+                bucket.tokens = remaining
+            if reset is not None:
+                bucket.reset_at = reset
+            if retry_after is not None:
+                bucket.retry_at = max(bucket.retry_at, time.time() + retry_after)
+
+    def update_from_headers(self, network, account, headers, prefix):
+        """
+        Actualizo la cuota de una cuenta a partir de las cabeceras de una
+        respuesta.
+
+        Args:
+            network (str): Nombre de la red social
+            account (str): Huella de la cuenta (ver account_key)
+            headers (Mapping): Cabeceras de la respuesta (sin distinguir mayúsculas)
+            prefix (str): Prefijo de las cabeceras de cuota (ej: x-rate-limit-)
+        """
+        self.update(
+            network,
+            account,
+            limit=_int_header(headers, f'{prefix}limit'),
+            remaining=_int_header(headers, f'{prefix}remaining'),
+            reset=_int_header(headers, f'{prefix}reset'),
+            retry_after=parse_retry_after(headers.get('retry-after'))
+        )
+
+    def stats(self):
+        """
+        Obtengo el estado de la cuota de cada cuenta.
+
+        Returns:
+            dict: Esperas, rechazos y cuota de cada red y cuenta
+        """
+        now = time.time()
+
+        with self._lock:
+            return {
+                'waits': self.waits,
+                'rejections': self.rejections,
+                'accounts': {
+                    f'{network}:{account}': bucket.state(now)
+                    for (network, account), bucket in self._buckets.items()
+                }
+            }
+
+def _int_header(headers, name):
+    try:
+        return int(float(headers[name]))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def parse_retry_after(value):
+    """
+    Interpreto la cabecera Retry-After, en segundos o como fecha HTTP.
+
+    Args:
+        value (str): Valor de la cabecera
+
+    Returns:
+        float: Segundos de espera o None si no hay cabecera válida
+    """
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+# Control compartido por todas las publicaciones
+rate_limits = RateLimiter()
@@ -3,11 +3,21 @@
 
 """
 Inicializador del paquete de redes sociales.
+
+Las redes sociales se registran en NETWORKS con el prefijo de su
+configuración en el perfil y la clase que las implementa. El módulo de cada
+red (y su librería: tweepy, Mastodon.py, python-telegram-bot...) solo se
+importa la primera vez que un perfil la habilita, así el servicio arranca
+antes y cada proceso solo carga las redes que usa.
 """
 
+import sys
+import asyncio
+import importlib
+import requests
+from urllib3.exceptions import NewConnectionError, ConnectTimeoutError
 from abc import ABC, abstractmethod
-import os
-from dotenv import load_dotenv
+from profiles import get_profile
 
 
 class SocialNetwork(ABC):
@@ -17,22 +27,36 @@ class SocialNetwork(ABC):
     Así simplifico el sistema para publicar en cada red social.
     """
 
-    def __init__ (self):
+    def __init__ (self, profile=None):
         """
         Inicializo la red social.
+
+        Args:
+            profile (Profile, optional): Perfil del proyecto ya cargado
         """
         self.name = self.__class__.__name__
+        self.profile = profile
 
     def load_config (self, project):
         """
-        Cargo la configuración de la red social desde el archivo .env del
-        proyecto.
+        Obtengo la configuración de la red social del perfil del proyecto.
+        Uso el perfil recibido al crear la red social y, si no lo hay, lo
+        pido al registro de perfiles (que solo relee el .env si ha cambiado).
 
         Args:
             project (str): Nombre del proyecto (Debe corresponder con el nombre del archivo .env)
+
+        Returns:
+            Profile: Perfil del proyecto
         """
-        env_file = os.path.join('data', 'profiles', f'{project}.env')
-        load_dotenv(env_file, override=True)
+        if self.profile and self.profile.project == project:
+            return self.profile
+
+        profile = get_profile(project)
+        if not profile:
+            raise Exception(f'No se encontró el archivo de configuración para el proyecto {project}')
+
+        return profile
 
     @abstractmethod
     def publish (self, content, title=None, hashtags=None, project=None,
@@ -52,6 +76,60 @@ class SocialNetwork(ABC):
         """
         pass
 
+    async def publish_async (self, content, title=None, hashtags=None, project=None,
+                             images=None):
+        """
+        Publica contenido en la red social desde un bucle de eventos.
+        Por defecto ejecuto publish en un hilo del pool del bucle, las redes
+        con un cliente asíncrono lo sobrescriben (Telegram y Bluesky).
+        Mastodon y Twitter siguen usando hilos porque Mastodon.py y tweepy
+        (su Client de la api v2 y la subida de imágenes de la v1.1) solo
+        tienen cliente síncrono.
+
+        Args:
+            content (str): Contenido a publicar
+            project (str): Nombre del proyecto (Debe corresponder con el nombre del archivo .env)
+            title (str, optional): Título del contenido
+            hashtags (list, optional): Lista de hashtags
+            images (list, optional): Lista de rutas a imágenes
+
+        Returns:
+            dict: Resultado de la publicación
+        """
+        return await asyncio.to_thread(self.publish, content, title=title, hashtags=hashtags,
+                                       project=project, images=images)
+
+    def is_transient_error (self, error):
+        """
+        Compruebo si un error merece reintentar la publicación: solo los
+        errores en los que la petición no llegó a enviarse (no se pudo
+        resolver el nombre o abrir la conexión). Un timeout de lectura o un
+        5xx pueden llegar con el post ya creado, y reintentarlos lo
+        duplicaría. Las librerías que envuelven el error de requests o httpx
+        en uno propio lo dejan encadenado, así que también lo busco en la
+        cadena.
+
+        Args:
+            error (Exception): Error de la publicación
+
+        Returns:
+            bool: True si se puede reintentar
+        """
+        # httpx solo se carga con las redes que lo usan, si no está cargado
+        # no puede haber errores suyos
+        httpx = sys.modules.get('httpx')
+
+        while error is not None:
+            if isinstance(error, (requests.ConnectTimeout, NewConnectionError, ConnectTimeoutError)):
+                return True
+
+            if httpx and isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+                return True
+
+            error = error.__cause__ or error.__context__
+
+        return False
+
     def format_content (self, content, title=None, hashtags=None):
         """
         Formatea el contenido para la publicación.
@@ -75,4 +153,76 @@ class SocialNetwork(ABC):
             hashtags_text = ' '.join([f"{tag}" for tag in hashtags])
             formatted_content = f"{formatted_content}\n\n{hashtags_text}"
 
-        return formatted_content
\ No newline at end of file
+        return formatted_content
+
+# Redes sociales disponibles: prefijo en el perfil (<PREFIJO>_ENABLED) ->
+# clase que la implementa como 'módulo:Clase', en el orden en que se publican
+NETWORKS = {
+    'MASTODON': 'social_networks.mastodon:Mastodon',
+    'TWITTER': 'social_networks.twitter:Twitter',
+    'TELEGRAM': 'social_networks.telegram:Telegram',
+    'BLUESKY': 'social_networks.bluesky:Bluesky',
+}
+
+# Clases ya importadas por prefijo
+_classes = {}
+
+def register_network(prefix, path):
+    """
+    Registro una red social para que se publique en ella cuando un perfil
+    tenga <prefix>_ENABLED=true.
+
+    Args:
+        prefix (str): Prefijo de su configuración en el perfil (ej: MASTODON)
+        path (str): Clase que la implementa como 'módulo:Clase'
+    """
+    NETWORKS[prefix] = path
+    _classes.pop(prefix, None)
+
+def get_network_class(prefix):
+    """
+    Obtengo la clase de una red social, importando su módulo la primera vez.
+
+    Args:
+        prefix (str): Prefijo de la red social en el perfil
+
+    Returns:
+        type: Clase de la red social
+    """
+    network_class = _classes.get(prefix)
+
+    if network_class is None:
+        module_name, class_name = NETWORKS[prefix].split(':')
+        try:
+            network_class = getattr(importlib.import_module(module_name), class_name)
+        except (ImportError, AttributeError) as e:
+            raise Exception(f'No se pudo cargar la red social {prefix} ({NETWORKS[prefix]}): {str(e)}')
+
+        _classes[prefix] = network_class
+
+    return network_class
+
+def loaded_networks():
+    """
+    Obtengo las redes sociales cuyo módulo ya se ha importado.
+
+    Returns:
+        list: Nombres de las clases cargadas
+    """
+    return [network_class.__name__ for network_class in _classes.values()]
+
+def build_networks(profile):
+    """
+    Inicializo las redes sociales habilitadas en el perfil de un proyecto.
+
+    Args:
+        profile (Profile): Perfil del proyecto
+
+    Returns:
+        list: Redes sociales en las que publicar
+    """
+    return [
+        get_network_class(prefix)(profile)
+        for prefix in NETWORKS
+        if profile.is_enabled(prefix)
+    ]
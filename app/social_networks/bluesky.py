@@ -3,24 +3,302 @@
 
 """
 Implementación de la clase para publicar en Bluesky.
+
+Desde código síncrono publico con requests y, desde un bucle de eventos (el
+servidor ASGI), con httpx en el bucle compartido (ver async_runner), sin
+ocupar un hilo por publicación.
 """
 
 import os
 import json
-import requests
+import time
+import base64
+import asyncio
+import hashlib
+import threading
+import httpx
+from http_client import get_session, get_async_client
+from functions import read_image, image_mime_type, image_hash
+from media_cache import media_cache, account_key
+from rate_limits import rate_limits
+from metrics import NETWORK_REQUEST_DURATION, NETWORK_MEDIA_BYTES
+from timings import stage
+import async_runner
 from . import SocialNetwork
 
+# URL de la api XRPC (otro servidor PDS o un servidor de pruebas)
+BLUESKY_API_URL = os.getenv('BLUESKY_API_URL', 'https://bsky.social/xrpc')
+
+# Archivo donde guardo las sesiones de Bluesky para conservarlas entre
+# reinicios (vacío = solo en memoria)
+BLUESKY_SESSION_FILE = os.getenv('BLUESKY_SESSION_FILE', '')
+
+# Segundos antes de que caduque el token de acceso en los que ya lo refresco
+BLUESKY_REFRESH_MARGIN = 300
+
+# Segundos durante los que reutilizo un blob ya subido a una cuenta. Los blobs
+# que ya usa un post se conservan, pero si se borra ese post Bluesky puede
+# eliminarlos, así que no los guardo demasiado tiempo
+BLUESKY_BLOB_TTL = 6 * 3600
+
+# Duración que asumo para los tokens si no puedo leer su caducidad
+BLUESKY_ACCESS_TTL = 2 * 3600
+BLUESKY_REFRESH_TTL = 60 * 24 * 3600
+
+def _jwt_expiration(token, default_ttl):
+    """
+    Obtengo la fecha de caducidad (campo exp) de un token JWT sin validarlo.
+
+    Args:
+        token (str): Token JWT
+        default_ttl (int): Segundos de validez si no puedo leer la caducidad
+
+    Returns:
+        float: Fecha de caducidad como timestamp
+    """
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))['exp'])
+    except Exception:
+        return time.time() + default_ttl
+
+class BlueskySessionCache:
+    """
+    Caché de sesiones de Bluesky por identificador.
+
+    Reutilizo el accessJwt mientras es válido, lo refresco con
+    com.atproto.server.refreshSession poco antes de que caduque y solo vuelvo
+    a iniciar sesión si el refresco falla. Así evito el límite de inicios de
+    sesión de Bluesky cuando se publican muchos posts seguidos.
+    """
+
+    def __init__(self, path=BLUESKY_SESSION_FILE):
+        """
+        Inicializo la caché.
+
+        Args:
+            path (str): Archivo donde persistir las sesiones (vacío = no persistir)
+        """
+        self.path = path
+        self._sessions = None
+        self._locks = {}
+        self._async_locks = {}
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """
+        Cargo las sesiones guardadas en disco la primera vez que se usan.
+        """
+        if self._sessions is not None:
+            return
+
+        self._sessions = {}
+
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self._sessions = json.load(f)
+            except Exception as e:
+                print(f"Error leyendo las sesiones de Bluesky: {str(e)}")
+
+    def _save(self):
+        """
+        Guardo las sesiones en disco si la persistencia está activada.
+        """
+        if not self.path:
+            return
+
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+
+            # Los tokens son credenciales, solo los puede leer el usuario del servicio
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self._sessions, f)
+
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Error guardando las sesiones de Bluesky: {str(e)}")
+
+    def _lock_for(self, key):
+        """
+        Obtengo el bloqueo de un identificador, para que dos hilos no inicien
+        sesión a la vez con la misma cuenta.
+
+        Args:
+            key (str): Clave de la sesión
+
+        Returns:
+            threading.Lock: Bloqueo del identificador
+        """
+        with self._lock:
+            self._load()
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _async_lock_for(self, key):
+        """
+        Obtengo el bloqueo de un identificador para las corrutinas del bucle
+        compartido (ver _lock_for).
+
+        Args:
+            key (str): Clave de la sesión
+
+        Returns:
+            asyncio.Lock: Bloqueo del identificador
+        """
+        with self._lock:
+            self._load()
+            return self._async_locks.setdefault(key, asyncio.Lock())
+
+    def _store(self, key, session, secret):
+        """
+        Guardo una sesión nueva o refrescada.
+
+        Args:
+            key (str): Clave de la sesión
+            session (dict): Datos de la sesión devueltos por Bluesky
+            secret (str): Huella de la contraseña con la que se creó
+        """
+        with self._lock:
+            self._sessions[key] = {
+                'session': session,
+                'secret': secret,
+                'access_exp': _jwt_expiration(session['accessJwt'], BLUESKY_ACCESS_TTL),
+                'refresh_exp': _jwt_expiration(session['refreshJwt'], BLUESKY_REFRESH_TTL)
+            }
+            self._save()
+
+    def _forget(self, key):
+        """
+        Olvido la sesión de una cuenta que ya no se puede autenticar.
+
+        Args:
+            key (str): Clave de la sesión
+        """
+        with self._lock:
+            if self._sessions.pop(key, None):
+                self._save()
+
+    def _lookup(self, key, secret, force_refresh):
+        """
+        Busco la sesión guardada de una cuenta.
+
+        Args:
+            key (str): Clave de la sesión
+            secret (str): Huella de la contraseña actual
+            force_refresh (bool): Renuevo la sesión aunque parezca válida
+
+        Returns:
+            tuple: Sesión válida (o None) y sesión caducada que aún se puede
+                   refrescar (o None)
+        """
+        entry = self._sessions.get(key)
+        now = time.time()
+
+        # Descarto la sesión si la contraseña ha cambiado en el perfil
+        if entry and entry['secret'] == secret:
+            if not force_refresh and now < entry['access_exp'] - BLUESKY_REFRESH_MARGIN:
+                return entry['session'], None
+
+            if now < entry['refresh_exp']:
+                return None, entry['session']
+
+        return None, None
+
+    def get(self, client, identifier, password, force_refresh=False):
+        """
+        Obtengo una sesión válida para una cuenta.
+
+        Args:
+            client (Bluesky): Cliente con el que crear o refrescar la sesión
+            identifier (str): Correo o handle
+            password (str): Contraseña de la app
+            force_refresh (bool): Renuevo la sesión aunque parezca válida
+                                  (por ejemplo si Bluesky rechazó el token)
+
+        Returns:
+            dict: Datos de la sesión o None si no se pudo autenticar
+        """
+        key = f"{client.api_url}|{identifier}"
+        secret = hashlib.sha256(password.encode('utf-8')).hexdigest()
+
+        with self._lock_for(key):
+            session, expired = self._lookup(key, secret, force_refresh)
+            if session:
+                return session
+
+            if expired:
+                session = client._refresh_session(expired)
+                if session:
+                    self._store(key, session, secret)
+                    return session
+
+            session = client._create_session(identifier, password)
+            if session:
+                self._store(key, session, secret)
+            else:
+                self._forget(key)
+
+            return session
+
+    async def get_async(self, client, identifier, password, force_refresh=False):
+        """
+        Obtengo una sesión válida para una cuenta desde el bucle compartido
+        (ver get). El archivo de sesiones se escribe en un hilo.
+
+        Args:
+            client (Bluesky): Cliente con el que crear o refrescar la sesión
+            identifier (str): Correo o handle
+            password (str): Contraseña de la app
+            force_refresh (bool): Renuevo la sesión aunque parezca válida
+
+        Returns:
+            dict: Datos de la sesión o None si no se pudo autenticar
+        """
+        key = f"{client.api_url}|{identifier}"
+        secret = hashlib.sha256(password.encode('utf-8')).hexdigest()
+
+        async with self._async_lock_for(key):
+            session, expired = self._lookup(key, secret, force_refresh)
+            if session:
+                return session
+
+            if expired:
+                session = await client._refresh_session_async(expired)
+                if session:
+                    await asyncio.to_thread(self._store, key, session, secret)
+                    return session
+
+            session = await client._create_session_async(identifier, password)
+            if session:
+                await asyncio.to_thread(self._store, key, session, secret)
+            else:
+                await asyncio.to_thread(self._forget, key)
+
+            return session
+
+# Caché de sesiones compartida por todas las publicaciones
+sessions = BlueskySessionCache()
+
 class Bluesky(SocialNetwork):
     """
     Clase para publicar contenido en Bluesky.
     """
 
-    def __init__(self):
+    def __init__(self, profile=None):
         """
         Inicializo la conexión con Bluesky.
         """
-        super().__init__()
-        self.api_url = "https://bsky.social/xrpc"
+        super().__init__(profile)
+        self.api_url = BLUESKY_API_URL
+
+        # Sesión HTTP compartida, reutiliza las conexiones con Bluesky
+        self.http = get_session('bluesky')
+
+        # Cliente asíncrono compartido para publicar desde el bucle de eventos
+        self.http_async = get_async_client('bluesky')
 
     def publish(self, content, title=None, hashtags=None, project=None, images=None):
         """
@@ -36,91 +314,235 @@ class Bluesky(SocialNetwork):
         Returns:
             dict: Resultado de la publicación
         """
-        # Cargar configuración del proyecto
-        self.load_config(project)
+        # Cargar configuración y credenciales del proyecto
+        config = self.load_config(project)
+        credentials, error = self._credentials(config)
+        if error:
+            return error
 
-        # Verificar si Bluesky está habilitado
-        if os.getenv('BLUESKY_ENABLED', 'false').lower() != 'true':
-            return {'status': 'skipped', 'message': 'Bluesky no está habilitado para este proyecto'}
+        try:
+            # Autenticar con Bluesky (reutilizo la sesión si sigue siendo válida)
+            session = sessions.get(self, *credentials)
+            if not session:
+                return {'status': 'error', 'message': 'Error de autenticación en Bluesky'}
 
-        # Obtener credenciales
-        identifier = os.getenv('BLUESKY_IDENTIFIER')  # Correo o handle
-        password = os.getenv('BLUESKY_PASSWORD')  # Contraseña de la app
+            formatted_content = self._format_text(content, title, hashtags)
 
-        if not identifier or not password:
-            return {'status': 'error', 'message': 'Faltan credenciales para Bluesky'}
+            for use_cache in (True, False):
+                # Subir imágenes si existen (reutilizo las ya subidas a esta cuenta)
+                image_refs = []
+                cached_refs = False
+                for img_path in (images or [])[:4]:  # Máximo 4 imágenes
+                    blob_ref, cached = self._upload_image(img_path, credentials, use_cache)
+                    if blob_ref:
+                        image_refs.append(blob_ref)
+                        cached_refs = cached_refs or cached
+
+                # Publico post
+                response = self._xrpc_post(
+                    "com.atproto.repo.createRecord",
+                    credentials,
+                    json=self._post_data(session, formatted_content, image_refs)
+                )
+
+                # Si falla con imágenes reutilizadas, puede que Bluesky ya haya
+                # borrado algún blob: las olvido y las vuelvo a subir
+                if response.status_code == 200 or not cached_refs:
+                    break
+
+                self._forget_images(credentials, images)
+
+            return self._result(response, session)
+
+        except Exception as e:
+            return {
+                'status': 'error',
+                'message': f'Error al publicar en Bluesky: {str(e)}',
+                'retryable': self.is_transient_error(e)
+            }
+
+    async def publish_async(self, content, title=None, hashtags=None, project=None, images=None):
+        """
+        Publica contenido en Bluesky sin bloquear el bucle de eventos que
+        llama. El envío se hace con httpx en el bucle compartido, al que está
+        ligado su cliente.
+
+        Args:
+            content (str): Contenido a publicar
+            project (str): Nombre del proyecto
+            title (str, optional): Título del contenido
+            hashtags (list, optional): Lista de hashtags
+            images (list, optional): Lista de rutas a imágenes
+
+        Returns:
+            dict: Resultado de la publicación
+        """
+        return await async_runner.run_async(self._publish_async(content, title, hashtags, project, images))
+
+    async def _publish_async(self, content, title, hashtags, project, images):
+        """
+        Publica contenido en Bluesky desde el bucle compartido (ver publish).
+        """
+        config = self.load_config(project)
+        credentials, error = self._credentials(config)
+        if error:
+            return error
 
         try:
-            # Autenticar con Bluesky
-            session = self._create_session(identifier, password)
+            session = await sessions.get_async(self, *credentials)
             if not session:
                 return {'status': 'error', 'message': 'Error de autenticación en Bluesky'}
 
-            # Verifico si el contenido supera el límite de caracteres (300 para Bluesky)
-            if len(content) > 300:
-                # Si supera el límite, solo envío el contenido truncado sin título ni hashtags
-                formatted_content = content[:297] + "..."
-            else:
-                # Si no supera el límite, formateo normalmente con título y hashtags
-                formatted_content = self.format_content(content, title, hashtags)
-
-                # Verifico si después de añadir título y hashtags supera el límite
-                if len(formatted_content) > 300:
-                    formatted_content = formatted_content[:297] + "..."
-
-            # Subir imágenes si existen
-            image_refs = []
-            if images and len(images) > 0:
-                for img_path in images[:4]:  # Máximo 4 imágenes
-                    blob_ref = self._upload_image(img_path, session)
+            formatted_content = self._format_text(content, title, hashtags)
+
+            for use_cache in (True, False):
+                image_refs = []
+                cached_refs = False
+                for img_path in (images or [])[:4]:
+                    blob_ref, cached = await self._upload_image_async(img_path, credentials, use_cache)
                     if blob_ref:
                         image_refs.append(blob_ref)
+                        cached_refs = cached_refs or cached
 
-            # Crear post
-            post_data = {
-                "repo": session["did"],
-                "collection": "app.bsky.feed.post",
-                "record": {
-                    "$type": "app.bsky.feed.post",
-                    "text": formatted_content,
-                    "createdAt": self._get_iso_timestamp()
-                }
-            }
+                response = await self._xrpc_post_async(
+                    "com.atproto.repo.createRecord",
+                    credentials,
+                    json=self._post_data(session, formatted_content, image_refs)
+                )
 
-            # Añado imágenes si existen
-            if image_refs:
-                post_data["record"]["embed"] = {
-                    "$type": "app.bsky.embed.images",
-                    "images": image_refs
-                }
-
-            # Publico post
-            response = requests.post(
-                f"{self.api_url}/com.atproto.repo.createRecord",
-                json=post_data,
-                headers={"Authorization": f"Bearer {session['accessJwt']}"}
-            )
+                if response.status_code == 200 or not cached_refs:
+                    break
 
-            if response.status_code == 200:
-                result = response.json()
-                return {
-                    'status': 'success',
-                    'message': 'Publicado correctamente en Bluesky',
-                    'post_id': result.get('uri', ''),
-                    'url': f"https://bsky.app/profile/{session['handle']}/post/{result.get('uri', '').split('/')[-1]}"
-                }
-            else:
-                return {
-                    'status': 'error',
-                    'message': f'Error al publicar en Bluesky: {response.text}'
-                }
+                await asyncio.to_thread(self._forget_images, credentials, images)
+
+            return self._result(response, session)
 
         except Exception as e:
             return {
                 'status': 'error',
-                'message': f'Error al publicar en Bluesky: {str(e)}'
+                'message': f'Error al publicar en Bluesky: {str(e)}',
+                'retryable': self.is_transient_error(e)
             }
 
+    def _credentials(self, config):
+        """
+        Obtengo las credenciales de Bluesky del perfil del proyecto.
+
+        Args:
+            config (Profile): Perfil del proyecto
+
+        Returns:
+            tuple: Identificador y contraseña (o None), y el resultado que
+                   devolver si no se puede publicar (o None)
+        """
+        # Verificar si Bluesky está habilitado
+        if not config.is_enabled('BLUESKY'):
+            return None, {'status': 'skipped', 'message': 'Bluesky no está habilitado para este proyecto'}
+
+        # Obtener credenciales
+        identifier = config.get('BLUESKY_IDENTIFIER')  # Correo o handle
+        password = config.get('BLUESKY_PASSWORD')  # Contraseña de la app
+
+        if not identifier or not password:
+            return None, {'status': 'error', 'message': 'Faltan credenciales para Bluesky'}
+
+        return (identifier, password), None
+
+    def _format_text(self, content, title, hashtags):
+        """
+        Formateo el texto del post dentro del límite de 300 caracteres.
+
+        Args:
+            content (str): Contenido a publicar
+            title (str): Título del contenido
+            hashtags (list): Lista de hashtags
+
+        Returns:
+            str: Texto del post
+        """
+        # Verifico si el contenido supera el límite de caracteres (300 para Bluesky)
+        if len(content) > 300:
+            # Si supera el límite, solo envío el contenido truncado sin título ni hashtags
+            return content[:297] + "..."
+
+        # Si no supera el límite, formateo normalmente con título y hashtags
+        formatted_content = self.format_content(content, title, hashtags)
+
+        # Verifico si después de añadir título y hashtags supera el límite
+        if len(formatted_content) > 300:
+            formatted_content = formatted_content[:297] + "..."
+
+        return formatted_content
+
+    def _post_data(self, session, text, image_refs):
+        """
+        Preparo el registro del post para com.atproto.repo.createRecord.
+
+        Args:
+            session (dict): Datos de la sesión
+            text (str): Texto del post
+            image_refs (list): Referencias a las imágenes subidas
+
+        Returns:
+            dict: Datos de la petición
+        """
+        post_data = {
+            "repo": session["did"],
+            "collection": "app.bsky.feed.post",
+            "record": {
+                "$type": "app.bsky.feed.post",
+                "text": text,
+                "createdAt": self._get_iso_timestamp()
+            }
+        }
+
+        # Añado imágenes si existen
+        if image_refs:
+            post_data["record"]["embed"] = {
+                "$type": "app.bsky.embed.images",
+                "images": image_refs
+            }
+
+        return post_data
+
+    def _forget_images(self, credentials, images):
+        """
+        Olvido los blobs guardados de las imágenes de un post.
+
+        Args:
+            credentials (tuple): Identificador y contraseña de la cuenta
+            images (list): Lista de rutas a imágenes
+        """
+        account = account_key(self.api_url, credentials[0])
+        for img_path in images[:4]:
+            media_cache.invalidate('Bluesky', account, image_hash(img_path))
+
+    def _result(self, response, session):
+        """
+        Obtengo el resultado de la publicación a partir de la respuesta de
+        createRecord.
+
+        Args:
+            response (requests.Response|httpx.Response): Respuesta de Bluesky
+            session (dict): Datos de la sesión
+
+        Returns:
+            dict: Resultado de la publicación
+        """
+        if response.status_code == 200:
+            result = response.json()
+            return {
+                'status': 'success',
+                'message': 'Publicado correctamente en Bluesky',
+                'post_id': result.get('uri', ''),
+                'url': f"https://bsky.app/profile/{session['handle']}/post/{result.get('uri', '').split('/')[-1]}"
+            }
+
+        return {
+            'status': 'error',
+            'message': f'Error al publicar en Bluesky: {response.text}'
+        }
+
     def _create_session(self, identifier, password):
         """
         Crea una sesión en Bluesky.
@@ -133,10 +555,11 @@ class Bluesky(SocialNetwork):
             dict: Datos de la sesión
         """
         try:
-            response = requests.post(
-                f"{self.api_url}/com.atproto.server.createSession",
-                json={"identifier": identifier, "password": password}
-            )
+            with stage('network.auth', NETWORK_REQUEST_DURATION, network='Bluesky', operation='auth'):
+                response = self.http.post(
+                    f"{self.api_url}/com.atproto.server.createSession",
+                    json={"identifier": identifier, "password": password}
+                )
 
             if response.status_code == 200:
                 return response.json()
@@ -144,49 +567,287 @@ class Bluesky(SocialNetwork):
         except Exception:
             return None
 
-    def _upload_image(self, img_path, session):
+    async def _create_session_async(self, identifier, password):
+        """
+        Crea una sesión en Bluesky desde el bucle compartido (ver
+        _create_session).
         """
-        Sube una imagen a Bluesky.
+        try:
+            with stage('network.auth', NETWORK_REQUEST_DURATION, network='Bluesky', operation='auth'):
+                response = await self.http_async.post(
+                    f"{self.api_url}/com.atproto.server.createSession",
+                    json={"identifier": identifier, "password": password}
+                )
+
+            if response.status_code == 200:
+                return response.json()
+            return None
+        except Exception:
+            return None
+
+    def _refresh_session(self, session):
+        """
+        Refresca una sesión de Bluesky con su refreshJwt.
 
         Args:
-            img_path (str): Ruta de la imagen
-            session (dict): Datos de la sesión
+            session (dict): Datos de la sesión a refrescar
+
+        Returns:
+            dict: Datos de la sesión refrescada o None si no se pudo refrescar
+        """
+        try:
+            with stage('network.auth', NETWORK_REQUEST_DURATION, network='Bluesky', operation='auth'):
+                response = self.http.post(
+                    f"{self.api_url}/com.atproto.server.refreshSession",
+                    headers={"Authorization": f"Bearer {session['refreshJwt']}"}
+                )
+
+            if response.status_code == 200:
+                return response.json()
+            return None
+        except Exception:
+            return None
+
+    async def _refresh_session_async(self, session):
+        """
+        Refresca una sesión de Bluesky desde el bucle compartido (ver
+        _refresh_session).
+        """
+        try:
+            with stage('network.auth', NETWORK_REQUEST_DURATION, network='Bluesky', operation='auth'):
+                response = await self.http_async.post(
+                    f"{self.api_url}/com.atproto.server.refreshSession",
+                    headers={"Authorization": f"Bearer {session['refreshJwt']}"}
+                )
+
+            if response.status_code == 200:
+                return response.json()
+            return None
+        except Exception:
+            return None
+
+    def _xrpc_post(self, method, credentials, headers=None, **kwargs):
+        """
+        Hago una petición autenticada a la api de Bluesky. Si Bluesky rechaza
+        el token de la sesión, la renuevo y reintento una sola vez.
+
+        Args:
+            method (str): Método XRPC (ej: com.atproto.repo.createRecord)
+            credentials (tuple): Identificador y contraseña de la cuenta
+            headers (dict, optional): Cabeceras adicionales
+            **kwargs: Parámetros para la petición POST
+
+        Returns:
+            requests.Response: Respuesta de Bluesky
+        """
+        identifier, password = credentials
+        account = account_key(self.api_url, identifier)
+        response = None
+
+        for force_refresh in (False, True):
+            session = sessions.get(self, identifier, password, force_refresh=force_refresh)
+            if not session:
+                break
+
+            response = self._post_limited(
+                account,
+                f"{self.api_url}/{method}",
+                'media' if method == 'com.atproto.repo.uploadBlob' else 'post',
+                headers={**(headers or {}), "Authorization": f"Bearer {session['accessJwt']}"},
+                **kwargs
+            )
+
+            if not self._is_expired_token(response):
+                break
+
+        if response is None:
+            raise Exception('Error de autenticación en Bluesky')
+
+        return response
+
+    async def _xrpc_post_async(self, method, credentials, headers=None, **kwargs):
+        """
+        Hago una petición autenticada a la api de Bluesky desde el bucle
+        compartido (ver _xrpc_post).
+
+        Returns:
+            httpx.Response: Respuesta de Bluesky
+        """
+        identifier, password = credentials
+        account = account_key(self.api_url, identifier)
+        response = None
+
+        for force_refresh in (False, True):
+            session = await sessions.get_async(self, identifier, password, force_refresh=force_refresh)
+            if not session:
+                break
+
+            response = await self._post_limited_async(
+                account,
+                f"{self.api_url}/{method}",
+                'media' if method == 'com.atproto.repo.uploadBlob' else 'post',
+                headers={**(headers or {}), "Authorization": f"Bearer {session['accessJwt']}"},
+                **kwargs
+            )
+
+            if not self._is_expired_token(response):
+                break
+
+        if response is None:
+            raise Exception('Error de autenticación en Bluesky')
+
+        return response
+
+    def _post_limited(self, account, url, operation, **kwargs):
+        """
+        Hago una petición POST respetando la cuota de la cuenta. Si Bluesky
+        responde 429 espero lo que indique y reintento una sola vez.
+
+        Args:
+            account (str): Huella de la cuenta (ver account_key)
+            url (str): URL de la petición
+            operation (str): Operación para las métricas (media o post)
+            **kwargs: Parámetros para la petición POST
+
+        Returns:
+            requests.Response: Respuesta de Bluesky
+        """
+        for attempt in range(2):
+            rate_limits.wait('Bluesky', account)
+
+            with stage(f'network.{operation}', NETWORK_REQUEST_DURATION, network='Bluesky', operation=operation):
+                response = self.http.post(url, **kwargs)
+            rate_limits.update_from_headers('Bluesky', account, response.headers, 'ratelimit-')
+
+            if response.status_code != 429:
+                break
+
+        return response
+
+    async def _post_limited_async(self, account, url, operation, **kwargs):
+        """
+        Hago una petición POST respetando la cuota de la cuenta desde el
+        bucle compartido (ver _post_limited). httpx recibe los bytes del
+        cuerpo en content en lugar de data.
+
+        Returns:
+            httpx.Response: Respuesta de Bluesky
+        """
+        if 'data' in kwargs:
+            kwargs['content'] = kwargs.pop('data')
+
+        for attempt in range(2):
+            await rate_limits.wait_async('Bluesky', account)
+
+            with stage(f'network.{operation}', NETWORK_REQUEST_DURATION, network='Bluesky', operation=operation):
+                response = await self.http_async.post(url, **kwargs)
+            rate_limits.update_from_headers('Bluesky', account, response.headers, 'ratelimit-')
+
+            if response.status_code != 429:
+                break
+
+        return response
+
+    def _is_expired_token(self, response):
+        """
+        Compruebo si Bluesky rechazó la petición por un token caducado o no válido.
+
+        Args:
+            response (requests.Response|httpx.Response): Respuesta de Bluesky
 
         Returns:
-            dict: Referencia a la imagen
+            bool: True si hay que renovar la sesión
         """
+        if response.status_code not in (400, 401):
+            return False
+
         try:
-            # Determinar el tipo MIME
-            mime_type = "image/jpeg"  # Por defecto
-            if img_path.lower().endswith(".png"):
-                mime_type = "image/png"
-            elif img_path.lower().endswith(".gif"):
-                mime_type = "image/gif"
+            return response.json().get('error') in ('ExpiredToken', 'InvalidToken')
+        except ValueError:
+            return False
+
+    def _upload_image(self, img_path, credentials, use_cache=True):
+        """
+        Sube una imagen a Bluesky, o reutiliza el blob si ya se subió antes
+        la misma imagen a la misma cuenta.
+
+        Args:
+            img_path (str|MemoryImage): Ruta de la imagen o imagen en memoria
+            credentials (tuple): Identificador y contraseña de la cuenta
+            use_cache (bool): Reutilizo el blob si ya está subido
+
+        Returns:
+            tuple: Referencia a la imagen (o None) y si se tomó de la caché
+        """
+        try:
+            account = account_key(self.api_url, credentials[0])
+            content_hash = image_hash(img_path)
+
+            blob = media_cache.get('Bluesky', account, content_hash) if use_cache else None
+            if blob:
+                return {"alt": "Imagen adjunta", "image": blob}, True
+
+            # Determinar el tipo MIME a partir del contenido
+            mime_type = image_mime_type(img_path)
 
             # Leo la imagen
-            with open(img_path, "rb") as f:
-                img_data = f.read()
+            img_data = read_image(img_path)
 
             # Subo la imagen
-            response = requests.post(
-                f"{self.api_url}/com.atproto.repo.uploadBlob",
+            response = self._xrpc_post(
+                "com.atproto.repo.uploadBlob",
+                credentials,
                 data=img_data,
-                headers={
-                    "Content-Type": mime_type,
-                    "Authorization": f"Bearer {session['accessJwt']}"
-                }
+                headers={"Content-Type": mime_type}
             )
 
             if response.status_code == 200:
+                NETWORK_MEDIA_BYTES.inc(len(img_data), network='Bluesky')
                 blob = response.json().get("blob")
+                media_cache.put('Bluesky', account, content_hash, blob, BLUESKY_BLOB_TTL)
                 return {
                     "alt": "Imagen adjunta",
                     "image": blob
-                }
-            return None
+                }, False
+            return None, False
         except Exception as e:
             print(f"Error al subir imagen a Bluesky: {str(e)}")
-            return None
+            return None, False
+
+    async def _upload_image_async(self, img_path, credentials, use_cache=True):
+        """
+        Sube una imagen a Bluesky desde el bucle compartido (ver
+        _upload_image). La imagen se lee del disco en un hilo.
+        """
+        try:
+            account = account_key(self.api_url, credentials[0])
+            content_hash = await asyncio.to_thread(image_hash, img_path)
+
+            blob = media_cache.get('Bluesky', account, content_hash) if use_cache else None
+            if blob:
+                return {"alt": "Imagen adjunta", "image": blob}, True
+
+            mime_type, img_data = await asyncio.to_thread(lambda: (image_mime_type(img_path), read_image(img_path)))
+
+            response = await self._xrpc_post_async(
+                "com.atproto.repo.uploadBlob",
+                credentials,
+                data=img_data,
+                headers={"Content-Type": mime_type}
+            )
+
+            if response.status_code == 200:
+                NETWORK_MEDIA_BYTES.inc(len(img_data), network='Bluesky')
+                blob = response.json().get("blob")
+                media_cache.put('Bluesky', account, content_hash, blob, BLUESKY_BLOB_TTL)
+                return {
+                    "alt": "Imagen adjunta",
+                    "image": blob
+                }, False
+            return None, False
+        except Exception as e:
+            print(f"Error al subir imagen a Bluesky: {str(e)}")
+            return None, False
 
     def _get_iso_timestamp(self):
         """
@@ -3,10 +3,18 @@
 
 """
 Implementación de la clase para publicar en Mastodon.
+
+Mastodon.py solo tiene cliente síncrono, así que desde el servidor ASGI se
+publica en un hilo (ver SocialNetwork.publish_async).
 """
 
-import os
-from mastodon import Mastodon as MastodonAPI
+from mastodon import Mastodon as MastodonAPI, MastodonRatelimitError
+from functions import MemoryImage, image_size
+from client_pool import client_pool
+from media_cache import account_key
+from rate_limits import rate_limits
+from metrics import NETWORK_REQUEST_DURATION, NETWORK_MEDIA_BYTES
+from timings import stage
 from . import SocialNetwork
 
 class Mastodon(SocialNetwork):
@@ -14,11 +22,11 @@ class Mastodon(SocialNetwork):
     Clase para publicar contenido en Mastodon.
     """
 
-    def __init__(self):
+    def __init__(self, profile=None):
         """
         Inicializo la conexión con Mastodon.
         """
-        super().__init__()
+        super().__init__(profile)
 
     def publish(self, content, title=None, hashtags=None, project=None, images=None):
         """
@@ -35,25 +43,27 @@ class Mastodon(SocialNetwork):
             dict: Resultado de la publicación
         """
         # Cargar configuración del proyecto
-        self.load_config(project)
+        config = self.load_config(project)
 
         # Verificar si Mastodon está habilitado
-        if os.getenv('MASTODON_ENABLED', 'false').lower() != 'true':
+        if not config.is_enabled('MASTODON'):
             return {'status': 'skipped', 'message': 'Mastodon no está habilitado para este proyecto'}
 
         # Obtener credenciales
-        api_base_url = os.getenv('MASTODON_API_BASE_URL')
-        access_token = os.getenv('MASTODON_ACCESS_TOKEN')
+        api_base_url = config.get('MASTODON_API_BASE_URL')
+        access_token = config.get('MASTODON_ACCESS_TOKEN')
 
         if not api_base_url or not access_token:
             return {'status': 'error', 'message': 'Faltan credenciales para Mastodon'}
 
         try:
-            # Inicializo cliente de Mastodon
-            mastodon = MastodonAPI(
-                api_base_url=api_base_url,
-                access_token=access_token
+            # Reutilizo el cliente del proyecto mientras no cambien sus credenciales.
+            # Las esperas por límite de peticiones las gestiona rate_limits
+            mastodon = client_pool.get(
+                'Mastodon', project, (api_base_url, access_token),
+                lambda: MastodonAPI(api_base_url=api_base_url, access_token=access_token, ratelimit_method='throw')
             )
+            account = account_key(api_base_url, access_token)
 
             # Verifico si el contenido supera el límite de caracteres (500 para Mastodon)
             if len(content) > 500:
@@ -67,19 +77,25 @@ class Mastodon(SocialNetwork):
                 if len(formatted_content) > 500:
                     formatted_content = formatted_content[:497] + "..."
 
-            # Subir imágenes si existen
+            # Subir imágenes si existen. Mastodon no deja adjuntar un mismo
+            # media_id a varias publicaciones, así que no las reutilizo
             media_ids = []
             if images and len(images) > 0:
                 for img_path in images:
-                    media = mastodon.media_post(img_path)
+                    if isinstance(img_path, MemoryImage):
+                        # Subo la imagen directamente desde memoria
+                        media = self._call(mastodon, account, 'media', lambda: mastodon.media_post(img_path.data, mime_type=img_path.mime_type, file_name=img_path.name))
+                    else:
+                        media = self._call(mastodon, account, 'media', lambda: mastodon.media_post(img_path))
+                    NETWORK_MEDIA_BYTES.inc(image_size(img_path), network='Mastodon')
                     media_ids.append(media['id'])
 
             # Publicar toot
-            response = mastodon.status_post(
+            response = self._call(mastodon, account, 'post', lambda: mastodon.status_post(
                 status=formatted_content,
                 media_ids=media_ids if media_ids else None,
                 visibility='public'
-            )
+            ))
 
             return {
                 'status': 'success',
@@ -91,5 +107,39 @@ class Mastodon(SocialNetwork):
         except Exception as e:
             return {
                 'status': 'error',
-                'message': f'Error al publicar en Mastodon: {str(e)}'
+                'message': f'Error al publicar en Mastodon: {str(e)}',
+                'retryable': self.is_transient_error(e)
             }
+
+    def _call(self, mastodon, account, operation, request):
+        """
+        Hago una llamada a Mastodon respetando la cuota de la cuenta, que
+        actualizo con las cabeceras X-RateLimit-* que lee el cliente. Si
+        Mastodon responde 429 espero a que se reinicie y reintento una sola vez.
+
+        Args:
+            mastodon (MastodonAPI): Cliente de Mastodon
+            account (str): Huella de la cuenta (ver account_key)
+            operation (str): Operación para las métricas (media o post)
+            request (callable): Llamada a la API
+
+        Returns:
+            object: Respuesta de Mastodon
+        """
+        for attempt in range(2):
+            rate_limits.wait('Mastodon', account)
+
+            try:
+                with stage(f'network.{operation}', NETWORK_REQUEST_DURATION, network='Mastodon', operation=operation):
+                    return request()
+            except MastodonRatelimitError:
+                if attempt:
+                    raise
+            finally:
+                rate_limits.update(
+                    'Mastodon',
+                    account,
+                    limit=mastodon.ratelimit_limit,
+                    remaining=mastodon.ratelimit_remaining,
+                    reset=mastodon.ratelimit_reset
+                )
@@ -9,18 +9,54 @@ import os
 import asyncio
 import telegram
 from telegram.constants import ParseMode
+from telegram.request import HTTPXRequest
+from functions import read_image, image_hash
+from media_cache import media_cache, account_key
+from client_pool import client_pool
+from rate_limits import rate_limits
+from metrics import NETWORK_REQUEST_DURATION, NETWORK_MEDIA_BYTES
+from timings import stage
+from http_client import HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_POOL_MAXSIZE
+import async_runner
 from . import SocialNetwork
 
+# URL base de la Bot API (un servidor Bot API propio o un servidor de pruebas)
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org/bot')
+
+# Segundos durante los que reutilizo el file_id de una imagen ya enviada por
+# un bot (Telegram los mantiene válidos indefinidamente para ese bot)
+TELEGRAM_FILE_ID_TTL = 30 * 24 * 3600
+
 class Telegram(SocialNetwork):
     """
     Clase para publicar contenido en Telegram.
     """
 
-    def __init__(self):
+    def __init__(self, profile=None):
         """
         Inicializo la conexión con Telegram.
         """
-        super().__init__()
+        super().__init__(profile)
+
+    def _create_bot(self, bot_token):
+        """
+        Creo un bot de Telegram con un pool de conexiones propio. El bot se
+        usa siempre desde el bucle de eventos compartido (ver async_runner),
+        así que sus conexiones se mantienen abiertas entre publicaciones.
+
+        Args:
+            bot_token (str): Token del bot
+
+        Returns:
+            telegram.Bot: Bot de Telegram
+        """
+        request = HTTPXRequest(
+            connection_pool_size=HTTP_POOL_MAXSIZE,
+            connect_timeout=HTTP_CONNECT_TIMEOUT,
+            read_timeout=HTTP_READ_TIMEOUT
+        )
+
+        return telegram.Bot(token=bot_token, base_url=TELEGRAM_API_URL, request=request)
 
     async def _send_telegram_message(self, bot, chat_id, formatted_content, images=None):
         """
@@ -30,58 +66,39 @@ class Telegram(SocialNetwork):
             bot: Instancia del bot de Telegram
             chat_id: ID del chat donde enviar el mensaje
             formatted_content: Contenido formateado del mensaje
-            images: Lista de rutas a imágenes (opcional)
+            images: Lista de imágenes, rutas o MemoryImage (opcional)
 
         Returns:
             El resultado de la operación de envío
         """
         # Publicar mensaje con imágenes si existen
         if images and len(images) > 0:
-            # Si hay una sola imagen, envío como foto con texto
-            if len(images) == 1:
-                with open(images[0], 'rb') as photo:
-                    response = await bot.send_photo(
-                        chat_id=chat_id,
-                        photo=photo,
-                        caption=formatted_content,
-                        parse_mode=ParseMode.HTML
-                    )
-                return response
-            # Si hay múltiples imágenes, envío como un grupo de medios
-            else:
-                media_group = []
-                file_handles = []
+            # Reutilizo las imágenes que este bot ya envió antes (por file_id).
+            # Leer y calcular el hash de las imágenes se hace en un hilo para
+            # no bloquear el bucle compartido
+            account = account_key(bot.token)
+            hashes = await asyncio.to_thread(lambda: [image_hash(img_path) for img_path in images])
+            file_ids = [media_cache.get('Telegram', account, content_hash) for content_hash in hashes]
 
-                try:
-                    for i, img_path in enumerate(images):
-                        file_handle = open(img_path, 'rb')
-                        file_handles.append(file_handle)
-
-                        # El primer elemento del grupo lleva el texto añadido
-                        if i == 0:
-                            media_group.append(
-                                telegram.InputMediaPhoto(
-                                    media=file_handle,
-                                    caption=formatted_content,
-                                    parse_mode=ParseMode.HTML
-                                )
-                            )
-                        else:
-                            media_group.append(
-                                telegram.InputMediaPhoto(
-                                    media=file_handle
-                                )
-                            )
-
-                    response = await bot.send_media_group(
-                        chat_id=chat_id,
-                        media=media_group
-                    )
-                    return response
-                finally:
-                    # Cierro los manejadores de archivos
-                    for handle in file_handles:
-                        handle.close()
+            try:
+                response = await self._send_photos(bot, chat_id, formatted_content, images, file_ids)
+            except telegram.error.BadRequest:
+                if not any(file_ids):
+                    raise
+
+                # Telegram rechazó algún file_id reutilizado, subo las imágenes de nuevo
+                for content_hash in hashes:
+                    media_cache.invalidate('Telegram', account, content_hash)
+
+                response = await self._send_photos(bot, chat_id, formatted_content, images, [None] * len(images))
+
+            # Guardo el file_id de cada imagen enviada (la versión más grande)
+            messages = response if isinstance(response, (list, tuple)) else [response]
+            for content_hash, message in zip(hashes, messages):
+                if message.photo:
+                    media_cache.put('Telegram', account, content_hash, message.photo[-1].file_id, TELEGRAM_FILE_ID_TTL)
+
+            return response
         # Si no hay imágenes, envío solo texto
         else:
             response = await bot.send_message(
@@ -91,6 +108,64 @@ class Telegram(SocialNetwork):
             )
             return response
 
+    async def _send_photos(self, bot, chat_id, formatted_content, images, file_ids):
+        """
+        Envía a Telegram un mensaje con imágenes, usando el file_id de las que
+        ya se enviaron antes y el contenido de las demás.
+
+        Args:
+            bot: Instancia del bot de Telegram
+            chat_id: ID del chat donde enviar el mensaje
+            formatted_content: Contenido formateado del mensaje
+            images: Lista de imágenes, rutas o MemoryImage
+            file_ids: file_id de cada imagen o None si hay que subirla
+
+        Returns:
+            El resultado de la operación de envío
+        """
+        photos = await asyncio.to_thread(lambda: [file_id or read_image(img_path) for img_path, file_id in zip(images, file_ids)])
+
+        # Solo cuento las imágenes que se suben, no las enviadas por file_id
+        uploaded_bytes = sum(len(photo) for photo in photos if isinstance(photo, bytes))
+
+        # Si hay una sola imagen, envío como foto con texto
+        if len(photos) == 1:
+            response = await bot.send_photo(
+                chat_id=chat_id,
+                photo=photos[0],
+                caption=formatted_content,
+                parse_mode=ParseMode.HTML
+            )
+            NETWORK_MEDIA_BYTES.inc(uploaded_bytes, network='Telegram')
+            return response
+
+        # Si hay múltiples imágenes, envío como un grupo de medios
+        media_group = []
+
+        for i, photo in enumerate(photos):
+            # El primer elemento del grupo lleva el texto añadido
+            if i == 0:
+                media_group.append(
+                    telegram.InputMediaPhoto(
+                        media=photo,
+                        caption=formatted_content,
+                        parse_mode=ParseMode.HTML
+                    )
+                )
+            else:
+                media_group.append(
+                    telegram.InputMediaPhoto(
+                        media=photo
+                    )
+                )
+
+        response = await bot.send_media_group(
+            chat_id=chat_id,
+            media=media_group
+        )
+        NETWORK_MEDIA_BYTES.inc(uploaded_bytes, network='Telegram')
+        return response
+
     def publish(self, content, title=None, hashtags=None, project=None, images=None):
         """
         Publica contenido en Telegram.
@@ -105,23 +180,48 @@ class Telegram(SocialNetwork):
         Returns:
             dict: Resultado de la publicación
         """
-        # Cargar configuración del proyecto
-        self.load_config(project)
+        # Ejecuto la publicación en el bucle de eventos compartido
+        return async_runner.run(self._publish(content, title, hashtags, project, images))
+
+    async def publish_async(self, content, title=None, hashtags=None, project=None, images=None):
+        """
+        Publica contenido en Telegram sin bloquear el bucle de eventos que
+        llama. El envío se hace siempre en el bucle compartido, al que está
+        ligado el bot.
+
+        Args:
+            content (str): Contenido a publicar
+            project (str): Nombre del proyecto
+            title (str, optional): Título del contenido
+            hashtags (list, optional): Lista de hashtags
+            images (list, optional): Lista de rutas a imágenes
+
+        Returns:
+            dict: Resultado de la publicación
+        """
+        return await async_runner.run_async(self._publish(content, title, hashtags, project, images))
+
+    async def _publish(self, content, title, hashtags, project, images):
+        """
+        Publica contenido en Telegram (ver publish).
+        """
+        # Cargar configuración del proyecto (lee el perfil de disco la primera vez)
+        config = await asyncio.to_thread(self.load_config, project)
 
         # Verificar si Telegram está habilitado
-        if os.getenv('TELEGRAM_ENABLED', 'false').lower() != 'true':
+        if not config.is_enabled('TELEGRAM'):
             return {'status': 'skipped', 'message': 'Telegram no está habilitado para este proyecto'}
 
         # Obtener credenciales
-        bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
-        chat_id = os.getenv('TELEGRAM_CHAT_ID')
+        bot_token = config.get('TELEGRAM_BOT_TOKEN')
+        chat_id = config.get('TELEGRAM_CHAT_ID')
 
         if not bot_token or not chat_id:
             return {'status': 'error', 'message': 'Faltan credenciales para Telegram'}
 
         try:
-            # Inicializo bot de Telegram
-            bot = telegram.Bot(token=bot_token)
+            # Reutilizo el bot del proyecto (y sus conexiones) mientras no cambie el token
+            bot = client_pool.get('Telegram', project, (bot_token,), lambda: self._create_bot(bot_token))
 
             # Verifico si el contenido supera el límite de caracteres (4096 para Telegram)
             if len(content) > 4096:
@@ -135,8 +235,19 @@ class Telegram(SocialNetwork):
                 if len(formatted_content) > 4096:
                     formatted_content = formatted_content[:4093] + "..."
 
-            # Ejecuto la función asíncrona en un contexto síncrono
-            response = asyncio.run(self._send_telegram_message(bot, chat_id, formatted_content, images))
+            # Respeto la cuota del bot y, si Telegram pide esperar, reintento una vez
+            account = account_key(bot_token)
+            for attempt in range(2):
+                await rate_limits.wait_async('Telegram', account)
+
+                try:
+                    with stage('network.post', NETWORK_REQUEST_DURATION, network='Telegram', operation='post'):
+                        response = await self._send_telegram_message(bot, chat_id, formatted_content, images)
+                    break
+                except telegram.error.RetryAfter as e:
+                    rate_limits.update('Telegram', account, retry_after=e.retry_after)
+                    if attempt:
+                        raise
 
             return {
                 'status': 'success',
@@ -147,5 +258,6 @@ class Telegram(SocialNetwork):
         except Exception as e:
             return {
                 'status': 'error',
-                'message': f'Error al publicar en Telegram: {str(e)}'
+                'message': f'Error al publicar en Telegram: {str(e)}',
+                'retryable': self.is_transient_error(e)
             }
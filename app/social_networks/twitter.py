@@ -3,22 +3,36 @@
 
 """
 Implementación de la clase para publicar en Twitter.
+
+tweepy no tiene versión asíncrona de la subida de imágenes (api v1.1), así
+que desde el servidor ASGI se publica en un hilo (ver
+SocialNetwork.publish_async).
 """
 
-import os
 import tweepy
+from functions import MemoryImage, image_hash, image_size
+from media_cache import media_cache, account_key
+from client_pool import client_pool
+from rate_limits import rate_limits
+from metrics import NETWORK_REQUEST_DURATION, NETWORK_MEDIA_BYTES
+from timings import stage
 from . import SocialNetwork
 
+# Segundos durante los que Twitter permite usar un media_id si la respuesta no
+# indica su caducidad, y margen que dejo antes de que caduque
+TWITTER_MEDIA_TTL = 24 * 3600
+TWITTER_MEDIA_TTL_MARGIN = 600
+
 class Twitter(SocialNetwork):
     """
     Clase para publicar contenido en Twitter.
     """
 
-    def __init__(self):
+    def __init__(self, profile=None):
         """
         Inicializo la conexión con Twitter.
         """
-        super().__init__()
+        super().__init__(profile)
 
     def publish(self, content, title=None, hashtags=None, project=None, images=None):
         """
@@ -35,17 +49,17 @@ class Twitter(SocialNetwork):
             dict: Resultado de la publicación
         """
         # Cargar configuración del proyecto
-        self.load_config(project)
+        config = self.load_config(project)
 
         # Verificar si Twitter está habilitado
-        if os.getenv('TWITTER_ENABLED', 'false').lower() != 'true':
+        if not config.is_enabled('TWITTER'):
             return {'status': 'skipped', 'message': 'Twitter no está habilitado para este proyecto'}
 
         # Obtengo credenciales
-        api_key = os.getenv('TWITTER_API_KEY')
-        api_secret = os.getenv('TWITTER_API_SECRET')
-        access_token = os.getenv('TWITTER_ACCESS_TOKEN')
-        access_token_secret = os.getenv('TWITTER_ACCESS_TOKEN_SECRET')
+        api_key = config.get('TWITTER_API_KEY')
+        api_secret = config.get('TWITTER_API_SECRET')
+        access_token = config.get('TWITTER_ACCESS_TOKEN')
+        access_token_secret = config.get('TWITTER_ACCESS_TOKEN_SECRET')
 
         if not api_key or not api_secret or not access_token or not access_token_secret:
             return {'status': 'error', 'message': 'Faltan credenciales para Twitter'}
@@ -63,37 +77,27 @@ class Twitter(SocialNetwork):
                 if len(formatted_content) > 280:
                     formatted_content = formatted_content[:277] + "..."
 
-            # Uso la API v1.1 solo para subir imágenes (disponible en el nivel gratuito)
-            auth = tweepy.OAuth1UserHandler(
-                api_key, api_secret, access_token, access_token_secret
-            )
-            api_v1 = tweepy.API(auth)
-
-            # Subo imágenes si existen
-            media_ids = []
-            if images and len(images) > 0:
-                for img_path in images:
-                    media = api_v1.media_upload(img_path)
-                    media_ids.append(media.media_id)
+            # Reutilizo los clientes del proyecto mientras no cambien sus credenciales
+            credentials = (api_key, api_secret, access_token, access_token_secret)
+            api_v1, client = client_pool.get('Twitter', project, credentials, lambda: self._create_clients(*credentials))
 
-            # Uso la API v2 para publicar el tweet
-            client = tweepy.Client(
-                consumer_key=api_key,
-                consumer_secret=api_secret,
-                access_token=access_token,
-                access_token_secret=access_token_secret
-            )
+            # Subo imágenes si existen (reutilizo las ya subidas por esta cuenta)
+            account = account_key(api_key, access_token)
+            media_ids, cached = self._upload_images(api_v1, account, images)
 
             # Publico tweet
-            if media_ids:
-                response = client.create_tweet(
-                    text=formatted_content,
-                    media_ids=media_ids
-                )
-            else:
-                response = client.create_tweet(
-                    text=formatted_content
-                )
+            try:
+                response = self._create_tweet(client, account, formatted_content, media_ids)
+            except tweepy.BadRequest:
+                if not cached:
+                    raise
+
+                # Twitter rechazó algún media_id reutilizado, subo las imágenes de nuevo
+                for img_path in images:
+                    media_cache.invalidate('Twitter', account, image_hash(img_path))
+
+                media_ids, _ = self._upload_images(api_v1, account, images, use_cache=False)
+                response = self._create_tweet(client, account, formatted_content, media_ids)
 
             # Extraigo el ID del tweet de la respuesta de la API v2
             tweet_id = response.data['id']
@@ -108,5 +112,122 @@ class Twitter(SocialNetwork):
         except Exception as e:
             return {
                 'status': 'error',
-                'message': f'Error al publicar en Twitter: {str(e)}'
+                'message': f'Error al publicar en Twitter: {str(e)}',
+                'retryable': self.is_transient_error(e)
             }
+
+    def _create_clients(self, api_key, api_secret, access_token, access_token_secret):
+        """
+        Creo los clientes de Twitter de una cuenta.
+
+        Args:
+            api_key (str): Clave de la API
+            api_secret (str): Secreto de la API
+            access_token (str): Token de acceso
+            access_token_secret (str): Secreto del token de acceso
+
+        Returns:
+            tuple: Cliente de la API v1.1 y cliente de la API v2
+        """
+        # Uso la API v1.1 solo para subir imágenes (disponible en el nivel gratuito)
+        auth = tweepy.OAuth1UserHandler(
+            api_key, api_secret, access_token, access_token_secret
+        )
+        api_v1 = tweepy.API(auth)
+
+        # Uso la API v2 para publicar el tweet
+        client = tweepy.Client(
+            consumer_key=api_key,
+            consumer_secret=api_secret,
+            access_token=access_token,
+            access_token_secret=access_token_secret
+        )
+
+        return api_v1, client
+
+    def _upload_images(self, api_v1, account, images, use_cache=True):
+        """
+        Subo las imágenes a Twitter, reutilizando el media_id de las que esta
+        cuenta ya subió y aún no han caducado.
+
+        Args:
+            api_v1 (tweepy.API): Cliente de la API v1.1
+            account (str): Huella de la cuenta (ver account_key)
+            images (list): Lista de imágenes, rutas o MemoryImage
+            use_cache (bool): Reutilizo los media_id ya subidos
+
+        Returns:
+            tuple: Lista de media_id y si alguno se tomó de la caché
+        """
+        media_ids = []
+        cached = False
+
+        for img_path in images or []:
+            content_hash = image_hash(img_path)
+
+            media_id = media_cache.get('Twitter', account, content_hash) if use_cache else None
+            if media_id:
+                media_ids.append(media_id)
+                cached = True
+                continue
+
+            if isinstance(img_path, MemoryImage):
+                # Subo la imagen directamente desde memoria
+                media = self._call(f"{account}/media", 'media', lambda: api_v1.media_upload(img_path.name, file=img_path.open()))
+            else:
+                media = self._call(f"{account}/media", 'media', lambda: api_v1.media_upload(img_path))
+            NETWORK_MEDIA_BYTES.inc(image_size(img_path), network='Twitter')
+
+            ttl = getattr(media, 'expires_after_secs', TWITTER_MEDIA_TTL) - TWITTER_MEDIA_TTL_MARGIN
+            media_cache.put('Twitter', account, content_hash, media.media_id, ttl)
+            media_ids.append(media.media_id)
+
+        return media_ids, cached
+
+    def _create_tweet(self, client, account, formatted_content, media_ids):
+        """
+        Publico un tweet con la API v2.
+
+        Args:
+            client (tweepy.Client): Cliente de la API v2
+            account (str): Huella de la cuenta (ver account_key)
+            formatted_content (str): Contenido formateado del tweet
+            media_ids (list): Lista de media_id de las imágenes
+
+        Returns:
+            tweepy.Response: Respuesta de Twitter
+        """
+        if media_ids:
+            return self._call(f"{account}/tweets", 'post', lambda: client.create_tweet(
+                text=formatted_content,
+                media_ids=media_ids
+            ))
+
+        return self._call(f"{account}/tweets", 'post', lambda: client.create_tweet(
+            text=formatted_content
+        ))
+
+    def _call(self, account, operation, request):
+        """
+        Hago una llamada a Twitter respetando la cuota del endpoint. Si
+        Twitter responde 429 actualizo la cuota con sus cabeceras, espero a
+        que se reinicie y reintento una sola vez.
+
+        Args:
+            account (str): Huella de la cuenta y endpoint
+            operation (str): Operación para las métricas (media o post)
+            request (callable): Llamada a la API
+
+        Returns:
+            object: Respuesta de Twitter
+        """
+        for attempt in range(2):
+            rate_limits.wait('Twitter', account)
+
+            try:
+                with stage(f'network.{operation}', NETWORK_REQUEST_DURATION, network='Twitter', operation=operation):
+                    return request()
+            except tweepy.TooManyRequests as e:
+                rate_limits.update_from_headers('Twitter', account, e.response.headers, 'x-rate-limit-')
+                if attempt:
+                    raise
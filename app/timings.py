@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Desglose de tiempos por fase de una publicación.
+
+Cada publicación que pide sus tiempos crea un colector en una ContextVar, y
+las fases (carga del perfil, descarga y optimización de cada imagen, sesión,
+subida de imágenes y publicación en cada red social) se apuntan en el
+colector del contexto en el que se ejecutan. Los hilos de los pools no
+heredan el contexto, así que las tareas se lanzan con copy_context (ver
+run_in_context).
+
+Las mismas mediciones alimentan los histogramas de metrics, de modo que
+medir una fase cuesta lo mismo se pidan o no sus tiempos.
+"""
+
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Colector de la publicación en curso (None si no se piden los tiempos)
+_collector = contextvars.ContextVar('timings_collector', default=None)
+
+# Etiquetas que se añaden a las fases del contexto (ej: número de imagen)
+_labels = contextvars.ContextVar('timings_labels', default={})
+
+class Timings:
+    """
+    Fases medidas de una publicación.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = []
+        self._lock = threading.Lock()
+
+    def add(self, entry):
+        with self._lock:
+            self.stages.append(entry)
+
+    def summary(self):
+        """
+        Obtengo el desglose para la respuesta de la api.
+
+        Returns:
+            dict: Segundos totales y lista de fases en el orden en que terminaron
+        """
+        with self._lock:
+            stages = list(self.stages)
+
+        return {
+            'total': round(time.perf_counter() - self.started, 6),
+            'stages': stages
+        }
+
+@contextmanager
+def collect(enabled=True):
+    """
+    Recojo los tiempos de las fases que se ejecuten dentro del bloque.
+
+    Args:
+        enabled (bool): Si es False no se recoge nada
+
+    Yields:
+        Timings: Colector de tiempos o None si no está activado
+    """
+    if not enabled:
+        yield None
+        return
+
+    collector = Timings()
+    token = _collector.set(collector)
+    try:
+        yield collector
+    finally:
+        _collector.reset(token)
+
+@contextmanager
+def labels(**values):
+    """
+    Añado etiquetas a las fases que se midan dentro del bloque.
+    """
+    token = _labels.set({**_labels.get(), **values})
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+def record(name, seconds, histogram=None, **labels):
+    """
+    Apunto la duración de una fase en el colector del contexto y en su
+    histograma de métricas.
+
+    Args:
+        name (str): Nombre de la fase (ej: image.download)
+        seconds (float): Duración en segundos
+        histogram (metrics.Histogram, optional): Histograma donde registrarla
+        **labels: Etiquetas de la fase y del histograma
+    """
+    if histogram is not None:
+        histogram.observe(seconds, **labels)
+
+    collector = _collector.get()
+    if collector is not None:
+        collector.add({**_labels.get(), **labels, 'stage': name, 'seconds': round(seconds, 6)})
+
+@contextmanager
+def stage(name, histogram=None, **labels):
+    """
+    Mido la duración del bloque como una fase (ver record).
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started, histogram, **labels)
+
+def run_in_context(function):
+    """
+    Preparo una función para ejecutarla en otro hilo con el contexto actual,
+    así sus fases se apuntan en el colector de la publicación.
+
+    Args:
+        function (callable): Función a ejecutar
+
+    Returns:
+        callable: Función que se ejecuta en una copia del contexto actual
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(function, *args, **kwargs)
+
+    return run
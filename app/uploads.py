@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Recepción de posts en multipart/form-data.
+
+Además de en JSON, /publish acepta los posts como formulario multipart con
+las imágenes como archivos binarios. Cada archivo se escribe a medida que
+llega en un búfer que pasa a disco al superar UPLOAD_SPOOL_BYTES, sin
+codificarlo en base64 ni cargar la petición entera en memoria, y se corta en
+cuanto supera IMAGE_MAX_BYTES. El tamaño total de cualquier petición está
+limitado por MAX_CONTENT_LENGTH.
+"""
+
+import io
+import os
+import uuid
+from tempfile import SpooledTemporaryFile
+from flask import Request
+from werkzeug.exceptions import RequestEntityTooLarge
+from functions import IMAGE_MAX_BYTES, UPLOADS_DIR, UPLOADS_FIELD
+from metrics import UPLOAD_FILES, UPLOAD_BYTES
+
+# Tamaño máximo en bytes de una petición (100 MB)
+MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', str(100 * 1024 * 1024)))
+
+# Bytes de cada archivo subido que mantengo en memoria antes de pasarlo a disco
+UPLOAD_SPOOL_BYTES = int(os.getenv('UPLOAD_SPOOL_BYTES', str(1024 * 1024)))
+
+# Campos de texto del formulario que paso tal cual al post
+FORM_FIELDS = ('content', 'project', 'title', 'idempotency_key')
+
+# Campos del formulario que son opciones verdadero/falso
+FORM_FLAGS = ('async', 'timings')
+
+class LimitedSpooledFile(SpooledTemporaryFile):
+    """
+    Búfer de un archivo subido que falla en cuanto supera el tamaño máximo.
+    """
+
+    def __init__(self, limit, **kwargs):
+        super().__init__(**kwargs)
+        self.limit = limit
+        self.written = 0
+
+    def write(self, data):
+        self.written += len(data)
+        if self.written > self.limit:
+            raise RequestEntityTooLarge(f'La imagen supera el tamaño máximo de {self.limit} bytes')
+
+        return super().write(data)
+
+class UploadRequest(Request):
+    """
+    Petición de Flask que guarda los archivos subidos en búferes limitados.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if content_length and content_length > IMAGE_MAX_BYTES:
+            raise RequestEntityTooLarge(f'La imagen supera el tamaño máximo de {IMAGE_MAX_BYTES} bytes')
+
+        return LimitedSpooledFile(IMAGE_MAX_BYTES, max_size=UPLOAD_SPOOL_BYTES, mode='w+b')
+
+def upload_request(body, content_type):
+    """
+    Creo una petición con los búferes limitados de UploadRequest a partir del
+    cuerpo ya leído (el servidor ASGI lo lee entero, limitado por
+    MAX_CONTENT_LENGTH), para leer el formulario con form_post.
+
+    Args:
+        body (bytes): Cuerpo de la petición
+        content_type (str): Cabecera Content-Type
+
+    Returns:
+        UploadRequest: Petición con el formulario
+    """
+    return UploadRequest({
+        'REQUEST_METHOD': 'POST',
+        'CONTENT_TYPE': content_type,
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body)
+    })
+
+def is_multipart(request):
+    """
+    Compruebo si una petición llega como multipart/form-data.
+
+    Args:
+        request (flask.Request): Petición recibida
+
+    Returns:
+        bool: True si es un formulario multipart
+    """
+    return request.mimetype == 'multipart/form-data'
+
+def form_post(request):
+    """
+    Obtengo los datos de un post enviado como formulario multipart. Acepta
+    los mismos campos que el JSON de /publish; hashtags e images se repiten
+    una vez por valor, y los archivos del campo images se añaden después de
+    las imágenes enviadas como texto (URLs o base64).
+
+    Args:
+        request (flask.Request): Petición recibida
+
+    Returns:
+        dict: Datos del post, con los archivos subidos en images
+    """
+    form = request.form
+
+    data = {field: form[field] for field in FORM_FIELDS if form.get(field)}
+
+    if form.getlist('hashtags'):
+        data['hashtags'] = form.getlist('hashtags')
+
+    for flag in FORM_FLAGS:
+        if flag in form:
+            data[flag] = form[flag].lower() not in ('false', '0', 'no')
+
+    files = [file for file in request.files.getlist('images') if file.filename]
+    for file in files:
+        UPLOAD_FILES.inc()
+        UPLOAD_BYTES.inc(file.stream.written)
+
+    images = form.getlist('images') + files
+    if images:
+        data['images'] = images
+
+    return data
+
+def save_uploads(data):
+    """
+    Guardo en data/uploads los archivos subidos de un post para que lo
+    publique un worker del modo asíncrono, cambiándolos en images por su
+    referencia (upload:<id>). Las referencias se anotan también en el campo
+    privado UPLOADS_FIELD, que es lo que permite publicarlas, y los archivos
+    se borran al terminar de publicar el post (ver cleanup_uploads).
+
+    Args:
+        data (dict): Datos del post (ver form_post)
+    """
+    images = data.get('images')
+    if not images:
+        return
+
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+
+    for index, image in enumerate(images):
+        if isinstance(image, str):
+            continue
+
+        upload_id = uuid.uuid4().hex
+        image.save(os.path.join(UPLOADS_DIR, upload_id))
+        images[index] = f'upload:{upload_id}'
+        data.setdefault(UPLOADS_FIELD, []).append(images[index])
+
+def client_post(data):
+    """
+    Quito de un post recibido de un cliente el campo privado con sus
+    imágenes subidas (UPLOADS_FIELD), que solo puede poner el servicio. Sin
+    él, validate_post rechaza las referencias upload:<id> del post, así un
+    cliente no puede publicar ni borrar imágenes subidas en otros posts.
+
+    Args:
+        data (dict): Datos del post recibidos en la petición
+
+    Returns:
+        dict: Los mismos datos sin el campo privado
+    """
+    if isinstance(data, dict):
+        data.pop(UPLOADS_FIELD, None)
+
+    return data
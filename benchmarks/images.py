@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Micro-benchmark del procesamiento de imágenes (process_image) sobre un
+corpus generado: iconos, fotos JPEG de 12 y 40 MP, PNG con transparencia y
+GIF con paleta, recibidos en base64 o por URL desde un servidor local.
+
+Cada caso se procesa para los perfiles de codificación de las redes
+indicadas y se mide el tiempo de cada fase (base64 o descarga, decode y
+encode, las mismas fases que /publish devuelve con timings), la memoria
+máxima (RSS) y el peso, las dimensiones y la calidad (PSNR frente a la
+original al mismo tamaño) de cada resultado. La caché de imágenes se
+desactiva y las imágenes se optimizan en este proceso, para medir siempre el
+trabajo completo y su memoria:
+
+    python benchmarks/images.py --repeat 5 --output despues.json --baseline antes.json
+"""
+
+import os
+import io
+import gc
+import sys
+import json
+import math
+import time
+import base64
+import ctypes
+import random
+import argparse
+import platform
+import tempfile
+import threading
+import statistics
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'app')
+
+# Sin caché y sin pool de procesos: cada repetición hace todo el trabajo aquí
+os.environ.setdefault('IMAGE_CACHE_MEMORY_BYTES', '0')
+os.environ.setdefault('IMAGE_CACHE_DISK_BYTES', '0')
+os.environ.setdefault('IMAGE_PROCESS_WORKERS', '0')
+
+sys.path.insert(0, os.path.abspath(APP_DIR))
+
+from PIL import Image, ImageChops, ImageDraw, ImageStat
+from functions import process_image, decode_base64_image
+from image_profiles import get_encoding_profile
+from timings import collect
+
+# Casos del corpus: nombre -> (ancho, alto, formato, modo, con EXIF)
+CASES = {
+    'icon': (64, 64, 'PNG', 'RGBA', False),
+    'jpeg_small': (1200, 900, 'JPEG', 'RGB', False),
+    'jpeg_12mp': (4000, 3000, 'JPEG', 'RGB', True),
+    'jpeg_40mp': (7744, 5163, 'JPEG', 'RGB', True),
+    'png_rgba': (1920, 1080, 'PNG', 'RGBA', False),
+    'gif_palette': (800, 600, 'GIF', 'P', False)
+}
+
+SOURCES = ('base64', 'url')
+
+NETWORKS = ('Bluesky', 'Twitter', 'Telegram', 'Mastodon')
+
+def generate_image(width, height, img_format, mode, exif):
+    """
+    Genero una imagen de prueba con degradados, formas y ruido, para que se
+    comprima como una foto y no como un color plano.
+
+    Args:
+        width (int): Ancho en píxeles
+        height (int): Alto en píxeles
+        img_format (str): Formato de Pillow
+        mode (str): Modo de la imagen (RGB, RGBA o P)
+        exif (bool): Si es True añado metadatos EXIF como los de una cámara
+
+    Returns:
+        bytes: Imagen codificada
+    """
+    gradient = Image.linear_gradient('L').resize((width, height))
+    noise = Image.effect_noise((width, height), 32)
+    img = Image.merge('RGB', (
+        gradient,
+        Image.blend(gradient.transpose(Image.Transpose.ROTATE_180), noise, 0.5),
+        gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+    ))
+
+    draw = ImageDraw.Draw(img)
+    for _ in range(40):
+        x, y = random.randrange(width), random.randrange(height)
+        size = random.randrange(max(1, width // 20), max(2, width // 5))
+        draw.ellipse((x, y, x + size, y + size), fill=tuple(random.randrange(256) for _ in range(3)))
+
+    if mode == 'RGBA':
+        img.putalpha(gradient.transpose(Image.Transpose.ROTATE_90).resize((width, height)))
+    elif mode == 'P':
+        img = img.quantize(colors=128)
+
+    options = {}
+    if img_format == 'JPEG':
+        options['quality'] = 92
+    if exif:
+        metadata = Image.Exif()
+        metadata[0x010F] = 'Benchmark'  # Make
+        metadata[0x0110] = 'Synthetic 1'  # Model
+        metadata[0x0112] = 1  # Orientation
+        options['exif'] = metadata.tobytes()
+
+    output = io.BytesIO()
+    img.save(output, format=img_format, **options)
+    return output.getvalue()
+
+def load_corpus(corpus_dir, names):
+    """
+    Cargo el corpus de imágenes, generando las que falten. Con el mismo
+    directorio dos ejecuciones usan exactamente las mismas imágenes.
+
+    Args:
+        corpus_dir (str): Directorio del corpus
+        names (list): Casos a cargar
+
+    Returns:
+        dict: Contenido de cada imagen por caso
+    """
+    os.makedirs(corpus_dir, exist_ok=True)
+    corpus = {}
+
+    for name in names:
+        path = os.path.join(corpus_dir, f'{name}.{CASES[name][2].lower()}')
+
+        if not os.path.exists(path):
+            print(f'Generando {path}...', file=sys.stderr)
+            with open(path, 'wb') as f:
+                f.write(generate_image(*CASES[name]))
+
+        with open(path, 'rb') as f:
+            corpus[name] = f.read()
+
+    return corpus
+
+class CorpusServer(ThreadingHTTPServer):
+    """
+    Servidor local que sirve las imágenes del corpus por URL.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, corpus):
+        super().__init__(('127.0.0.1', 0), CorpusHandler)
+        self.corpus = corpus
+
+    def url(self, name):
+        return f'http://127.0.0.1:{self.server_address[1]}/{name}'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='corpus', daemon=True).start()
+        return self
+
+class CorpusHandler(BaseHTTPRequestHandler):
+    """
+    Sirve cada imagen sin ETag ni Last-Modified, así cada descarga es
+    completa.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        name = self.path.split('?')[0].lstrip('/')
+        img_data = self.server.corpus.get(name)
+
+        if img_data is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', f'image/{CASES[name][2].lower()}')
+        self.send_header('Content-Length', str(len(img_data)))
+        self.end_headers()
+        self.wfile.write(img_data)
+
+try:
+    _libc = ctypes.CDLL('libc.so.6')
+except OSError:
+    _libc = None
+
+def release_memory():
+    """
+    Libero la memoria que ya no se usa y devuelvo al sistema la que glibc
+    retiene de casos anteriores, para que no esconda la del siguiente.
+    """
+    gc.collect()
+
+    if _libc is not None and hasattr(_libc, 'malloc_trim'):
+        _libc.malloc_trim(0)
+
+def read_status(field):
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(f'{field}:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    return 0
+
+class PeakRss:
+    """
+    Memoria residente máxima del proceso durante un bloque. En Linux
+    reinicio el máximo del kernel (VmHWM) al empezar y, por si no se puede,
+    además muestreo la memoria cada pocos milisegundos.
+    """
+
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.start = 0
+        self.peak = 0
+        self._hwm = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='rss', daemon=True)
+
+    def __enter__(self):
+        release_memory()
+        self.start = self.peak = read_status('VmRSS')
+
+        try:
+            with open('/proc/self/clear_refs', 'w') as f:
+                f.write('5')
+            self._hwm = True
+        except OSError:
+            pass
+
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+        if self._hwm:
+            self.peak = max(self.peak, read_status('VmHWM'))
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, read_status('VmRSS'))
+
+    @property
+    def delta(self):
+        return max(0, self.peak - self.start)
+
+def psnr(original, output):
+    """
+    Calculo la calidad de un resultado como PSNR frente a la imagen original
+    redimensionada al mismo tamaño (más es mejor, por encima de 40 dB las
+    diferencias apenas se ven).
+
+    Args:
+        original (PIL.Image.Image): Imagen original en RGB
+        output (bytes): Imagen resultante
+
+    Returns:
+        float: PSNR en dB (None si son idénticas)
+    """
+    with Image.open(io.BytesIO(output)) as img:
+        img = flatten(img)
+
+    reference = original if original.size == img.size else original.resize(img.size, Image.LANCZOS)
+    rms = ImageStat.Stat(ImageChops.difference(reference, img)).rms
+    mse = sum(value ** 2 for value in rms) / len(rms)
+
+    if not mse:
+        return None
+
+    return round(20 * math.log10(255 / math.sqrt(mse)), 2)
+
+def flatten(img):
+    """
+    Convierto una imagen a RGB, con la transparencia sobre fondo blanco como
+    hace optimize_image.
+    """
+    if img.mode == 'P' and 'transparency' in img.info:
+        img = img.convert('RGBA')
+
+    if img.mode in ('RGBA', 'LA'):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        return background
+
+    return img.convert('RGB')
+
+def source_for(name, source, img_data, server, iteration):
+    if source == 'url':
+        # Cada repetición con una URL distinta, como si fuera otra imagen
+        return f'{server.url(name)}?i={iteration}'
+
+    return f'data:image/{CASES[name][2].lower()};base64,' + base64.b64encode(img_data).decode()
+
+def run_case(name, source, img_data, server, networks, repeat, warmup):
+    """
+    Proceso un caso varias veces midiendo sus fases y su memoria.
+
+    Args:
+        name (str): Caso del corpus
+        source (str): base64 o url
+        img_data (bytes): Contenido de la imagen
+        server (CorpusServer): Servidor de las URLs
+        networks (list): Redes para cuyos perfiles se prepara la imagen
+        repeat (int): Repeticiones medidas
+        warmup (int): Repeticiones previas que no se miden
+
+    Returns:
+        dict: Resultado del caso
+    """
+    profiles = {network: get_encoding_profile(network) for network in networks}
+    variants = list(dict.fromkeys(profiles.values()))
+
+    stages = {}
+    peaks = []
+    outputs = None
+
+    for iteration in range(warmup + repeat):
+        img = source_for(name, source, img_data, server, iteration)
+
+        # La decodificación de base64 no es una fase del servicio, la mido aparte
+        if source == 'base64':
+            started = time.perf_counter()
+            decode_base64_image(img)
+            base64_seconds = time.perf_counter() - started
+
+        with PeakRss() as rss, collect() as timings:
+            started = time.perf_counter()
+            outputs = process_image(img, variants)
+            total = time.perf_counter() - started
+
+        if outputs is None:
+            return {'case': name, 'source': source, 'error': 'process_image no pudo procesar la imagen'}
+
+        if iteration < warmup:
+            continue
+
+        measured = {'total': total}
+        if source == 'base64':
+            measured['base64'] = base64_seconds
+        for entry in timings.summary()['stages']:
+            stage_name = entry['stage'].split('.', 1)[-1]
+            measured[stage_name] = measured.get(stage_name, 0) + entry['seconds']
+
+        for stage_name, seconds in measured.items():
+            stages.setdefault(stage_name, []).append(seconds)
+        peaks.append(rss.delta)
+
+    # Calidad de cada resultado frente a la original decodificada a tamaño completo
+    with Image.open(io.BytesIO(img_data)) as original:
+        original = flatten(original)
+
+    results = {}
+    for network, profile in profiles.items():
+        output, img_format = outputs[profile]
+        with Image.open(io.BytesIO(output)) as img:
+            size = img.size
+
+        results[network] = {
+            'format': img_format,
+            'width': size[0],
+            'height': size[1],
+            'bytes': len(output),
+            'passthrough': output == img_data,
+            'psnr': psnr(original, output)
+        }
+
+    return {
+        'case': name,
+        'source': source,
+        'input': {'format': CASES[name][2].lower(), 'width': CASES[name][0], 'height': CASES[name][1], 'bytes': len(img_data)},
+        'stages': {
+            stage_name: {
+                'median': round(statistics.median(values), 6),
+                'min': round(min(values), 6),
+                'max': round(max(values), 6)
+            }
+            for stage_name, values in stages.items()
+        },
+        'peak_rss_mb': round(max(peaks) / 1024 / 1024, 1),
+        'outputs': results
+    }
+
+def compare(results, baseline):
+    """
+    Comparo los resultados con los de otra ejecución.
+
+    Args:
+        results (list): Resultados de los casos
+        baseline (dict): Salida JSON de la otra ejecución
+
+    Returns:
+        list: Diferencias por caso en porcentaje
+    """
+    previous = {(entry['case'], entry['source']): entry for entry in baseline.get('results', []) if 'error' not in entry}
+    comparison = []
+
+    def change(new, old):
+        return round((new - old) / old * 100, 1) if old else None
+
+    for entry in results:
+        old = previous.get((entry['case'], entry['source']))
+        if not old or 'error' in entry:
+            continue
+
+        comparison.append({
+            'case': entry['case'],
+            'source': entry['source'],
+            'total_pct': change(entry['stages']['total']['median'], old['stages']['total']['median']),
+            'peak_rss_pct': change(entry['peak_rss_mb'], old['peak_rss_mb']),
+            'bytes_pct': change(
+                sum(output['bytes'] for output in entry['outputs'].values()),
+                sum(output['bytes'] for output in old['outputs'].values())
+            )
+        })
+
+    return comparison
+
+def format_pct(value):
+    # Sin valor base no hay porcentaje (por ejemplo, memoria no disponible)
+    return 'n/a' if value is None else f'{value:+}'
+
+def print_table(results, comparison):
+    print(f"{'caso':<12} {'origen':<7} {'total ms':>9} {'decode ms':>10} {'encode ms':>10} {'RSS MB':>7}  resultados (KB, PSNR dB)", file=sys.stderr)
+
+    for entry in results:
+        if 'error' in entry:
+            print(f"{entry['case']:<12} {entry['source']:<7} {entry['error']}", file=sys.stderr)
+            continue
+
+        stages = entry['stages']
+        def ms(stage_name):
+            return f"{stages[stage_name]['median'] * 1000:.1f}" if stage_name in stages else '-'
+
+        outputs = ', '.join(
+            f"{network} {output['bytes'] / 1024:.0f}" + (' =' if output['passthrough'] else f" {output['psnr'] or '∞'}")
+            for network, output in entry['outputs'].items()
+        )
+        print(f"{entry['case']:<12} {entry['source']:<7} {ms('total'):>9} {ms('decode'):>10} {ms('encode'):>10} {entry['peak_rss_mb']:>7.1f}  {outputs}", file=sys.stderr)
+
+    if comparison:
+        print('\nCambio respecto a la ejecución base (%):', file=sys.stderr)
+        for entry in comparison:
+            print(f"{entry['case']:<12} {entry['source']:<7} total {format_pct(entry['total_pct'])}  RSS {format_pct(entry['peak_rss_pct'])}  bytes {format_pct(entry['bytes_pct'])}", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark del procesamiento de imágenes')
+    parser.add_argument('--case', default=','.join(CASES), help=f"Casos separados por comas ({', '.join(CASES)})")
+    parser.add_argument('--source', default=','.join(SOURCES), help='Orígenes separados por comas (base64, url)')
+    parser.add_argument('--networks', default=','.join(NETWORKS), help='Redes para cuyos perfiles se preparan las imágenes')
+    parser.add_argument('--repeat', type=int, default=5, help='Repeticiones medidas de cada caso')
+    parser.add_argument('--warmup', type=int, default=1, help='Repeticiones previas que no se miden')
+    parser.add_argument('--corpus-dir', help='Directorio del corpus, se reutiliza entre ejecuciones (por defecto uno temporal)')
+    parser.add_argument('--output', help='Archivo JSON de resultados (por defecto la salida estándar)')
+    parser.add_argument('--baseline', help='Archivo JSON de otra ejecución con el que comparar')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    names = args.case.split(',')
+    sources = args.source.split(',')
+    for name in names:
+        if name not in CASES:
+            parser.error(f'Caso desconocido: {name}')
+    for source in sources:
+        if source not in SOURCES:
+            parser.error(f'Origen desconocido: {source}')
+
+    random.seed(args.seed)
+    corpus = load_corpus(args.corpus_dir or tempfile.mkdtemp(prefix='social-publisher-corpus-'), names)
+    server = CorpusServer(corpus).start()
+
+    results = []
+    try:
+        for name in names:
+            for source in sources:
+                print(f'Caso {name} por {source}...', file=sys.stderr)
+                results.append(run_case(name, source, corpus[name], server, args.networks.split(','), args.repeat, args.warmup))
+    finally:
+        server.shutdown()
+
+    comparison = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            comparison = compare(results, json.load(f))
+
+    output = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'pillow': Image.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'networks': args.networks.split(','),
+            'repeat': args.repeat
+        },
+        'results': results,
+        'comparison': comparison
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+    else:
+        json.dump(output, sys.stdout, indent=2)
+        print()
+
+    print_table(results, comparison)
+
+if __name__ == '__main__':
+    main()
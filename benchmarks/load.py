@@ -0,0 +1,577 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Prueba de carga de extremo a extremo de /publish contra los servidores de
+prueba de las cuatro redes sociales (ver stubs.py).
+
+Arranco los servidores de prueba y el servicio (ver serve.py) en un
+directorio de trabajo temporal con un perfil que habilita las cuatro redes,
+y para cada combinación de mezcla de imágenes y concurrencia envío un número
+fijo de posts midiendo el rendimiento (posts por segundo), la latencia
+(p50, p90 y p99), los errores y la memoria (RSS) del servicio y de sus
+procesos hijos. El resultado se guarda en JSON para compararlo con el de
+otra ejecución:
+
+    python benchmarks/load.py --concurrency 1,8,32 --mix none,small,mixed --output after.json --baseline before.json
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import base64
+import random
+import shutil
+import signal
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from PIL import Image, ImageDraw
+
+from stubs import NETWORKS, StubServer, build_configs, add_stub_arguments
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Proyecto del perfil con el que publico
+PROJECT = 'benchmark'
+
+# Imágenes de prueba: nombre -> (ancho, alto, formato)
+IMAGES = {
+    'small': (1024, 768, 'JPEG'),
+    'large': (4000, 3000, 'JPEG'),
+    'png': (1600, 1200, 'PNG')
+}
+
+# Mezclas de imágenes: en cada post se elige una de las listas al azar
+MIXES = {
+    'none': [[]],
+    'small': [['small']],
+    'large': [['large']],
+    'mixed': [[], ['small'], ['small', 'small'], ['large'], ['png', 'small']]
+}
+
+# Segundos máximos de espera a que arranque el servicio
+STARTUP_TIMEOUT = 60
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def generate_image(width, height, img_format):
+    """
+    Genero una imagen de prueba con degradados y ruido, para que se
+    comprima como una foto y no como un color plano.
+
+    Args:
+        width (int): Ancho en píxeles
+        height (int): Alto en píxeles
+        img_format (str): Formato de Pillow (JPEG o PNG)
+
+    Returns:
+        bytes: Imagen codificada
+    """
+    gradient = Image.linear_gradient('L').resize((width, height))
+    noise = Image.effect_noise((width, height), 40)
+    img = Image.merge('RGB', (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+
+    draw = ImageDraw.Draw(img)
+    for _ in range(20):
+        x, y = random.randrange(width), random.randrange(height)
+        draw.ellipse((x, y, x + width // 8, y + height // 8), fill=tuple(random.randrange(256) for _ in range(3)))
+
+    if img_format == 'PNG':
+        img.putalpha(Image.linear_gradient('L').resize((width, height)))
+
+    output = io.BytesIO()
+    img.save(output, format=img_format, quality=90)
+    return output.getvalue()
+
+def write_profile(data_dir, stub_url):
+    """
+    Creo el perfil del proyecto de prueba con las cuatro redes habilitadas.
+
+    Args:
+        data_dir (str): Directorio data del servicio
+        stub_url (str): URL base de los servidores de prueba
+    """
+    profiles_dir = os.path.join(data_dir, 'profiles')
+    os.makedirs(profiles_dir, exist_ok=True)
+
+    values = {
+        'MASTODON_ENABLED': 'true',
+        'MASTODON_API_BASE_URL': stub_url,
+        'MASTODON_ACCESS_TOKEN': 'benchmark',
+        'TWITTER_ENABLED': 'true',
+        'TWITTER_API_KEY': 'benchmark',
+        'TWITTER_API_SECRET': 'benchmark',
+        'TWITTER_ACCESS_TOKEN': 'benchmark',
+        'TWITTER_ACCESS_TOKEN_SECRET': 'benchmark',
+        'TELEGRAM_ENABLED': 'true',
+        'TELEGRAM_BOT_TOKEN': '123456:benchmark',
+        'TELEGRAM_CHAT_ID': '-100',
+        'BLUESKY_ENABLED': 'true',
+        'BLUESKY_IDENTIFIER': 'benchmark.bsky.social',
+        'BLUESKY_PASSWORD': 'benchmark'
+    }
+
+    with open(os.path.join(profiles_dir, f'{PROJECT}.env'), 'w') as f:
+        for key, value in values.items():
+            f.write(f'{key}={value}\n')
+
+class Service:
+    """
+    Servicio arrancado en un proceso aparte para la prueba.
+    """
+
+    def __init__(self, server, stub_url, env=None):
+        """
+        Inicializo el servicio en un directorio de trabajo temporal.
+
+        Args:
+            server (str): flask o asgi
+            stub_url (str): URL base de los servidores de prueba
+            env (dict, optional): Variables de entorno adicionales
+        """
+        self.server = server
+        self.port = free_port()
+        self.url = f'http://127.0.0.1:{self.port}'
+        self.workdir = tempfile.mkdtemp(prefix='social-publisher-bench-')
+        self.process = None
+
+        write_profile(os.path.join(self.workdir, 'data'), stub_url)
+
+        self.env = {
+            **os.environ,
+            'BLUESKY_API_URL': f'{stub_url}/xrpc',
+            'TELEGRAM_API_URL': f'{stub_url}/bot',
+            'BENCH_TWITTER_URL': stub_url,
+            **(env or {})
+        }
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.join(BENCH_DIR, 'serve.py'), '--port', str(self.port), '--server', self.server],
+            cwd=self.workdir, env=self.env, stdout=subprocess.DEVNULL,
+            start_new_session=True
+        )
+
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise Exception(f'El servicio terminó al arrancar con código {self.process.returncode}')
+
+            try:
+                requests.get(self.url, timeout=1)
+                return
+            except requests.ConnectionError:
+                time.sleep(0.2)
+
+        raise Exception(f'El servicio no arrancó en {STARTUP_TIMEOUT} segundos')
+
+    def stop(self):
+        # Termino el grupo de procesos entero para no dejar vivos los
+        # procesos hijos del pool de imágenes
+        if self.process:
+            os.killpg(self.process.pid, signal.SIGTERM)
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                os.killpg(self.process.pid, signal.SIGKILL)
+
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def rss(self):
+        """
+        Obtengo la memoria residente del servicio y de sus procesos hijos
+        (el pool de procesos de imágenes).
+
+        Returns:
+            int: Bytes de memoria residente, 0 si no se puede leer
+        """
+        return sum(process_rss(pid) for pid in process_tree(self.process.pid))
+
+def process_tree(pid):
+    pids = [pid]
+
+    try:
+        for task in os.listdir(f'/proc/{pid}/task'):
+            with open(f'/proc/{pid}/task/{task}/children') as f:
+                for child in f.read().split():
+                    pids.extend(process_tree(int(child)))
+    except OSError:
+        pass
+
+    return pids
+
+def process_rss(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    return 0
+
+class RssSampler:
+    """
+    Muestreo periódico de la memoria del servicio durante un escenario.
+    """
+
+    def __init__(self, service, interval=0.1):
+        self.service = service
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='rss', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            self.peak = max(self.peak, self.service.rss())
+            if self._stop.wait(self.interval):
+                break
+
+def percentile(values, fraction):
+    """
+    Obtengo un percentil por rango más cercano.
+
+    Args:
+        values (list): Valores ordenados
+        fraction (float): Percentil entre 0 y 1
+
+    Returns:
+        float: Valor del percentil o None si no hay valores
+    """
+    if not values:
+        return None
+
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+class LoadTest:
+    """
+    Escenarios de carga contra un servicio ya arrancado.
+    """
+
+    def __init__(self, service, stubs, images, upload='json', unique_images=True, timings=False):
+        """
+        Inicializo la prueba.
+
+        Args:
+            service (Service): Servicio arrancado
+            stubs (StubServer): Servidores de prueba
+            images (dict): Imágenes de prueba codificadas por nombre
+            upload (str): json (imágenes en base64) o multipart (archivos)
+            unique_images (bool): Si es True cada post lleva imágenes
+                                  distintas para que no se reutilicen las
+                                  cachés de imágenes y de subidas
+            timings (bool): Si es True pido y agrego los tiempos por fase
+        """
+        self.service = service
+        self.stubs = stubs
+        self.images = images
+        self.upload = upload
+        self.unique_images = unique_images
+        self.timings = timings
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _image(self, name):
+        img_data = self.images[name]
+
+        # Los bytes añadidos tras el final de la imagen cambian su hash sin
+        # cambiar cómo se decodifica
+        if self.unique_images:
+            img_data += uuid.uuid4().bytes
+
+        return img_data
+
+    def publish(self, mix):
+        """
+        Envío un post y mido lo que tarda.
+
+        Args:
+            mix (str): Mezcla de imágenes del post
+
+        Returns:
+            dict: Latencia, resultado y tiempos por fase del post
+        """
+        names = random.choice(MIXES[mix])
+        fields = {'project': PROJECT, 'content': f'Prueba de carga {uuid.uuid4().hex}', 'hashtags': ['benchmark'], 'async': False}
+        if self.timings:
+            fields['timings'] = True
+
+        started = time.perf_counter()
+        try:
+            if self.upload == 'multipart':
+                form = [(key, 'false' if value is False else 'true' if value is True else value) for key, value in fields.items() if key != 'hashtags']
+                form += [('hashtags', hashtag) for hashtag in fields['hashtags']]
+                files = [('images', (f'{name}.{IMAGES[name][2].lower()}', self._image(name))) for name in names]
+                response = self._session().post(f'{self.service.url}/publish', data=form, files=files or None, timeout=300)
+            else:
+                fields['images'] = [f"data:image/{IMAGES[name][2].lower()};base64,{base64.b64encode(self._image(name)).decode()}" for name in names]
+                response = self._session().post(f'{self.service.url}/publish', json=fields, timeout=300)
+
+            latency = time.perf_counter() - started
+            body = response.json()
+        except Exception as e:
+            return {'latency': time.perf_counter() - started, 'ok': False, 'error': str(e), 'failed': list(NETWORKS)}
+
+        results = body.get('results', [])
+        failed = [result.get('network') for result in results if not is_published(result)]
+
+        return {
+            'latency': latency,
+            'ok': response.status_code == 200 and bool(results) and not failed,
+            'error': None if results else body.get('error'),
+            'failed': failed,
+            'timings': body.get('timings')
+        }
+
+    def run(self, mix, concurrency, requests_count, warmup=0):
+        """
+        Ejecuto un escenario de carga.
+
+        Args:
+            mix (str): Mezcla de imágenes de los posts
+            concurrency (int): Posts enviados a la vez
+            requests_count (int): Número de posts del escenario
+            warmup (int): Posts previos que no se miden
+
+        Returns:
+            dict: Resultado del escenario
+        """
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(lambda _: self.publish(mix), range(warmup)))
+
+            calls_before = self.stubs.stats()['calls']
+            with RssSampler(self.service) as rss:
+                rss_start = self.service.rss()
+                started = time.perf_counter()
+                samples = list(executor.map(lambda _: self.publish(mix), range(requests_count)))
+                elapsed = time.perf_counter() - started
+                rss_end = self.service.rss()
+            calls_after = self.stubs.stats()['calls']
+
+        latencies = sorted(sample['latency'] for sample in samples)
+        errors = [sample for sample in samples if not sample['ok']]
+
+        network_errors = {}
+        for sample in errors:
+            for network in sample['failed']:
+                network_errors[network] = network_errors.get(network, 0) + 1
+
+        return {
+            'mix': mix,
+            'concurrency': concurrency,
+            'requests': requests_count,
+            'errors': len(errors),
+            'network_errors': network_errors,
+            'first_error': next((sample['error'] for sample in errors if sample['error']), None),
+            'seconds': round(elapsed, 3),
+            'throughput': round(requests_count / elapsed, 3),
+            'latency': {
+                'mean': round(sum(latencies) / len(latencies), 6),
+                'p50': round(percentile(latencies, 0.50), 6),
+                'p90': round(percentile(latencies, 0.90), 6),
+                'p99': round(percentile(latencies, 0.99), 6),
+                'max': round(latencies[-1], 6)
+            },
+            'rss_mb': {
+                'start': round(rss_start / 1024 / 1024, 1),
+                'peak': round(max(rss.peak, rss_end) / 1024 / 1024, 1),
+                'end': round(rss_end / 1024 / 1024, 1)
+            },
+            'stub_calls': {key: calls_after.get(key, 0) - calls_before.get(key, 0) for key in calls_after if calls_after.get(key, 0) != calls_before.get(key, 0)},
+            'stages': aggregate_timings(samples) if self.timings else None
+        }
+
+def is_published(result):
+    return result.get('success') and isinstance(result.get('result'), dict) and result['result'].get('status') == 'success'
+
+def aggregate_timings(samples):
+    """
+    Agrego los tiempos por fase de los posts de un escenario.
+
+    Args:
+        samples (list): Resultados de los posts (ver LoadTest.publish)
+
+    Returns:
+        dict: Media en segundos y número de mediciones de cada fase
+    """
+    totals = {}
+
+    for sample in samples:
+        for entry in (sample.get('timings') or {}).get('stages', []):
+            name = entry['stage']
+            if entry.get('network'):
+                name = f"{name}.{entry['network']}"
+
+            total = totals.setdefault(name, [0.0, 0])
+            total[0] += entry['seconds']
+            total[1] += 1
+
+    return {name: {'mean': round(total / count, 6), 'count': count} for name, (total, count) in sorted(totals.items())}
+
+def compare(results, baseline):
+    """
+    Comparo los resultados con los de otra ejecución.
+
+    Args:
+        results (list): Resultados de los escenarios
+        baseline (dict): Salida JSON de la otra ejecución
+
+    Returns:
+        list: Diferencias por escenario en porcentaje
+    """
+    previous = {(entry['mix'], entry['concurrency']): entry for entry in baseline.get('results', [])}
+    comparison = []
+
+    def change(new, old):
+        return round((new - old) / old * 100, 1) if old else None
+
+    for entry in results:
+        old = previous.get((entry['mix'], entry['concurrency']))
+        if not old:
+            continue
+
+        comparison.append({
+            'mix': entry['mix'],
+            'concurrency': entry['concurrency'],
+            'throughput_pct': change(entry['throughput'], old['throughput']),
+            'p50_pct': change(entry['latency']['p50'], old['latency']['p50']),
+            'p99_pct': change(entry['latency']['p99'], old['latency']['p99']),
+            'rss_peak_pct': change(entry['rss_mb']['peak'], old['rss_mb']['peak'])
+        })
+
+    return comparison
+
+def format_pct(value):
+    # Sin valor base no hay porcentaje (por ejemplo, memoria no disponible)
+    return 'n/a' if value is None else f'{value:+}'
+
+def print_table(results, comparison):
+    print(f"{'mezcla':<8} {'conc':>5} {'posts/s':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'errores':>8} {'RSS MB':>8}", file=sys.stderr)
+
+    for entry in results:
+        latency = entry['latency']
+        print(
+            f"{entry['mix']:<8} {entry['concurrency']:>5} {entry['throughput']:>9.2f} "
+            f"{latency['p50'] * 1000:>9.1f} {latency['p90'] * 1000:>9.1f} {latency['p99'] * 1000:>9.1f} "
+            f"{entry['errors']:>8} {entry['rss_mb']['peak']:>8.1f}",
+            file=sys.stderr
+        )
+
+    if comparison:
+        print('\nCambio respecto a la ejecución base (%):', file=sys.stderr)
+        for entry in comparison:
+            print(
+                f"{entry['mix']:<8} {entry['concurrency']:>5} posts/s {format_pct(entry['throughput_pct'])}  "
+                f"p50 {format_pct(entry['p50_pct'])}  p99 {format_pct(entry['p99_pct'])}  RSS {format_pct(entry['rss_peak_pct'])}",
+                file=sys.stderr
+            )
+
+def parse_env(values):
+    env = {}
+    for value in values or []:
+        key, _, value = value.partition('=')
+        env[key] = value
+    return env
+
+def main():
+    parser = argparse.ArgumentParser(description='Prueba de carga de /publish contra servidores de prueba de las redes sociales')
+    parser.add_argument('--server', choices=('flask', 'asgi'), default='flask', help='Servidor del servicio')
+    parser.add_argument('--concurrency', default='1,4,16', help='Niveles de concurrencia separados por comas')
+    parser.add_argument('--mix', default='none,small,mixed', help=f"Mezclas de imágenes separadas por comas ({', '.join(MIXES)})")
+    parser.add_argument('--requests', type=int, default=100, help='Posts por escenario')
+    parser.add_argument('--warmup', type=int, default=5, help='Posts previos de cada escenario que no se miden')
+    parser.add_argument('--upload', choices=('json', 'multipart'), default='json', help='Cómo se envían las imágenes')
+    parser.add_argument('--reuse-images', action='store_true', help='Enviar siempre las mismas imágenes (aprovechando las cachés)')
+    parser.add_argument('--timings', action='store_true', help='Pedir y agregar los tiempos por fase de cada post')
+    parser.add_argument('--env', action='append', metavar='KEY=VALUE', help='Variable de entorno del servicio (ej: IMAGE_PROCESS_WORKERS=2)')
+    parser.add_argument('--output', help='Archivo JSON de resultados (por defecto la salida estándar)')
+    parser.add_argument('--baseline', help='Archivo JSON de otra ejecución con el que comparar')
+    parser.add_argument('--seed', type=int, default=1)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    mixes = args.mix.split(',')
+    for mix in mixes:
+        if mix not in MIXES:
+            parser.error(f'Mezcla desconocida: {mix}')
+
+    random.seed(args.seed)
+    images = {name: generate_image(*spec) for name, spec in IMAGES.items()}
+
+    stubs = StubServer(('127.0.0.1', 0), build_configs(args.latency, args.jitter, args.error_rate)).start()
+    service = Service(args.server, stubs.url, parse_env(args.env))
+
+    results = []
+    try:
+        service.start()
+        test = LoadTest(service, stubs, images, args.upload, not args.reuse_images, args.timings)
+
+        for mix in mixes:
+            for concurrency in [int(value) for value in args.concurrency.split(',')]:
+                print(f'Escenario {mix} con concurrencia {concurrency}...', file=sys.stderr)
+                results.append(test.run(mix, concurrency, args.requests, args.warmup))
+    finally:
+        service.stop()
+        stubs.shutdown()
+
+    comparison = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            comparison = compare(results, json.load(f))
+
+    output = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'server': args.server,
+            'upload': args.upload,
+            'unique_images': not args.reuse_images,
+            'stubs': {network: vars(config) for network, config in stubs.configs.items()},
+            'env': parse_env(args.env),
+            'image_bytes': {name: len(img_data) for name, img_data in images.items()}
+        },
+        'results': results,
+        'comparison': comparison
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+    else:
+        json.dump(output, sys.stdout, indent=2)
+        print()
+
+    print_table(results, comparison)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Arranco el servicio para las pruebas de carga apuntando las redes sociales a
+los servidores de prueba (ver stubs.py).
+
+Bluesky y Telegram se redirigen con las variables de entorno del proceso
+BLUESKY_API_URL y TELEGRAM_API_URL (se leen al importar sus módulos, así que
+load.py las pasa en el entorno al lanzar este script), y Mastodon con
+MASTODON_API_BASE_URL en el perfil del proyecto. tweepy siempre llama a
+https://api.twitter.com y https://upload.twitter.com, así que aquí cambio
+esas URLs por BENCH_TWITTER_URL (también del entorno) en las peticiones de
+requests. Lo lanza load.py desde un directorio de trabajo temporal:
+
+    python benchmarks/serve.py --port 8080 --server flask
+"""
+
+import os
+import sys
+import logging
+import argparse
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'app')
+
+# Hosts de la api de Twitter que redirijo a los servidores de prueba
+TWITTER_HOSTS = ('https://api.twitter.com', 'https://upload.twitter.com')
+
+def redirect_twitter(stub_url):
+    """
+    Redirijo las peticiones de tweepy a los servidores de prueba.
+
+    Args:
+        stub_url (str): URL base de los servidores de prueba
+    """
+    import requests
+
+    original_request = requests.Session.request
+
+    def request(self, method, url, *args, **kwargs):
+        for host in TWITTER_HOSTS:
+            if url.startswith(host):
+                url = stub_url + url[len(host):]
+                break
+
+        return original_request(self, method, url, *args, **kwargs)
+
+    requests.Session.request = request
+
+def main():
+    parser = argparse.ArgumentParser(description='Servicio para las pruebas de carga')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--server', choices=('flask', 'asgi'), default='flask')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.abspath(APP_DIR))
+
+    if os.getenv('BENCH_TWITTER_URL'):
+        redirect_twitter(os.getenv('BENCH_TWITTER_URL'))
+
+    if args.server == 'asgi':
+        import uvicorn
+        uvicorn.run('asgi:app', host=args.host, port=args.port, log_level='warning')
+    else:
+        from app import app
+        # El registro de cada petición de werkzeug ralentiza la prueba y tapa su salida
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        app.run(host=args.host, port=args.port, debug=False, threaded=True)
+
+# Las imágenes grandes se optimizan en procesos hijos que importan este
+# módulo, así que solo arranco el servicio en el proceso principal
+if __name__ == '__main__':
+    main()
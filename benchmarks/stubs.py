@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Servidores de prueba que imitan las apis de las cuatro redes sociales para
+las pruebas de carga, sin publicar nada de verdad.
+
+Un único servidor HTTP atiende todas las redes según la ruta:
+
+- Bluesky (/xrpc/...): createSession, refreshSession, uploadBlob y createRecord
+- Mastodon (/api/...): instance, media y statuses
+- Telegram (/bot<token>/...): getMe, sendMessage, sendPhoto y sendMediaGroup
+- Twitter (/1.1/media/upload.json y /2/tweets): subida de imágenes y tweets
+
+Cada red tiene una latencia (con variación aleatoria) y una tasa de errores
+configurables; los errores se responden con 503 para que el servicio los
+trate como transitorios. Se puede arrancar solo:
+
+    python benchmarks/stubs.py --port 9100 --latency 50 --latency twitter=150 --error-rate 0.01
+"""
+
+import re
+import sys
+import json
+import time
+import random
+import base64
+import argparse
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+NETWORKS = ('bluesky', 'mastodon', 'telegram', 'twitter')
+
+class StubConfig:
+    """
+    Latencia y tasa de errores de una red social de prueba.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0):
+        """
+        Inicializo la configuración.
+
+        Args:
+            latency (float): Segundos de latencia media de cada petición
+            jitter (float): Segundos de variación aleatoria de la latencia
+            error_rate (float): Fracción de peticiones que responden 503
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    def delay(self):
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Atiende las peticiones de las cuatro redes sociales.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+
+        path = self.path.split('?')[0]
+
+        if path == '/_stats':
+            self._send(200, self.server.stats())
+            return
+
+        network = route_network(path)
+        if not network:
+            self._send(404, {'error': 'NotFound'})
+            return
+
+        config = self.server.configs[network]
+        time.sleep(config.delay())
+
+        method = path.rstrip('/').rsplit('/', 1)[-1]
+        self.server.count(network, method, length)
+
+        if random.random() < config.error_rate:
+            self._send(503, {'ok': False, 'error': 'ServiceUnavailable', 'description': 'Error simulado'})
+            return
+
+        status, response = getattr(self, f'_{network}')(path, method, body)
+        self._send(status, response)
+
+    def _bluesky(self, path, method, body):
+        if method in ('com.atproto.server.createSession', 'com.atproto.server.refreshSession'):
+            return 200, {
+                'accessJwt': fake_jwt(2 * 3600),
+                'refreshJwt': fake_jwt(60 * 24 * 3600),
+                'did': 'did:plc:benchmark',
+                'handle': 'benchmark.bsky.social'
+            }
+
+        if method == 'com.atproto.repo.uploadBlob':
+            return 200, {'blob': {'$type': 'blob', 'ref': {'$link': f'bafk{self.server.next_id()}'}, 'mimeType': self.headers.get('Content-Type'), 'size': len(body)}}
+
+        if method == 'com.atproto.repo.createRecord':
+            post_id = self.server.next_id()
+            return 200, {'uri': f'at://did:plc:benchmark/app.bsky.feed.post/{post_id}', 'cid': f'bafy{post_id}'}
+
+        return 400, {'error': 'InvalidRequest'}
+
+    def _mastodon(self, path, method, body):
+        if method == 'instance':
+            return 200, {'uri': 'mastodon.benchmark', 'title': 'Benchmark', 'version': '4.2.0'}
+
+        if method == 'media':
+            media_id = str(self.server.next_id())
+            return 200, {'id': media_id, 'type': 'image', 'url': f'http://mastodon.benchmark/media/{media_id}'}
+
+        if method == 'statuses':
+            status_id = str(self.server.next_id())
+            return 200, {'id': status_id, 'url': f'http://mastodon.benchmark/@benchmark/{status_id}', 'created_at': '2024-01-01T00:00:00.000Z'}
+
+        return 404, {'error': 'Record not found'}
+
+    def _telegram(self, path, method, body):
+        if method == 'getMe':
+            return 200, {'ok': True, 'result': {'id': 1, 'is_bot': True, 'first_name': 'Benchmark', 'username': 'benchmark_bot'}}
+
+        if method == 'sendMessage':
+            return 200, {'ok': True, 'result': telegram_message(self.server.next_id(), photo=False)}
+
+        if method == 'sendPhoto':
+            return 200, {'ok': True, 'result': telegram_message(self.server.next_id())}
+
+        if method == 'sendMediaGroup':
+            count = max(1, len(re.findall(rb'"type":\s*"photo"', body)))
+            return 200, {'ok': True, 'result': [telegram_message(self.server.next_id()) for _ in range(count)]}
+
+        return 404, {'ok': False, 'error_code': 404, 'description': 'Not Found'}
+
+    def _twitter(self, path, method, body):
+        if path.startswith('/1.1/media/upload'):
+            media_id = self.server.next_id()
+            return 200, {'media_id': media_id, 'media_id_string': str(media_id), 'size': len(body), 'expires_after_secs': 86400}
+
+        if path.startswith('/2/tweets'):
+            return 201, {'data': {'id': str(self.server.next_id()), 'text': 'benchmark'}}
+
+        return 404, {'errors': [{'message': 'Not Found'}]}
+
+    def _send(self, status, response):
+        data = json.dumps(response).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+class StubServer(ThreadingHTTPServer):
+    """
+    Servidor de prueba de las cuatro redes sociales.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, configs):
+        """
+        Inicializo el servidor.
+
+        Args:
+            address (tuple): Host y puerto (0 = puerto libre)
+            configs (dict): StubConfig de cada red social
+        """
+        super().__init__(address, StubHandler)
+        self.configs = configs
+        self._lock = threading.Lock()
+        self._calls = Counter()
+        self._bytes = Counter()
+        self._last_id = int(time.time())
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def next_id(self):
+        with self._lock:
+            self._last_id += 1
+            return self._last_id
+
+    def count(self, network, method, size):
+        with self._lock:
+            self._calls[f'{network}.{method}'] += 1
+            self._bytes[network] += size
+
+    def stats(self):
+        """
+        Obtengo las peticiones atendidas por red y método, y los bytes recibidos.
+
+        Returns:
+            dict: Contadores del servidor
+        """
+        with self._lock:
+            return {'calls': dict(self._calls), 'bytes': dict(self._bytes)}
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='stubs', daemon=True).start()
+        return self
+
+def route_network(path):
+    """
+    Obtengo la red social a la que va una petición según su ruta.
+
+    Args:
+        path (str): Ruta de la petición
+
+    Returns:
+        str: Nombre de la red o None si la ruta no es de ninguna
+    """
+    if path.startswith('/xrpc/'):
+        return 'bluesky'
+    if path.startswith('/api/'):
+        return 'mastodon'
+    if path.startswith('/bot'):
+        return 'telegram'
+    if path.startswith(('/1.1/', '/2/')):
+        return 'twitter'
+    return None
+
+def fake_jwt(ttl):
+    payload = base64.urlsafe_b64encode(json.dumps({'exp': int(time.time() + ttl)}).encode()).decode().rstrip('=')
+    return f'eyJhbGciOiJub25lIn0.{payload}.benchmark'
+
+def telegram_message(message_id, photo=True):
+    message = {'message_id': message_id, 'date': int(time.time()), 'chat': {'id': -100, 'type': 'channel'}}
+
+    if photo:
+        message['photo'] = [
+            {'file_id': f'small{message_id}', 'file_unique_id': f's{message_id}', 'width': 320, 'height': 240},
+            {'file_id': f'large{message_id}', 'file_unique_id': f'l{message_id}', 'width': 1280, 'height': 960}
+        ]
+
+    return message
+
+def parse_network_values(values, default=0.0):
+    """
+    Interpreto opciones de línea de comandos con un valor global o por red
+    (ej: ["50", "twitter=150"]).
+
+    Args:
+        values (list): Valores recibidos
+        default (float): Valor si no se indica ninguno
+
+    Returns:
+        dict: Valor de cada red social
+    """
+    values = values or []
+    result = dict.fromkeys(NETWORKS, default)
+
+    # El valor global se aplica antes que los de cada red, sea cual sea el orden
+    for value in values:
+        if '=' not in value:
+            result = dict.fromkeys(NETWORKS, float(value))
+
+    for value in values:
+        if '=' in value:
+            network, value = value.split('=', 1)
+            if network not in NETWORKS:
+                raise ValueError(f'Red social desconocida: {network}')
+            result[network] = float(value)
+
+    return result
+
+def build_configs(latency_ms=None, jitter_ms=None, error_rate=None):
+    """
+    Creo la configuración de cada red a partir de las opciones de línea de
+    comandos.
+
+    Args:
+        latency_ms (list): Latencias en milisegundos, globales o por red
+        jitter_ms (list): Variaciones en milisegundos, globales o por red
+        error_rate (list): Tasas de errores, globales o por red
+
+    Returns:
+        dict: StubConfig de cada red social
+    """
+    latency = parse_network_values(latency_ms)
+    jitter = parse_network_values(jitter_ms)
+    errors = parse_network_values(error_rate)
+
+    return {
+        network: StubConfig(latency[network] / 1000, jitter[network] / 1000, errors[network])
+        for network in NETWORKS
+    }
+
+def add_stub_arguments(parser):
+    parser.add_argument('--latency', action='append', metavar='MS', help='Latencia en ms de cada petición, global o por red (ej: twitter=150)')
+    parser.add_argument('--jitter', action='append', metavar='MS', help='Variación aleatoria de la latencia en ms, global o por red')
+    parser.add_argument('--error-rate', action='append', metavar='RATE', help='Fracción de peticiones que fallan con 503, global o por red')
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidores de prueba de las redes sociales')
+    parser.add_argument('--port', type=int, default=9100)
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    server = StubServer(('127.0.0.1', args.port), build_configs(args.latency, args.jitter, args.error_rate))
+    print(f'Servidores de prueba en {server.url}', file=sys.stderr)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()